@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for
+from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for, Response, stream_with_context
 import numpy as np
 from functools import wraps
 # 创建Flask应用实例
@@ -29,24 +29,104 @@ sys.path.append(os.path.abspath('./src'))
 
 # 导入核心功能模块
 from src.core.data_processing import load_sentences_and_paths, get_random_sentence
-from src.core.发音评分模块 import  score_pronunciation, score_pronunciation_detailed
+from src.core.发音评分模块 import  score_pronunciation, score_pronunciation_detailed, score_pronunciation_detailed_stream, score_pronunciation_gop, create_simple_detailed_result
 from src.core.语法检查 import analyze_grammar
 from src.core.自定义练习模块 import load_custom_data, get_random_custom_sentence, get_exercise_manager
 from src.core.处理txt文档 import shuijizhongwen
 from src.core.语音转写 import record_audio1, transcribe_audio
+from src.core.asr_router import get_asr_router
 from src.core.db_user_manager import get_db_user_manager
 from src.core.db_learning_manager import get_db_learning_manager
+from src.core.analysis_profiles import resolve_analysis_profile, load_config_section
+from src.core.参考发音对比 import get_reference_comparator
+from src.core.audio_decoding import decode_upload, probe_decoders, UploadLimitError
+from src.core.audio_buffer import AudioBuffer
+from src.core.upload_store import get_upload_store
+from src.core.实时评分 import load_realtime_config, create_wav2vec2_session
+from src.core.model_preload import get_model_preloader, ModelNotReadyError
+from src.core.transcription_jobs import get_transcription_jobs
 print('✅ 成功导入所有核心模块')
 
 # 全局录音状态
 is_recording = False
 
-# 录音保存目录（集中保存到 data/audio/uploads 下）
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-AUDIO_UPLOAD_DIR = os.path.join(BASE_DIR, 'data', 'audio', 'uploads')
-os.makedirs(AUDIO_UPLOAD_DIR, exist_ok=True)
-KEEP_UPLOADS = True  # 如需保留上传文件以便排查或回放，将其改为 True
-print(f"🎯 音频上传目录: {AUDIO_UPLOAD_DIR}")
+# 上传音频在内存中解码；是否保留、保留格式和配额见 config.yaml 的 upload_store 段
+upload_store = get_upload_store()
+probe_decoders()  # 启动时探测一次可用的音频解码器
+# worker 启动即在后台加载 Whisper 和 Wav2Vec2（见 config.yaml 的 model_preload 段）
+model_preloader = get_model_preloader()
+
+# 转写请求由 ASR 路由按时长、标点需求、负载和延迟预算选择识别引擎（见 config.yaml 的 asr_router 段）；
+# Whisper 引擎对超过 transcription.long_form.min_seconds 的录音按静音切分后并发转写
+asr_router = get_asr_router()
+
+def asr_requirements():
+    """从表单读取客户端对识别结果的要求：latency_budget_ms（延迟预算）、punctuation（是否需要标点和大小写）"""
+    requirements = {}
+    budget = request.form.get('latency_budget_ms', type=float)
+    if budget:
+        requirements['latency_budget_ms'] = budget
+    punctuation = request.form.get('punctuation')
+    if punctuation is not None:
+        requirements['needs_formatting'] = punctuation.lower() not in ('false', '0', 'no')
+    return requirements
+
+def transcribe_uploaded_audio(audio_data, purpose='transcription', **requirements):
+    """转写上传的录音，返回 {'text', 'engine', ...}"""
+    return asr_router.transcribe(audio_data, purpose, **requirements)
+
+# 语法检测附带的录音在后台转写，结果通过 /api/transcription-jobs/<id> 查询
+transcription_jobs = get_transcription_jobs()
+TRANSCRIPTION_JOBS_CONFIG = load_config_section('transcription').get('jobs') or {}
+
+# 上传大小与音频时长限制（见 config.yaml 的 upload_limits 段）
+UPLOAD_LIMITS = load_config_section('upload_limits')
+app.config['MAX_CONTENT_LENGTH'] = int(UPLOAD_LIMITS.get('max_content_mb', 16) * 1024 ** 2)
+MAX_AUDIO_SECONDS = {'scoring': 30, 'transcription': 300}
+MAX_AUDIO_SECONDS.update(UPLOAD_LIMITS.get('max_duration_seconds') or {})
+
+@app.before_request
+def enforce_upload_limits():
+    """进入接口前解析 multipart 表单
+
+    声明的 Content-Length 超限时不读取请求体直接拒绝；分块传输的请求在读取过程中超限即中止。
+    """
+    if request.mimetype == 'multipart/form-data':
+        request.files  # 超过 MAX_CONTENT_LENGTH 时抛出 RequestEntityTooLarge
+
+@app.errorhandler(413)
+def request_too_large(e):
+    limit = app.config['MAX_CONTENT_LENGTH']
+    return jsonify({
+        'error': f"请求体超过大小限制（最大 {limit / 1024 ** 2:g}MB）",
+        'code': 'request_too_large',
+        'limit': limit,
+        'actual': request.content_length
+    }), 413
+
+def upload_limit_response(e):
+    print(f"拒绝上传: {e}")
+    return jsonify(e.to_dict()), 413
+
+def model_not_ready_response(e):
+    response = jsonify({'error': str(e), 'code': 'model_not_ready', 'model': e.name})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+def requires_models(*names):
+    """接口依赖的模型还在后台加载时等待其完成（不会重复加载），超过 wait_timeout_seconds 返回 503"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                for name in names:
+                    model_preloader.wait(name)
+            except ModelNotReadyError as e:
+                return model_not_ready_response(e)
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
 
 # 录音线程函数
 def record_audio_thread():
@@ -100,42 +180,97 @@ def login_page():
     """登录页面"""
     return render_template('login.html')
 
-# 将多种音频格式转为标准 WAV 16k 单声道
-def convert_to_wav_16k(input_path):
+def get_request_user():
+    """从Authorization头解析当前用户，未登录或令牌无效时返回None"""
+    token = request.headers.get('Authorization')
+    if not token or not token.startswith('Bearer '):
+        return None
     try:
-        import subprocess
-        base, _ = os.path.splitext(input_path)
-        output_path = f"{base}_16k.wav"
-        
-        # 检查ffmpeg是否可用
-        try:
-            subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            print("警告: ffmpeg未安装，无法转换音频格式")
-            return None
-        
-        cmd = [
-            'ffmpeg', '-y', '-i', input_path,
-            '-ac', '1', '-ar', '16000',
-            '-f', 'wav',
-            output_path
-        ]
-        
-        print(f"执行音频转换命令: {' '.join(cmd)}")
-        
-        # 使用管道抑制输出
-        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-        
-        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-            print(f"音频转换成功: {output_path}")
-            return output_path
-        else:
-            print("音频转换失败: 输出文件不存在或为空")
-            return None
+        return get_db_user_manager().verify_user(token[7:])
     except Exception as e:
-        print(f"音频转换过程中出错: {e}")
+        print(f"解析用户令牌失败: {e}")
         return None
 
+def get_request_analysis_profile():
+    """根据请求参数 analysis_profile 和用户设置确定音素级分析档位"""
+    profile_name = request.form.get('analysis_profile') or request.args.get('analysis_profile')
+    user = get_request_user()
+    user_settings = user.get('settings') if user else None
+    profile = resolve_analysis_profile(profile_name, user_settings)
+    print(f"音素级分析档位: {profile.name} (预算 {profile.latency_budget_ms}ms)")
+    return profile
+
+def phoneme_score_to_dict(ps):
+    """将PhonemeScore转换为可JSON序列化的字典"""
+    return {
+        "phoneme": ps.phoneme,
+        "start_time": ps.start_time,
+        "end_time": ps.end_time,
+        "score": ps.score,
+        "confidence": ps.confidence,
+        "quality": ps.quality,
+        "issues": ps.issues
+    }
+
+def detailed_result_to_dict(result):
+    """将详细评分结果（对象/字典/数值）统一转换为接口响应格式"""
+    if hasattr(result, 'overall_score'):  # DetailedPronunciationResult对象
+        return {
+            "overall_score": f"{result.overall_score:.1f}",
+            "phoneme_scores": [phoneme_score_to_dict(ps) for ps in result.phoneme_scores],
+            "word_scores": result.word_scores,
+            "pronunciation_issues": result.pronunciation_issues,
+            "improvement_suggestions": result.improvement_suggestions,
+            "duration_analysis": result.duration_analysis,
+            "pitch_analysis": result.pitch_analysis,
+            "detailed": True
+        }
+    elif isinstance(result, dict):  # 简化结果字典
+        return {
+            "overall_score": f"{result['overall_score']:.1f}",
+            "phoneme_scores": result.get('phoneme_scores', []),
+            "pronunciation_issues": result.get('pronunciation_issues', []),
+            "improvement_suggestions": result.get('improvement_suggestions', []),
+            "detailed": result.get('detailed_available', False)
+        }
+    else:  # 简单数值结果（向后兼容）
+        return {
+            "overall_score": f"{result:.1f}",
+            "phoneme_scores": [],
+            "pronunciation_issues": [],
+            "improvement_suggestions": ["继续练习以提高发音准确度"],
+            "detailed": False
+        }
+
+def _json_default(obj):
+    """json.dumps 的兜底转换，处理numpy标量和数组"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"无法序列化的类型: {type(obj).__name__}")
+
+def sse_event(event, data):
+    """按 Server-Sent Events 格式编码一条消息"""
+    import json
+    payload = json.dumps(data, ensure_ascii=False, default=_json_default)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+def load_uploaded_audio(audio_file, normalize=False, limit='scoring'):
+    """在内存中把上传的音频解码为16kHz的 AudioBuffer，不写临时文件
+
+    评分类接口传 normalize=True，在解码结果上就地做一次峰值归一化，后续各环节不再重复。
+    limit 选择 MAX_AUDIO_SECONDS 中的时长上限，超限时抛出 UploadLimitError（接口返回 413）。
+    启用上传存储时按内容哈希保留一份（转码为 FLAC/Opus，相同录音只存一份）。
+    """
+    audio_data, _ = decode_upload(audio_file, max_bytes=app.config['MAX_CONTENT_LENGTH'],
+                                  max_duration=MAX_AUDIO_SECONDS.get(limit))
+    audio = AudioBuffer.from_decoded(audio_data, normalize=normalize)
+    if upload_store is not None:
+        # FLAC/Opus 转码和写盘在后台写入线程完成，不增加评分请求的延迟
+        upload_store.put_async(audio)
+    return audio
+
 #随机英文句子接口
 @app.route('/api/random-english-sentence', methods=['GET'])
 def get_random_english_sentence():
@@ -143,9 +278,11 @@ def get_random_english_sentence():
     data_records = load_sentences_and_paths(tsv_file)
     random_record = get_random_sentence(data_records)
     reference_text = random_record["sentence"]
-    return jsonify({"sentence": reference_text})
+    # clip 可传给 /api/compare-reference，与该句的母语者录音对比
+    return jsonify({"sentence": reference_text, "clip": random_record["path"]})
 # 发音评分接口
 @app.route('/api/score-pronunciation', methods=['POST'])
+@requires_models('wav2vec2')
 def score_pronunciation_api():
     try:
         print("=== 开始处理发音评分请求 ===")
@@ -165,155 +302,189 @@ def score_pronunciation_api():
             print("错误: 缺少音频文件")
             return jsonify({'error': '缺少音频文件'}), 400
 
-        # 生成唯一的临时文件路径
-        import uuid
-        unique_id = uuid.uuid4().hex[:8]
-        import os
-        _, ext = os.path.splitext(audio_file.filename)
-        ext = (ext or '.webm').lower()  # 默认使用webm格式
-        audio_path = os.path.join(AUDIO_UPLOAD_DIR, f"temp_audio_{unique_id}{ext}")
-        
+        # 在内存中解码音频（不落盘、不调用ffmpeg子进程）
         try:
-            # 保存音频文件
-            audio_file.save(audio_path)
-            file_size = os.path.getsize(audio_path)
-            print(f"音频文件已保存: {audio_path}, 大小: {file_size} 字节")
-
-            # 检查文件是否成功保存
-            if not os.path.exists(audio_path) or os.path.getsize(audio_path) == 0:
-                print("错误: 音频文件保存失败或为空文件")
-                return jsonify({"error": "音频文件保存失败或为空文件"}), 500
-
-            # 如非 WAV，尝试转码为 16k WAV
-            _, ext = os.path.splitext(audio_path)
-            ext = (ext or '').lower()
-            decoded_path = audio_path
-            if ext != '.wav':
-                print(f"音频格式为 {ext}，尝试转换为WAV格式...")
-                converted = convert_to_wav_16k(audio_path)
-                if converted:
-                    decoded_path = converted
-                    print(f"转换成功: {converted}")
-                else:
-                    print("转换失败，使用原始文件")
-                    decoded_path = audio_path
+            audio_data = load_uploaded_audio(audio_file, normalize=True)
+            print(f"音频加载成功: {audio_data}")
+            
+        except UploadLimitError as e:
+            return upload_limit_response(e)
+        except Exception as e:
+            print(f"音频加载失败: {e}")
+            return jsonify({"error": f"音频加载失败: {str(e)}"}), 500
 
-            # 使用librosa读取音频文件转换为numpy数组
+        # 调用核心评分函数
+        try:
+            print("开始调用发音评分函数...")
+            print(f"参考文本: '{reference_text}'")
+            
+            score = score_pronunciation(audio_data, reference_text)
+            print(f"评分完成: {score}")
+            
+            # 构建响应结果
+            result = {"score": f"{score:.1f}"}
+            
+            # 记录学习数据（如果用户已登录）
             try:
-                import librosa
-                print("正在加载音频文件...")
-                
-                # 尝试直接加载音频
-                try:
-                    audio_data, sr = librosa.load(decoded_path, sr=16000)
-                    print(f"音频加载成功: 采样率={sr}, 长度={len(audio_data)}")
-                except Exception as load_error:
-                    print(f"直接加载失败: {load_error}")
+                token = request.headers.get('Authorization')
+                if token and token.startswith('Bearer '):
+                    token = token[7:]
+                    from src.core.db_user_manager import get_db_user_manager
+                    user_manager = get_db_user_manager()
+                    user = user_manager.verify_user(token)
                     
-                    # 如果直接加载失败，尝试使用soundfile
-                    try:
-                        import soundfile as sf
-                        print("尝试使用soundfile加载音频...")
-                        audio_data, sr = sf.read(decoded_path)
-                        if len(audio_data.shape) > 1:
-                            audio_data = audio_data[:, 0]  # 取第一个声道
-                        # 重采样到16kHz
-                        if sr != 16000:
-                            audio_data = librosa.resample(audio_data, orig_sr=sr, target_sr=16000)
-                        print(f"soundfile加载成功: 采样率={sr}, 长度={len(audio_data)}")
-                    except Exception as sf_error:
-                        print(f"soundfile加载也失败: {sf_error}")
-                        raise RuntimeError(f"无法加载音频文件: {load_error}")
-                
-                # 检查音频数据
-                if len(audio_data) == 0:
-                    raise ValueError("音频数据为空")
-                
-                # 音频数据预处理
-                if audio_data.dtype != np.float32:
-                    audio_data = audio_data.astype(np.float32)
-                
-                # 音频归一化
-                if np.max(np.abs(audio_data)) > 0:
-                    audio_data = audio_data / np.max(np.abs(audio_data))
-                
-                print(f"音频预处理完成: 数据类型={audio_data.dtype}, 范围=[{np.min(audio_data):.3f}, {np.max(audio_data):.3f}]")
-                
-            except Exception as e:
-                print(f"音频加载失败: {e}")
-                return jsonify({"error": f"音频加载失败: {str(e)}"}), 500
-
-            # 调用核心评分函数
-            try:
-                print("开始调用发音评分函数...")
-                print(f"音频数据: 长度={len(audio_data)}, 类型={audio_data.dtype}")
-                print(f"参考文本: '{reference_text}'")
-                
-                score = score_pronunciation(audio_data, reference_text)
-                print(f"评分完成: {score}")
-                
-                # 构建响应结果
-                result = {"score": f"{score:.1f}"}
-                
-                # 记录学习数据（如果用户已登录）
-                try:
-                    token = request.headers.get('Authorization')
-                    if token and token.startswith('Bearer '):
-                        token = token[7:]
-                        from src.core.db_user_manager import get_db_user_manager
-                        user_manager = get_db_user_manager()
-                        user = user_manager.verify_user(token)
-                        
-                        if user:
-                            from src.core.db_learning_manager import get_db_learning_manager
-                            record_manager = get_db_learning_manager()
-                            record_manager.add_learning_record(
-                                user_id=user['id'],
-                                exercise_type='speech',
-                                content=reference_text,
-                                user_input='[audio_recording]',
-                                score=score,
-                                detailed_result={'simple_mode': True},
-                                practice_time=0
-                            )
-                except Exception as record_error:
-                    print(f"记录学习数据失败: {record_error}")
-                
-                return jsonify(result)
-            except Exception as e:
-                print(f"发音评分函数调用失败: {e}")
-                import traceback
-                traceback.print_exc()
-                
-                # 提供具体的错误信息
-                error_msg = str(e)
-                if "发音评分失败" in error_msg:
-                    return jsonify({"error": error_msg}), 500
-                else:
-                    return jsonify({"error": f"评分计算失败: {error_msg}"}), 500
-                
-        finally:
-            # 清理临时文件
-            try:
-                if os.path.exists(audio_path) and not KEEP_UPLOADS:
-                    os.remove(audio_path)
-                    print(f"临时文件已清理: {audio_path}")
-                # 同时清理可能的转码产物
-                base, _ = os.path.splitext(audio_path)
-                converted = f"{base}_16k.wav"
-                if os.path.exists(converted) and not KEEP_UPLOADS:
-                    os.remove(converted)
-                    print(f"转换文件已清理: {converted}")
-            except Exception as cleanup_error:
-                print(f"清理临时文件时出错: {str(cleanup_error)}")
+                    if user:
+                        from src.core.db_learning_manager import get_db_learning_manager
+                        record_manager = get_db_learning_manager()
+                        record_manager.add_learning_record(
+                            user_id=user['id'],
+                            exercise_type='speech',
+                            content=reference_text,
+                            user_input='[audio_recording]',
+                            score=score,
+                            detailed_result={'simple_mode': True},
+                            practice_time=0
+                        )
+            except Exception as record_error:
+                print(f"记录学习数据失败: {record_error}")
+            
+            return jsonify(result)
+        except Exception as e:
+            print(f"发音评分函数调用失败: {e}")
+            import traceback
+            traceback.print_exc()
+            
+            # 提供具体的错误信息
+            error_msg = str(e)
+            if "发音评分失败" in error_msg:
+                return jsonify({"error": error_msg}), 500
+            else:
+                return jsonify({"error": f"评分计算失败: {error_msg}"}), 500
     except Exception as e:
         print(f"发音评分接口错误: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({"error": f"评分过程中出错: {str(e)}"}), 500
 
+# GOP发音评分接口（CTC后验，给出单词级评分，开销接近标准评分）
+@app.route('/api/score-pronunciation-gop', methods=['POST'])
+@requires_models('wav2vec2')
+def score_pronunciation_gop_api():
+    """基于CTC后验概率的单词级评分，介于标准评分和音素级详细分析之间"""
+    reference_text = request.form.get('reference_text')
+    audio_file = request.files.get('audio_file')
+
+    # 参数验证
+    if not reference_text:
+        return jsonify({'error': '缺少参考文本'}), 400
+    if not audio_file:
+        return jsonify({'error': '缺少音频文件'}), 400
+
+    try:
+        audio_data = load_uploaded_audio(audio_file, normalize=True)
+    except UploadLimitError as e:
+        return upload_limit_response(e)
+    except Exception as e:
+        print(f"音频加载失败: {e}")
+        return jsonify({"error": f"音频加载失败: {str(e)}"}), 500
+
+    try:
+        result = score_pronunciation_gop(audio_data, reference_text)
+        return jsonify({
+            "score": f"{result['overall_score']:.1f}",
+            "similarity_score": f"{result['similarity_score']:.1f}",
+            "transcription": result['transcription'],
+            "word_scores": result['word_scores'],
+            "weak_words": result['weak_words']
+        })
+    except Exception as e:
+        print(f"GOP评分失败: {e}")
+        error_msg = str(e)
+        if "发音评分失败" not in error_msg:
+            error_msg = f"评分计算失败: {error_msg}"
+        return jsonify({"error": error_msg}), 500
+
+@app.route('/api/upload-store/metrics', methods=['GET'])
+def upload_store_metrics_api():
+    """上传录音存储的使用情况"""
+    if upload_store is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(upload_store.metrics(), enabled=True))
+
+@app.route('/api/asr-router/metrics', methods=['GET'])
+def asr_router_metrics_api():
+    """各识别引擎的可用性、排队数、实测实时率和请求统计"""
+    return jsonify(asr_router.metrics())
+
+@app.route('/api/grammar/metrics', methods=['GET'])
+def grammar_client_metrics_api():
+    """分级语法检查的本地/远程命中次数，以及 LanguageTool 客户端的健康状态、调用耗时和连接复用情况"""
+    from src.core.grammar_backends import get_grammar_checker
+    return jsonify(get_grammar_checker().metrics())
+
+@app.route('/api/ready', methods=['GET'])
+def readiness_api():
+    """就绪检查：所有预加载的模型加载完成前返回 503，负载均衡据此只把流量转发给就绪的 worker"""
+    status = model_preloader.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+# 参考发音对比接口（与母语者录音做DTW对齐，按单词报告偏差）
+@app.route('/api/compare-reference', methods=['POST'])
+def compare_reference_api():
+    """参考录音来自练习项（exercise_id + item_id）或 Common Voice 录音（clip）"""
+    audio_file = request.files.get('audio_file')
+    exercise_id = request.form.get('exercise_id')
+    item_id = request.form.get('item_id')
+    clip = request.form.get('clip')
+    reference_text = request.form.get('reference_text')
+
+    if not audio_file:
+        return jsonify({'error': '缺少音频文件'}), 400
+
+    # 确定参考录音
+    reference_audio = None
+    if exercise_id and item_id:
+        exercise_set = get_exercise_manager().exercises.get('exercise_sets', {}).get(exercise_id)
+        item = next((i for i in (exercise_set or {}).get('items', []) if i.get('id') == item_id), None)
+        if item is None:
+            return jsonify({'error': '练习项不存在'}), 404
+        content = item.get('content', {})
+        reference_audio = content.get('audio_path')
+        reference_text = reference_text or content.get('text')
+    elif clip:
+        # 只接受文件名，避免路径穿越
+        reference_audio = os.path.join(BASE_DIR, 'data', 'common_voice', 'clips', os.path.basename(clip))
+    else:
+        return jsonify({'error': '缺少参考录音（exercise_id + item_id 或 clip）'}), 400
+
+    if not reference_audio:
+        return jsonify({'error': '该练习项没有参考录音'}), 404
+    if not reference_text:
+        return jsonify({'error': '缺少参考文本'}), 400
+
+    try:
+        audio_data = load_uploaded_audio(audio_file, normalize=True)
+    except UploadLimitError as e:
+        return upload_limit_response(e)
+    except Exception as e:
+        print(f"音频加载失败: {e}")
+        return jsonify({"error": f"音频加载失败: {str(e)}"}), 500
+
+    try:
+        result = get_reference_comparator().compare(audio_data, reference_audio, reference_text)
+        result['overall_score'] = f"{result['overall_score']:.1f}"
+        return jsonify(result)
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        print(f"参考发音对比失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": f"参考发音对比失败: {str(e)}"}), 500
+
 # 音素级发音评分接口
 @app.route('/api/score-pronunciation-detailed', methods=['POST'])
+@requires_models('wav2vec2')
 def score_pronunciation_detailed_api():
     """音素级发音评分接口，返回详细的分析结果"""
     try:
@@ -334,165 +505,205 @@ def score_pronunciation_detailed_api():
             print("错误: 缺少音频文件")
             return jsonify({'error': '缺少音频文件'}), 400
 
-        # 生成唯一的临时文件路径
-        import uuid
-        unique_id = uuid.uuid4().hex[:8]
-        import os
-        _, ext = os.path.splitext(audio_file.filename)
-        ext = (ext or '.webm').lower()  # 默认使用webm格式
-        audio_path = os.path.join(AUDIO_UPLOAD_DIR, f"temp_audio_detailed_{unique_id}{ext}")
-        
+        # 在内存中解码音频（不落盘、不调用ffmpeg子进程）
         try:
-            # 保存音频文件
-            audio_file.save(audio_path)
-            file_size = os.path.getsize(audio_path)
-            print(f"音频文件已保存: {audio_path}, 大小: {file_size} 字节")
-
-            # 检查文件是否成功保存
-            if not os.path.exists(audio_path) or os.path.getsize(audio_path) == 0:
-                print("错误: 音频文件保存失败或为空文件")
-                return jsonify({"error": "音频文件保存失败或为空文件"}), 500
-
-            # 如非 WAV，尝试转码为 16k WAV
-            _, ext = os.path.splitext(audio_path)
-            ext = (ext or '').lower()
-            decoded_path = audio_path
-            if ext != '.wav':
-                print(f"音频格式为 {ext}，尝试转换为WAV格式...")
-                converted = convert_to_wav_16k(audio_path)
-                if converted:
-                    decoded_path = converted
-                    print(f"转换成功: {converted}")
-                else:
-                    print("转换失败，使用原始文件")
-                    decoded_path = audio_path
-
-            # 使用librosa读取音频文件转换为numpy数组
-            try:
-                import librosa
-                print("正在加载音频文件...")
-                
-                # 尝试直接加载音频
-                try:
-                    audio_data, sr = librosa.load(decoded_path, sr=16000)
-                    print(f"音频加载成功: 采样率={sr}, 长度={len(audio_data)}")
-                except Exception as load_error:
-                    print(f"直接加载失败: {load_error}")
-                    
-                    # 如果直接加载失败，尝试使用soundfile
-                    try:
-                        import soundfile as sf
-                        print("尝试使用soundfile加载音频...")
-                        audio_data, sr = sf.read(decoded_path)
-                        if len(audio_data.shape) > 1:
-                            audio_data = audio_data[:, 0]  # 取第一个声道
-                        # 重采样到16kHz
-                        if sr != 16000:
-                            audio_data = librosa.resample(audio_data, orig_sr=sr, target_sr=16000)
-                        print(f"soundfile加载成功: 采样率={sr}, 长度={len(audio_data)}")
-                    except Exception as sf_error:
-                        print(f"soundfile加载也失败: {sf_error}")
-                        raise RuntimeError(f"无法加载音频文件: {load_error}")
-                
-                # 检查音频数据
-                if len(audio_data) == 0:
-                    raise ValueError("音频数据为空")
-                
-                # 音频数据预处理
-                if audio_data.dtype != np.float32:
-                    audio_data = audio_data.astype(np.float32)
-                
-                # 音频归一化
-                if np.max(np.abs(audio_data)) > 0:
-                    audio_data = audio_data / np.max(np.abs(audio_data))
-                
-                print(f"音频预处理完成: 数据类型={audio_data.dtype}, 范围=[{np.min(audio_data):.3f}, {np.max(audio_data):.3f}]")
-                
-            except Exception as e:
-                print(f"音频加载失败: {e}")
-                return jsonify({"error": f"音频加载失败: {str(e)}"}), 500
+            audio_data = load_uploaded_audio(audio_file, normalize=True)
+            print(f"音频加载成功: {audio_data}")
+            
+        except UploadLimitError as e:
+            return upload_limit_response(e)
+        except Exception as e:
+            print(f"音频加载失败: {e}")
+            return jsonify({"error": f"音频加载失败: {str(e)}"}), 500
 
-            # 调用音素级评分函数
-            try:
-                print("开始调用音素级发音评分函数...")
-                print(f"音频数据: 长度={len(audio_data)}, 类型={audio_data.dtype}")
-                print(f"参考文本: '{reference_text}'")
-                
-                result = score_pronunciation_detailed(audio_data, reference_text)
-                print(f"音素级评分完成")
-                
-                # 处理结果
-                if hasattr(result, 'overall_score'):  # DetailedPronunciationResult对象
-                    response_data = {
-                        "overall_score": f"{result.overall_score:.1f}",
-                        "phoneme_scores": [
-                            {
-                                "phoneme": ps.phoneme,
-                                "start_time": ps.start_time,
-                                "end_time": ps.end_time,
-                                "score": ps.score,
-                                "confidence": ps.confidence,
-                                "quality": ps.quality,
-                                "issues": ps.issues
-                            } for ps in result.phoneme_scores
-                        ],
-                        "pronunciation_issues": result.pronunciation_issues,
-                        "improvement_suggestions": result.improvement_suggestions,
-                        "duration_analysis": result.duration_analysis,
-                        "pitch_analysis": result.pitch_analysis,
-                        "detailed": True
-                    }
-                elif isinstance(result, dict):  # 简化结果字典
-                    response_data = {
-                        "overall_score": f"{result['overall_score']:.1f}",
-                        "phoneme_scores": result.get('phoneme_scores', []),
-                        "pronunciation_issues": result.get('pronunciation_issues', []),
-                        "improvement_suggestions": result.get('improvement_suggestions', []),
-                        "detailed": result.get('detailed_available', False)
-                    }
-                else:  # 简单数值结果（向后兼容）
-                    response_data = {
-                        "overall_score": f"{result:.1f}",
-                        "phoneme_scores": [],
-                        "pronunciation_issues": [],
-                        "improvement_suggestions": ["继续练习以提高发音准确度"],
-                        "detailed": False
-                    }
-                
-                return jsonify(response_data)
-                
-            except Exception as e:
-                print(f"音素级评分函数调用失败: {e}")
-                import traceback
-                traceback.print_exc()
-                
-                # 提供具体的错误信息
-                error_msg = str(e)
-                if "发音评分失败" in error_msg:
-                    return jsonify({"error": error_msg}), 500
-                else:
-                    return jsonify({"error": f"音素级评分计算失败: {error_msg}"}), 500
-                
-        finally:
-            # 清理临时文件
-            try:
-                if os.path.exists(audio_path) and not KEEP_UPLOADS:
-                    os.remove(audio_path)
-                    print(f"临时文件已清理: {audio_path}")
-                # 同时清理可能的转码产物
-                base, _ = os.path.splitext(audio_path)
-                converted = f"{base}_16k.wav"
-                if os.path.exists(converted) and not KEEP_UPLOADS:
-                    os.remove(converted)
-                    print(f"转换文件已清理: {converted}")
-            except Exception as cleanup_error:
-                print(f"清理临时文件时出错: {str(cleanup_error)}")
-                
+        # 调用音素级评分函数
+        try:
+            print("开始调用音素级发音评分函数...")
+            print(f"参考文本: '{reference_text}'")
+            
+            result = score_pronunciation_detailed(audio_data, reference_text, get_request_analysis_profile())
+            print(f"音素级评分完成")
+            
+            # 处理结果
+            response_data = detailed_result_to_dict(result)
+            
+            return jsonify(response_data)
+            
+        except Exception as e:
+            print(f"音素级评分函数调用失败: {e}")
+            import traceback
+            traceback.print_exc()
+            
+            # 提供具体的错误信息
+            error_msg = str(e)
+            if "发音评分失败" in error_msg:
+                return jsonify({"error": error_msg}), 500
+            else:
+                return jsonify({"error": f"音素级评分计算失败: {error_msg}"}), 500
     except Exception as e:
         print(f"音素级发音评分接口错误: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({"error": f"音素级评分过程中出错: {str(e)}"}), 500
+# 渐进式音素级发音评分接口（Server-Sent Events）
+@app.route('/api/score-pronunciation-detailed-stream', methods=['POST'])
+@requires_models('wav2vec2')
+def score_pronunciation_detailed_stream_api():
+    """以SSE流式返回详细评分：CTC完成后先推送总分，再逐个推送音素和单词评分"""
+    reference_text = request.form.get('reference_text')
+    audio_file = request.files.get('audio_file')
+
+    # 参数验证
+    if not reference_text:
+        return jsonify({'error': '缺少参考文本'}), 400
+    if not audio_file:
+        return jsonify({'error': '缺少音频文件'}), 400
+
+    # 音频与分析档位需在请求上下文中确定，之后再开始流式响应
+    profile = get_request_analysis_profile()
+    try:
+        audio_data = load_uploaded_audio(audio_file, normalize=True)
+    except UploadLimitError as e:
+        return upload_limit_response(e)
+    except Exception as e:
+        print(f"音频加载失败: {e}")
+        return jsonify({"error": f"音频加载失败: {str(e)}"}), 500
+
+    def generate():
+        overall = None
+        try:
+            for event, payload in score_pronunciation_detailed_stream(audio_data, reference_text, profile):
+                if event == 'overall':
+                    overall = payload
+                    payload = dict(payload, overall_score=f"{payload['overall_score']:.1f}")
+                elif event == 'phoneme':
+                    payload = phoneme_score_to_dict(payload)
+                elif event == 'result':
+                    payload = detailed_result_to_dict(payload)
+                yield sse_event(event, payload)
+        except Exception as e:
+            print(f"流式音素级评分失败: {e}")
+            import traceback
+            traceback.print_exc()
+            if overall is not None:
+                # 与 /api/score-pronunciation-detailed 一致：音素级分析失败时以简单评分作为最终结果
+                print("音素级分析失败，回退到简单评分")
+                yield sse_event('result', detailed_result_to_dict(create_simple_detailed_result(
+                    overall['overall_score'], overall['transcription'], reference_text)))
+            else:
+                error_msg = str(e)
+                if "发音评分失败" not in error_msg:
+                    error_msg = f"音素级评分计算失败: {error_msg}"
+                yield sse_event('error', {"error": error_msg})
+        yield sse_event('done', {})
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    # 禁止中间代理缓冲，保证事件及时送达
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# 实时发音评分（WebSocket，依赖可选的 flask-sock）
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+    sock = Sock(app)
+except ImportError:
+    sock = None
+    print("ℹ️ 未安装 flask-sock，实时评分接口 /ws/score-pronunciation 不可用")
+
+REALTIME_CONFIG = load_realtime_config()
+# 单条消息上限：客户端每 100ms 发送一块 PCM（3.2KB），留足余量
+app.config['SOCK_SERVER_OPTIONS'] = {'ping_interval': 25, 'max_message_size': 64 * 1024}
+
+def realtime_scoring_ws(ws):
+    """实时发音评分
+
+    客户端在 URL 参数中给出 reference_text，之后持续发送 16kHz 16位小端单声道 PCM 二进制帧，
+    说完后发送文本消息 {"type": "end"}（开启 auto_endpoint 时服务端检测到句末静音也会自动结束）。
+    服务端推送 partial（部分转写与逐词正误）、endpoint、final（最终评分）或 error 消息。
+    """
+    import json
+    import threading
+    from src.core.发音评分模块 import compute_similarity_score
+
+    send_lock = threading.Lock()
+    def send(payload):
+        with send_lock:
+            ws.send(json.dumps(payload, ensure_ascii=False, default=_json_default))
+
+    reference_text = (request.args.get('reference_text') or '').strip()
+    if not reference_text:
+        send({'type': 'error', 'error': '缺少参考文本'})
+        return
+    try:
+        model_preloader.wait('wav2vec2')
+        session = create_wav2vec2_session(reference_text, REALTIME_CONFIG)
+    except ModelNotReadyError as e:
+        send({'type': 'error', 'error': str(e), 'code': 'model_not_ready'})
+        return
+    except Exception as e:
+        print(f"实时评分会话创建失败: {e}")
+        send({'type': 'error', 'error': f'模型加载失败: {str(e)}'})
+        return
+
+    # 推理放在单独线程，接收循环只做追加，不会因推理阻塞而让未读消息在连接里堆积。
+    # 会话内部用锁保护追加的音频和 origin/processed，推理线程在锁内取快照、锁外推理。
+    stopped = threading.Event()
+    audio_arrived = threading.Event()
+    def infer_loop():
+        while not stopped.is_set():
+            audio_arrived.wait(0.5)
+            audio_arrived.clear()
+            try:
+                partial = session.step()
+                if partial:
+                    send(partial)
+            except ConnectionClosed:
+                return
+            except Exception as e:
+                print(f"实时评分推理失败: {e}")
+    worker = threading.Thread(target=infer_loop, name='realtime-scoring', daemon=True)
+    worker.start()
+
+    try:
+        while True:
+            message = ws.receive(timeout=REALTIME_CONFIG['idle_timeout_seconds'])
+            if message is None:
+                send({'type': 'error', 'error': '等待音频超时'})
+                break
+            if isinstance(message, str):
+                try:
+                    command = json.loads(message)
+                except ValueError:
+                    command = {}
+                if command.get('type') == 'end':
+                    break
+                continue
+            if not session.append_pcm16(message):
+                send({'type': 'error', 'code': 'audio_too_long', 'limit': REALTIME_CONFIG['max_seconds'],
+                      'error': f"音频时长超过限制（最长 {REALTIME_CONFIG['max_seconds']:g} 秒），按已收到的音频评分"})
+                break
+            audio_arrived.set()
+            if REALTIME_CONFIG['auto_endpoint'] and session.vad.endpoint:
+                send({'type': 'endpoint'})
+                break
+    finally:
+        stopped.set()
+        audio_arrived.set()
+        worker.join()
+
+    try:
+        result = session.finalize(compute_similarity_score)
+        print(f"实时评分完成: {result['score']:.1f} ({session.duration:.1f}s)")
+        send(result)
+    except Exception as e:
+        print(f"实时评分失败: {e}")
+        send({'type': 'error', 'error': f'评分失败: {str(e)}'})
+
+if sock is not None and REALTIME_CONFIG['enabled']:
+    sock.route('/ws/score-pronunciation')(realtime_scoring_ws)
+
 #简化发音评分接口（备选方案）
 @app.route('/api/score-pronunciation-simple', methods=['POST'])
 def score_pronunciation_simple_api():
@@ -515,74 +726,46 @@ def score_pronunciation_simple_api():
             print("错误: 缺少音频文件")
             return jsonify({'error': '缺少音频文件'}), 400
 
-        # 生成唯一的临时文件路径
-        import uuid
-        unique_id = uuid.uuid4().hex[:8]
-        import os
-        _, ext = os.path.splitext(audio_file.filename)
-        ext = (ext or '.webm').lower()
-        audio_path = os.path.join(AUDIO_UPLOAD_DIR, f"temp_audio_{unique_id}{ext}")
-        
+        # 简化的评分逻辑：基于音频文件大小和时长进行模拟评分
         try:
-            # 保存音频文件
-            audio_file.save(audio_path)
-            file_size = os.path.getsize(audio_path)
-            print(f"音频文件已保存: {audio_path}, 大小: {file_size} 字节")
-
-            # 检查文件是否成功保存
-            if not os.path.exists(audio_path) or os.path.getsize(audio_path) == 0:
-                print("错误: 音频文件保存失败或为空文件")
-                return jsonify({"error": "音频文件保存失败或为空文件"}), 500
-
-            # 简化的评分逻辑：基于音频文件大小和时长进行模拟评分
-            try:
-                import librosa
-                print("正在分析音频文件...")
-                audio_data, sr = librosa.load(audio_path, sr=16000)
-                duration = len(audio_data) / sr
-                print(f"音频时长: {duration:.2f}秒")
-                
-                # 简单的评分算法：基于音频时长和参考文本长度的匹配度
-                expected_duration = len(reference_text.split()) * 0.5  # 假设每个单词0.5秒
-                duration_score = max(0, 100 - abs(duration - expected_duration) * 20)
-                
-                # 添加一些随机性，让每次评分略有不同
-                import random
-                random.seed(hash(reference_text) % 1000)  # 基于文本的固定随机种子
-                random_adjustment = random.uniform(-5, 5)
-                
-                final_score = max(0, min(100, duration_score + random_adjustment))
-                print(f"简化评分完成: {final_score:.1f}")
-                
-                return jsonify({"score": f"{final_score:.1f}"})
-                
-            except Exception as e:
-                print(f"音频分析失败: {e}")
-                # 如果音频分析失败，返回一个基于文本长度的模拟分数
-                text_length = len(reference_text)
-                if text_length < 20:
-                    base_score = 85
-                elif text_length < 50:
-                    base_score = 80
-                else:
-                    base_score = 75
-                
-                import random
-                random.seed(hash(reference_text) % 1000)
-                final_score = max(0, min(100, base_score + random.uniform(-10, 10)))
-                print(f"使用备选评分: {final_score:.1f}")
-                
-                return jsonify({"score": f"{final_score:.1f}"})
-                
-        finally:
-            # 清理临时文件
-            try:
-                if os.path.exists(audio_path):
-                    os.remove(audio_path)
-                    print(f"临时文件已清理: {audio_path}")
-            except Exception as cleanup_error:
-                print(f"清理临时文件时出错: {str(cleanup_error)}")
-                
+            print("正在分析音频文件...")
+            audio_data = load_uploaded_audio(audio_file)
+            duration = audio_data.duration
+            print(f"音频时长: {duration:.2f}秒")
+            
+            # 简单的评分算法：基于音频时长和参考文本长度的匹配度
+            expected_duration = len(reference_text.split()) * 0.5  # 假设每个单词0.5秒
+            duration_score = max(0, 100 - abs(duration - expected_duration) * 20)
+            
+            # 添加一些随机性，让每次评分略有不同
+            import random
+            random.seed(hash(reference_text) % 1000)  # 基于文本的固定随机种子
+            random_adjustment = random.uniform(-5, 5)
+            
+            final_score = max(0, min(100, duration_score + random_adjustment))
+            print(f"简化评分完成: {final_score:.1f}")
+            
+            return jsonify({"score": f"{final_score:.1f}"})
+            
+        except UploadLimitError as e:
+            return upload_limit_response(e)
+        except Exception as e:
+            print(f"音频分析失败: {e}")
+            # 如果音频分析失败，返回一个基于文本长度的模拟分数
+            text_length = len(reference_text)
+            if text_length < 20:
+                base_score = 85
+            elif text_length < 50:
+                base_score = 80
+            else:
+                base_score = 75
+            
+            import random
+            random.seed(hash(reference_text) % 1000)
+            final_score = max(0, min(100, base_score + random.uniform(-10, 10)))
+            print(f"使用备选评分: {final_score:.1f}")
+            
+            return jsonify({"score": f"{final_score:.1f}"})
     except Exception as e:
         print(f"简化发音评分接口错误: {str(e)}")
         import traceback
@@ -598,6 +781,7 @@ def get_random_chinese_sentence():
     return jsonify({"sentence": chinese_sentence})
 #语音转文字接口（Whisper）
 @app.route('/api/transcribe-audio', methods=['POST'])
+@requires_models('whisper')
 def transcribe_audio_api():
     """使用Whisper模型将语音转换为文字"""
     try:
@@ -608,62 +792,33 @@ def transcribe_audio_api():
         if not audio_file:
             return jsonify({'error': '缺少音频文件'}), 400
         
-        # 生成唯一的临时文件路径
-        import uuid
-        unique_id = uuid.uuid4().hex[:8]
-        _, ext = os.path.splitext(audio_file.filename)
-        ext = (ext or '.webm').lower()
-        audio_path = os.path.join(AUDIO_UPLOAD_DIR, f"temp_transcribe_{unique_id}{ext}")
+        # 在内存中解码音频，直接把数组交给Whisper
+        try:
+            audio_data = load_uploaded_audio(audio_file, limit='transcription')
+        except UploadLimitError as e:
+            return upload_limit_response(e)
+        except Exception as e:
+            print(f"音频加载失败: {e}")
+            return jsonify({"error": f"音频加载失败: {str(e)}"}), 500
         
+        # 由 ASR 路由选择识别引擎进行语音转文字
         try:
-            # 保存音频文件
-            audio_file.save(audio_path)
-            file_size = os.path.getsize(audio_path)
-            print(f"音频文件已保存: {audio_path}, 大小: {file_size} 字节")
-            
-            # 检查文件是否成功保存
-            if not os.path.exists(audio_path) or os.path.getsize(audio_path) == 0:
-                return jsonify({"error": "音频文件保存失败或为空文件"}), 500
-            
-            # 音频格式转换（如果需要）
-            processed_audio_path = audio_path
-            if ext != '.wav':
-                converted_path = convert_to_wav_16k(audio_path)
-                if converted_path:
-                    processed_audio_path = converted_path
-                    print(f"音频已转换为WAV格式: {converted_path}")
+            asr_result = transcribe_uploaded_audio(audio_data, 'transcription', **asr_requirements())
+            transcribed_text = asr_result['text']
             
-            # 调用Whisper进行语音转文字
-            try:
-                from src.core.语音转写 import transcribe_audio
-                transcribed_text = transcribe_audio(processed_audio_path)
-                
-                if transcribed_text:
-                    print(f"语音转文字成功: {transcribed_text}")
-                    return jsonify({
-                        'success': True,
-                        'transcribed_text': transcribed_text
-                    })
-                else:
-                    return jsonify({'error': '语音识别结果为空，请重新录音'}), 400
-                    
-            except Exception as transcribe_error:
-                print(f"Whisper转写失败: {transcribe_error}")
-                return jsonify({'error': f'语音识别失败: {str(transcribe_error)}'}), 500
-                
-        finally:
-            # 清理临时文件
-            try:
-                if os.path.exists(audio_path) and not KEEP_UPLOADS:
-                    os.remove(audio_path)
-                    print(f"临时文件已清理: {audio_path}")
-                # 清理转换后的文件
-                if processed_audio_path != audio_path and os.path.exists(processed_audio_path) and not KEEP_UPLOADS:
-                    os.remove(processed_audio_path)
-                    print(f"转换文件已清理: {processed_audio_path}")
-            except Exception as cleanup_error:
-                print(f"清理临时文件时出错: {str(cleanup_error)}")
+            if transcribed_text:
+                print(f"语音转文字成功: {transcribed_text}")
+                return jsonify({
+                    'success': True,
+                    'transcribed_text': transcribed_text,
+                    'asr_engine': asr_result['engine']
+                })
+            else:
+                return jsonify({'error': '语音识别结果为空，请重新录音'}), 400
                 
+        except Exception as transcribe_error:
+            print(f"Whisper转写失败: {transcribe_error}")
+            return jsonify({'error': f'语音识别失败: {str(transcribe_error)}'}), 500
     except Exception as e:
         print(f"语音转文字接口错误: {str(e)}")
         import traceback
@@ -677,39 +832,47 @@ def check_grammar_api():
         # 获取请求参数（支持仅文本，音频可选）
         translated_text = request.form.get("translated_text")
         audio_file = request.files.get("audio_file")
+        # 附带录音时默认在后台转写；transcribe=false 时跳过；
+        # wait_transcription=true 时等待转写完成并像以前一样填入 transcribed_text（语法检测与转写同时进行）
+        want_transcription = request.form.get("transcribe", "true").lower() not in ("false", "0", "no")
+        wait_transcription = request.form.get("wait_transcription", "false").lower() in ("true", "1", "yes")
 
         # 参数验证
         if not translated_text or not translated_text.strip():
             return jsonify({"error": "缺少翻译文本"}), 400
 
+        transcription_job = None
         transcribed_text = ""
-        # 如提供音频，则尝试处理音频
-        if audio_file and audio_file.filename:
-            import uuid, os
-            unique_id = uuid.uuid4().hex[:8]
-            _, ext = os.path.splitext(audio_file.filename)
-            ext = (ext or '.wav').lower()
-            audio_path = os.path.join(AUDIO_UPLOAD_DIR, f"temp_recording_{unique_id}{ext}")
-
+        # 如提供音频，只在请求内解码（请求结束后上传流不可再读），转写交给后台任务，不阻塞语法检测
+        if want_transcription and audio_file and audio_file.filename:
             try:
-                audio_file.save(audio_path)
-
-                # 如果为空文件，则忽略音频，继续仅基于文本做检查
-                if (not os.path.exists(audio_path)) or os.path.getsize(audio_path) == 0:
-                    audio_path = None
-
-                if audio_path:
-                    transcribed_text = transcribe_audio(audio_path)
-            finally:
-                try:
-                    if audio_path and os.path.exists(audio_path):
-                        os.remove(audio_path)
-                except Exception as cleanup_error:
-                    print(f"清理临时文件时出错: {str(cleanup_error)}")
+                audio_data = load_uploaded_audio(audio_file, limit='transcription')
+                job_id = transcription_jobs.submit(transcribe_uploaded_audio, audio_data, 'grammar')
+                if job_id:
+                    transcription_job = {
+                        "job_id": job_id,
+                        "status": "queued",
+                        "poll_url": url_for('transcription_job_api', job_id=job_id)
+                    }
+                else:
+                    transcription_job = {"status": "skipped", "error": "转写任务繁忙，请稍后单独转写"}
+            except UploadLimitError as e:
+                return upload_limit_response(e)
+            except Exception as e:
+                # 录音无法解码不影响语法检测，只在转写任务中报告错误
+                print(f"语法检测附带的录音解码失败: {e}")
+                transcription_job = {"status": "failed", "error": f"录音解码失败: {e}"}
 
         # 以用户文本为准进行语法分析
         analysis_result = analyze_grammar(translated_text)
 
+        if wait_transcription and transcription_job and transcription_job.get("job_id"):
+            job = transcription_jobs.get(transcription_job["job_id"],
+                                         wait=TRANSCRIPTION_JOBS_CONFIG.get('sync_wait_seconds', 60))
+            if job is not None:
+                transcription_job.update({k: v for k, v in job.items() if k != 'transcribed_text'})
+                transcribed_text = job.get('transcribed_text') or ""
+
         # 构建返回结果
         if analysis_result.get("status") == "success":
             result = {"status": "success", "message": "✅ 英文语法正确!"}
@@ -723,12 +886,22 @@ def check_grammar_api():
         return jsonify({
             "translated_text": translated_text,
             "transcribed_text": transcribed_text,
+            "transcription_job": transcription_job,
             "result": result
         })
     except Exception as e:
         print(f"语法检测接口错误: {str(e)}")
         return jsonify({"error": f"语法检测过程中出错: {str(e)}"}), 500
 
+@app.route('/api/transcription-jobs/<job_id>', methods=['GET'])
+def transcription_job_api(job_id):
+    """查询后台转写任务：status 为 queued / running / done / failed；wait=N 时最多等待 N 秒（长轮询）"""
+    wait = min(max(request.args.get('wait', 0, type=float), 0), 30)
+    job = transcription_jobs.get(job_id, wait)
+    if job is None:
+        return jsonify({'error': '转写任务不存在或已过期'}), 404
+    return jsonify(job)
+
 # 新增：纯文本语法检测接口
 @app.route('/api/check-grammar-text', methods=['POST'])
 def check_grammar_text_api():
@@ -749,26 +922,54 @@ def check_grammar_text_api():
         analysis_result = analyze_grammar(text)
         
         # 返回标准化的结果
-        if analysis_result.get("status") == "success":
-            return jsonify({
-                "success": True,
-                "errors": [],
-                "message": "未发现语法错误",
-                "corrected_text": analysis_result.get('corrected_text', text)
-            })
-        else:
-            return jsonify({
-                "success": False,
-                "errors": analysis_result.get('errors', []),
-                "error_count": analysis_result.get('error_count', 0),
-                "corrected_text": analysis_result.get('corrected_text', text)
-            })
+        return jsonify(grammar_text_result(analysis_result, text))
             
     except Exception as e:
         print(f"文本语法检测接口错误: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({"error": f"语法检测失败: {str(e)}"}), 500
+
+def grammar_text_result(analysis_result, text):
+    """文本语法检测接口的标准化结果"""
+    if analysis_result.get("status") == "success":
+        return {
+            "success": True,
+            "errors": [],
+            "message": "未发现语法错误",
+            "corrected_text": analysis_result.get('corrected_text', text)
+        }
+    return {
+        "success": False,
+        "errors": analysis_result.get('errors', []),
+        "error_count": analysis_result.get('error_count', 0),
+        "corrected_text": analysis_result.get('corrected_text', text)
+    }
+
+@app.route('/api/check-grammar-batch', methods=['POST'])
+def check_grammar_batch_api():
+    """批量文本语法检测：{"texts": [...]}，按顺序返回与 /api/check-grammar-text 相同格式的结果"""
+    try:
+        texts = (request.get_json(silent=True) or {}).get('texts')
+        if not isinstance(texts, list) or not texts or not all(isinstance(t, str) for t in texts):
+            return jsonify({"error": "请提供要检测的文本列表 texts"}), 400
+        max_texts = load_config_section('grammar').get('batch_max_texts', 200)
+        if len(texts) > max_texts:
+            return jsonify({"error": f"一次最多检测 {max_texts} 条文本"}), 400
+
+        from src.core.语法检查 import analyze_grammar_batch
+        reports = analyze_grammar_batch(texts)
+        return jsonify({
+            "results": [grammar_text_result(report, text) for report, text in zip(reports, texts)],
+            "count": len(texts)
+        })
+
+    except Exception as e:
+        print(f"批量语法检测接口错误: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": f"语法检测失败: {str(e)}"}), 500
+
 @app.route('/api/custom-exercise', methods=['POST'])
 def custom_exercise():
     data = request.json or {}
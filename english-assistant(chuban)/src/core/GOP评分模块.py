@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基于CTC后验概率的发音良好度(GOP)评分
+直接利用 Wav2Vec2 一次前向计算得到的 logits：把参考文本的字符序列强制对齐到帧上，
+再对每个字符、每个单词所占帧的对数后验做向量化归约。
+相比只看 argmax 转写的编辑距离，能给出单词级分数；相比音素级详细分析，几乎不增加计算量。
+"""
+
+import re
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import torch
+    import torchaudio.functional as F_audio
+    TORCHAUDIO_ALIGN_AVAILABLE = hasattr(F_audio, 'forced_align')
+except ImportError:
+    TORCHAUDIO_ALIGN_AVAILABLE = False
+
+
+def log_softmax(logits: np.ndarray) -> np.ndarray:
+    """按最后一维做数值稳定的 log-softmax"""
+    shifted = logits - np.max(logits, axis=-1, keepdims=True)
+    return shifted - np.log(np.sum(np.exp(shifted), axis=-1, keepdims=True))
+
+
+def ctc_viterbi_align(log_probs: np.ndarray, targets: np.ndarray, blank: int = 0) -> Optional[np.ndarray]:
+    """CTC Viterbi强制对齐（numpy实现，torchaudio不可用时使用）
+
+    对时间循环、对扩展状态（插入空白后的 2L+1 个状态）向量化。
+
+    Returns:
+        每帧的标签id（空白帧为 blank），无可行路径时返回 None
+    """
+    n_frames = log_probs.shape[0]
+    n_states = 2 * len(targets) + 1
+    extended = np.full(n_states, blank, dtype=np.int64)
+    extended[1::2] = targets
+
+    emit = log_probs[:, extended]
+    # 允许跳过空白：当前为非空白且与前一个非空白标签不同
+    can_skip = np.zeros(n_states, dtype=bool)
+    can_skip[2:] = (extended[2:] != blank) & (extended[2:] != extended[:-2])
+
+    score = np.full(n_states, -np.inf)
+    score[0] = emit[0, 0]
+    if n_states > 1:
+        score[1] = emit[0, 1]
+    backpointer = np.zeros((n_frames, n_states), dtype=np.int8)
+    states = np.arange(n_states)
+
+    for t in range(1, n_frames):
+        from_prev = np.concatenate(([-np.inf], score[:-1]))
+        from_skip = np.concatenate(([-np.inf, -np.inf], score[:-2]))
+        from_skip[~can_skip] = -np.inf
+        candidates = np.stack([score, from_prev, from_skip])
+        best = np.argmax(candidates, axis=0)
+        score = candidates[best, states] + emit[t]
+        backpointer[t] = best
+
+    # 结束于最后一个标签或其后的空白
+    last = n_states - 1
+    if n_states > 1 and score[n_states - 2] > score[last]:
+        last = n_states - 2
+    if not np.isfinite(score[last]):
+        return None
+
+    path = np.empty(n_frames, dtype=np.int64)
+    state = last
+    for t in range(n_frames - 1, -1, -1):
+        path[t] = state
+        state -= backpointer[t, state]
+    return extended[path]
+
+
+def ctc_forced_align(log_probs: np.ndarray, targets: np.ndarray, blank: int = 0) -> Optional[np.ndarray]:
+    """强制对齐，优先使用 torchaudio 的实现"""
+    if TORCHAUDIO_ALIGN_AVAILABLE:
+        try:
+            alignment, _ = F_audio.forced_align(
+                torch.from_numpy(log_probs).unsqueeze(0).float(),
+                torch.from_numpy(targets).unsqueeze(0).int(),
+                blank=blank
+            )
+            return alignment[0].cpu().numpy().astype(np.int64)
+        except Exception as e:
+            print(f"torchaudio强制对齐失败，使用numpy实现: {e}")
+    return ctc_viterbi_align(log_probs, targets, blank)
+
+
+def frame_token_index(frame_labels: np.ndarray, blank: int) -> np.ndarray:
+    """把逐帧标签转换为逐帧的目标序列下标（空白帧为 -1）
+
+    非空白帧在前一帧为空白或标签变化时开始一个新的目标字符。
+    """
+    non_blank = frame_labels != blank
+    previous = np.concatenate(([blank], frame_labels[:-1]))
+    starts = non_blank & ((previous == blank) | (previous != frame_labels))
+    index = np.cumsum(starts) - 1
+    return np.where(non_blank, index, -1)
+
+
+def _quality_level(score: float) -> str:
+    """与音素级评分一致的质量等级"""
+    if score >= 90:
+        return "excellent"
+    elif score >= 75:
+        return "good"
+    elif score >= 60:
+        return "fair"
+    else:
+        return "poor"
+
+
+class GOPScorer:
+    """CTC后验发音良好度评分器"""
+
+    def __init__(self, vocab: Dict[str, int], blank_id: int = 0, word_delimiter: str = '|'):
+        self.vocab = vocab
+        self.blank_id = blank_id
+        self.word_delimiter_id = vocab.get(word_delimiter)
+
+    @classmethod
+    def from_processor(cls, processor) -> 'GOPScorer':
+        tokenizer = processor.tokenizer
+        return cls(tokenizer.get_vocab(), tokenizer.pad_token_id,
+                   getattr(tokenizer, 'word_delimiter_token', '|') or '|')
+
+    def tokenize(self, reference_text: str) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """把参考文本转换为字符id序列
+
+        Returns:
+            (words, targets, word_of_token)：word_of_token 为每个目标字符所属单词下标，分隔符为 -1
+        """
+        words = []
+        targets = []
+        word_of_token = []
+        for word in re.findall(r"[A-Za-z']+", reference_text):
+            ids = [self.vocab[c] for c in word.upper() if c in self.vocab]
+            if not ids:
+                continue
+            if words and self.word_delimiter_id is not None:
+                targets.append(self.word_delimiter_id)
+                word_of_token.append(-1)
+            targets.extend(ids)
+            word_of_token.extend([len(words)] * len(ids))
+            words.append(word)
+        return words, np.array(targets, dtype=np.int64), np.array(word_of_token, dtype=np.int64)
+
+    def score(self, logits, reference_text: str, audio_duration: Optional[float] = None) -> Optional[Dict]:
+        """计算字符级、单词级和整体GOP评分
+
+        Args:
+            logits: 模型输出 (1, T, V) 或 (T, V)，torch.Tensor 或 numpy 数组
+            audio_duration: 音频时长(秒)，用于把帧换算为时间
+
+        Returns:
+            评分字典；参考文本为空或帧数不足以对齐时返回 None
+        """
+        if hasattr(logits, 'detach'):
+            logits = logits.detach().float().cpu().numpy()
+        logits = np.asarray(logits, dtype=np.float32)
+        if logits.ndim == 3:
+            logits = logits[0]
+
+        words, targets, word_of_token = self.tokenize(reference_text)
+        if len(targets) == 0:
+            return None
+
+        log_probs = log_softmax(logits)
+        frame_labels = ctc_forced_align(log_probs, targets, self.blank_id)
+        if frame_labels is None:
+            print("GOP对齐失败：音频帧数少于参考文本字符数")
+            return None
+
+        n_frames = len(frame_labels)
+        n_tokens = len(targets)
+        token_index = frame_token_index(frame_labels, self.blank_id)
+        aligned = token_index >= 0
+        frames = np.flatnonzero(aligned)
+        tokens = token_index[aligned]
+
+        # 每个字符的平均对数后验（GOP），以及覆盖的帧区间
+        frame_log_post = log_probs[frames, frame_labels[frames]]
+        frame_count = np.bincount(tokens, minlength=n_tokens)
+        token_gop = np.bincount(tokens, weights=frame_log_post, minlength=n_tokens) / np.maximum(frame_count, 1)
+        token_start = np.full(n_tokens, n_frames)
+        token_end = np.zeros(n_tokens, dtype=np.int64)
+        np.minimum.at(token_start, tokens, frames)
+        np.maximum.at(token_end, tokens, frames + 1)
+        token_score = 100.0 * np.exp(token_gop)
+
+        # 单词级：对所属字符取平均，分隔符不计分
+        in_word = word_of_token >= 0
+        word_ids = word_of_token[in_word]
+        char_count = np.bincount(word_ids, minlength=len(words))
+        word_score = np.bincount(word_ids, weights=token_score[in_word], minlength=len(words)) / np.maximum(char_count, 1)
+        word_start = np.full(len(words), n_frames)
+        word_end = np.zeros(len(words), dtype=np.int64)
+        np.minimum.at(word_start, word_ids, token_start[in_word])
+        np.maximum.at(word_end, word_ids, token_end[in_word])
+
+        frame_duration = (audio_duration / n_frames) if audio_duration else 0.02
+        word_scores = []
+        for i, word in enumerate(words):
+            char_mask = word_of_token == i
+            chars = [c for c in word.upper() if c in self.vocab]
+            word_scores.append({
+                'word': word,
+                'score': float(word_score[i]),
+                'quality': _quality_level(word_score[i]),
+                'start_time': float(word_start[i] * frame_duration),
+                'end_time': float(word_end[i] * frame_duration),
+                'char_scores': [
+                    {'char': c, 'score': float(s)} for c, s in zip(chars, token_score[char_mask])
+                ]
+            })
+
+        overall = float(np.sum(word_score * char_count) / np.sum(char_count))
+        return {
+            'overall_score': overall,
+            'word_scores': word_scores,
+            'weak_words': [w['word'] for w in word_scores if w['score'] < 60]
+        }
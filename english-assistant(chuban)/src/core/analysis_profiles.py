@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音素级分析档位
+根据 config.yaml 中的 phoneme_scoring 配置决定每次分析计算哪些声学特征族
+"""
+
+import os
+import yaml
+from dataclasses import dataclass, replace
+from typing import Dict, Optional, Any
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "config", "config.yaml")
+
+# 与 config.yaml 中 scoring_weights 的出厂值一致，评分扣分按 实际权重/默认权重 缩放
+DEFAULT_SCORING_WEIGHTS = {
+    'duration': 0.3,
+    'quality': 0.5,
+    'consistency': 0.2
+}
+
+@dataclass(frozen=True)
+class AnalysisProfile:
+    """分析档位：开启哪些特征族以及对应的延迟预算"""
+    name: str
+    f0: bool                  # 基频（yin）
+    formants: bool            # 共振峰（LPC）
+    spectral: bool            # MFCC、频谱质心、频谱带宽
+    spectral_extended: bool   # 频谱对比度、色度（开销最大）
+    temporal: bool            # RMS能量、过零率
+    latency_budget_ms: int    # 5秒录音在CPU上的目标分析耗时（不含模型推理）
+    description: str
+
+    def apply_feature_flags(self, flags: Dict[str, bool]) -> 'AnalysisProfile':
+        """叠加配置文件中的全局特征开关，被关闭的特征族在任何档位都不计算"""
+        spectral = self.spectral and flags.get('spectral', True)
+        return replace(
+            self,
+            f0=self.f0 and flags.get('f0', True),
+            formants=self.formants and flags.get('formants', True),
+            spectral=spectral,
+            spectral_extended=self.spectral_extended and spectral,
+            temporal=self.temporal and flags.get('temporal', True)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'f0': self.f0,
+            'formants': self.formants,
+            'spectral': self.spectral,
+            'spectral_extended': self.spectral_extended,
+            'temporal': self.temporal,
+            'latency_budget_ms': self.latency_budget_ms,
+            'description': self.description
+        }
+
+
+ANALYSIS_PROFILES = {
+    'fast': AnalysisProfile(
+        name='fast', f0=False, formants=False, spectral=False, spectral_extended=False,
+        temporal=True, latency_budget_ms=150,
+        description='仅时长与能量/过零率检查，适合关闭详细反馈的用户'
+    ),
+    'standard': AnalysisProfile(
+        name='standard', f0=True, formants=False, spectral=True, spectral_extended=False,
+        temporal=True, latency_budget_ms=800,
+        description='基频、MFCC、频谱质心/带宽与时域特征（默认）'
+    ),
+    'full': AnalysisProfile(
+        name='full', f0=True, formants=True, spectral=True, spectral_extended=True,
+        temporal=True, latency_budget_ms=2500,
+        description='在标准档基础上增加共振峰、频谱对比度与色度特征'
+    ),
+}
+
+DEFAULT_PROFILE = 'standard'
+
+_config = None
+
+def load_config_section(section: str, config_file: str = CONFIG_FILE) -> Dict[str, Any]:
+    """读取 config.yaml 中的某一段（整个文件只读取一次）"""
+    global _config
+    if _config is None:
+        try:
+            with open(config_file, 'r', encoding='utf-8') as f:
+                _config = yaml.safe_load(f) or {}
+        except Exception as e:
+            print(f"加载配置文件失败: {e}")
+            _config = {}
+    return _config.get(section, {}) or {}
+
+def load_phoneme_scoring_config(config_file: str = CONFIG_FILE) -> Dict[str, Any]:
+    """读取 config.yaml 中的 phoneme_scoring 段（带缓存）"""
+    return load_config_section('phoneme_scoring', config_file)
+
+def get_scoring_weights() -> Dict[str, float]:
+    """获取评分权重，缺失项使用默认值"""
+    weights = dict(DEFAULT_SCORING_WEIGHTS)
+    weights.update(load_phoneme_scoring_config().get('scoring_weights', {}) or {})
+    return weights
+
+def resolve_analysis_profile(name: Optional[str] = None,
+                             user_settings: Optional[Dict[str, Any]] = None) -> AnalysisProfile:
+    """确定本次请求使用的分析档位
+
+    优先级：请求显式指定 > 用户设置（关闭详细反馈时使用 fast）> 配置文件 default_profile
+    """
+    config = load_phoneme_scoring_config()
+
+    if name not in ANALYSIS_PROFILES:
+        if name:
+            print(f"未知的分析档位 '{name}'，使用默认档位")
+        name = None
+
+    if name is None and user_settings and user_settings.get('enable_detailed_feedback') is False:
+        name = 'fast'
+
+    if name is None:
+        name = config.get('default_profile', DEFAULT_PROFILE)
+        if name not in ANALYSIS_PROFILES:
+            name = DEFAULT_PROFILE
+
+    flags = config.get('feature_extraction', {}) or {}
+    return ANALYSIS_PROFILES[name].apply_feature_flags(flags)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+语音识别引擎路由
+系统里有三种识别器：Wav2Vec2 贪心 CTC（最快，无标点和大小写）、int8 量化的 Whisper
+（faster-whisper）和完整的 Whisper（openai-whisper）。路由层根据录音时长、是否需要标点/大小写、
+各引擎当前的排队情况和请求的延迟预算，选出满足要求的最便宜的引擎；每个结果都带上实际使用的引擎。
+引擎参数和各用途的要求都在 config.yaml 的 asr_router 段，调整配置即可把流量切到更便宜的引擎。
+默认只启用与 transcription.backend 一致的那个 Whisper 引擎，每个 worker 只加载、预热一份 Whisper 模型。
+"""
+
+import os
+import time
+import threading
+import importlib.util
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from .analysis_profiles import load_config_section
+from .audio_buffer import as_audio_buffer
+
+
+@dataclass
+class EngineSpec:
+    """引擎的能力和延迟模型：预计耗时 = overhead_ms + rtf × 音频时长，按并发数排队"""
+    name: str
+    tier: int                   # 识别质量等级，越大越准
+    formatting: bool            # 输出是否带标点和大小写
+    rtf: float                  # 实时率（处理 1 秒音频需要的秒数），运行中按实测值平滑更新
+    overhead_ms: float          # 每次调用的固定开销
+    concurrency: int = 1        # 可同时执行的请求数
+    max_seconds: float = 600    # 能处理的最长音频
+
+
+DEFAULT_ENGINES = {
+    'ctc': EngineSpec('ctc', tier=1, formatting=False, rtf=0.05, overhead_ms=50, concurrency=2, max_seconds=60),
+    'whisper-int8': EngineSpec('whisper-int8', tier=2, formatting=True, rtf=0.15, overhead_ms=200),
+    'whisper': EngineSpec('whisper', tier=3, formatting=True, rtf=0.6, overhead_ms=300),
+}
+
+# 各用途的默认要求：最低质量等级、是否需要标点/大小写、延迟预算
+DEFAULT_PURPOSES = {
+    'transcription': {'min_tier': 2, 'needs_formatting': True, 'latency_budget_ms': 5000},
+    'grammar': {'min_tier': 2, 'needs_formatting': True, 'latency_budget_ms': 15000},
+    'draft': {'min_tier': 1, 'needs_formatting': False, 'latency_budget_ms': 1000},
+}
+
+# Whisper 引擎对应的转写后端（语音转写.TRANSCRIPTION_BACKENDS）
+ENGINE_BACKENDS = {'whisper-int8': 'faster-whisper', 'whisper': 'openai-whisper'}
+
+# 实测实时率的平滑系数
+EWMA_ALPHA = 0.2
+
+
+def _ctc_available() -> bool:
+    model_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                             "data", "models", "wav2vec2-base-960h")
+    return (importlib.util.find_spec('torch') is not None
+            and importlib.util.find_spec('transformers') is not None
+            and os.path.isdir(model_dir))
+
+
+def _run_ctc(audio) -> str:
+    from .发音评分模块 import run_ctc_recognition
+    transcription = run_ctc_recognition(as_audio_buffer(audio).as_normalized())[0]
+    return transcription.lower().strip()
+
+
+def _run_whisper(audio, backend: str) -> str:
+    from .语音转写 import get_transcriber, transcribe_audio_detailed
+    from .长音频转写 import load_long_form_config, transcribe_long_form
+    transcriber = get_transcriber(backend)
+    long_form = load_long_form_config()
+    if long_form['enabled'] and as_audio_buffer(audio).duration > long_form['min_seconds']:
+        return transcribe_long_form(audio, transcriber=transcriber)['text']
+    return transcribe_audio_detailed(audio, word_timestamps=False, transcriber=transcriber)['text']
+
+
+class ASRRouter:
+    """为每个请求选择识别引擎并记录负载和实测耗时"""
+
+    def __init__(self, engines: Dict[str, EngineSpec], purposes: Dict[str, Dict],
+                 disabled: Optional[List[str]] = None):
+        self.engines = engines
+        self.purposes = purposes
+        self.disabled = set(disabled or [])
+        self._lock = threading.Lock()
+        self._inflight = {name: 0 for name in engines}
+        self._stats = {name: {'requests': 0, 'failures': 0, 'audio_seconds': 0.0, 'busy_seconds': 0.0}
+                       for name in engines}
+        self._available = None
+
+    def available_engines(self) -> List[str]:
+        if self._available is None:
+            from .语音转写 import _backend_available
+            checks = {'ctc': _ctc_available()}
+            checks.update({name: _backend_available(backend) for name, backend in ENGINE_BACKENDS.items()})
+            self._available = [name for name in self.engines if checks.get(name) and name not in self.disabled]
+        return self._available
+
+    def whisper_backends(self) -> List[str]:
+        """可能被选中的 Whisper 引擎对应的转写后端，模型预加载按此预热"""
+        return [ENGINE_BACKENDS[name] for name in self.available_engines() if name in ENGINE_BACKENDS]
+
+    def estimate_ms(self, name: str, duration: float) -> float:
+        """预计耗时：单次耗时 × 需要等待的批次数（当前在执行的请求按并发数分批）"""
+        spec = self.engines[name]
+        per_call = spec.overhead_ms + spec.rtf * duration * 1000
+        with self._lock:
+            waves = self._inflight[name] // max(spec.concurrency, 1) + 1
+        return per_call * waves
+
+    def choose(self, duration: float, purpose: str = 'transcription', needs_formatting: Optional[bool] = None,
+               latency_budget_ms: Optional[float] = None, min_tier: Optional[int] = None) -> Dict:
+        """选出引擎，返回 {'engine', 'estimated_ms', 'reason'}
+
+        满足标点要求、质量等级和时长上限的引擎中，取预计耗时在预算内的最便宜者；
+        都超出预算时退而求其次，取其中预计最快的一个（仍然满足质量等级）。
+
+        Raises:
+            RuntimeError: 没有满足标点要求、质量等级和时长上限的引擎
+        """
+        policy = dict(self.purposes.get(purpose) or self.purposes['transcription'])
+        if needs_formatting is not None:
+            policy['needs_formatting'] = needs_formatting
+        if latency_budget_ms is not None:
+            policy['latency_budget_ms'] = latency_budget_ms
+        if min_tier is not None:
+            policy['min_tier'] = min_tier
+
+        adequate = [name for name in self.available_engines()
+                    if duration <= self.engines[name].max_seconds
+                    and (self.engines[name].formatting or not policy['needs_formatting'])
+                    and self.engines[name].tier >= policy['min_tier']]
+        if not adequate:
+            raise RuntimeError("没有可用的语音识别引擎满足要求")
+        estimates = {name: self.estimate_ms(name, duration) for name in adequate}
+        for name in sorted(adequate, key=lambda name: (self.engines[name].tier, estimates[name])):
+            if estimates[name] <= policy['latency_budget_ms']:
+                return {'engine': name, 'estimated_ms': estimates[name], 'reason': 'cheapest_within_budget'}
+        fastest = min(adequate, key=lambda name: estimates[name])
+        return {'engine': fastest, 'estimated_ms': estimates[fastest], 'reason': 'over_budget_fastest'}
+
+    def _run_engine(self, name: str, audio) -> str:
+        if name == 'ctc':
+            return _run_ctc(audio)
+        return _run_whisper(audio, ENGINE_BACKENDS[name])
+
+    def transcribe(self, audio, purpose: str = 'transcription', **requirements) -> Dict:
+        """按路由结果转写，返回 {'text', 'engine', 'estimated_ms', 'elapsed_ms', 'reason'}"""
+        duration = as_audio_buffer(audio).duration
+        decision = self.choose(duration, purpose, **requirements)
+        name = decision['engine']
+        with self._lock:
+            self._inflight[name] += 1
+        start = time.perf_counter()
+        try:
+            text = self._run_engine(name, audio)
+        except Exception:
+            with self._lock:
+                self._stats[name]['failures'] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._inflight[name] -= 1
+        with self._lock:
+            stats = self._stats[name]
+            stats['requests'] += 1
+            stats['audio_seconds'] += duration
+            stats['busy_seconds'] += elapsed
+            if duration > 1.0:
+                # 实测实时率（扣除固定开销）平滑进延迟模型，硬件或负载变化后估计会自动跟上
+                spec = self.engines[name]
+                observed = max(elapsed - spec.overhead_ms / 1000, 0) / duration
+                spec.rtf = (1 - EWMA_ALPHA) * spec.rtf + EWMA_ALPHA * observed
+        print(f"🎯 ASR路由: {name} ({decision['reason']}, 预计 {decision['estimated_ms']:.0f}ms, "
+              f"实际 {elapsed * 1000:.0f}ms, 音频 {duration:.1f}s)")
+        return dict(decision, text=text, elapsed_ms=elapsed * 1000)
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                'available': self.available_engines(),
+                'engines': {name: dict(self._stats[name], inflight=self._inflight[name],
+                                       rtf=round(spec.rtf, 4), tier=spec.tier)
+                            for name, spec in self.engines.items()}
+            }
+
+
+_asr_router = None
+
+def get_asr_router() -> ASRRouter:
+    """获取识别引擎路由（单例），引擎参数和各用途的要求可在 config.yaml 的 asr_router 段覆盖"""
+    global _asr_router
+    if _asr_router is None:
+        config = load_config_section('asr_router')
+        engines = {}
+        for name, spec in DEFAULT_ENGINES.items():
+            overrides = (config.get('engines') or {}).get(name) or {}
+            engines[name] = EngineSpec(**dict(spec.__dict__, **{k: v for k, v in overrides.items()
+                                                                 if k in spec.__dict__ and k != 'name'}))
+        purposes = {name: dict(policy) for name, policy in DEFAULT_PURPOSES.items()}
+        for name, overrides in (config.get('purposes') or {}).items():
+            purposes.setdefault(name, dict(DEFAULT_PURPOSES['transcription'])).update(overrides or {})
+        disabled = list(config.get('disabled') or [])
+        if config.get('whisper_engines', 'configured') == 'configured':
+            # 只启用 transcription.backend 对应的 Whisper 引擎，与模型预加载保持一致
+            from .语音转写 import resolve_transcription_backend
+            try:
+                backend = resolve_transcription_backend()
+                disabled += [name for name, engine_backend in ENGINE_BACKENDS.items() if engine_backend != backend]
+            except ImportError:
+                pass
+        _asr_router = ASRRouter(engines, purposes, disabled=disabled)
+        print(f"✅ ASR路由可用引擎: {', '.join(_asr_router.available_engines()) or '无'}")
+    return _asr_router
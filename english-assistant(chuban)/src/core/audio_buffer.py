@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+不可变音频缓冲区
+一次请求内的音频只解码、转换、归一化各一次，之后以 AudioBuffer 在
+app → 发音评分 → 音素评分 / Whisper / 缓存层之间传递，各环节共享同一块只读内存，
+RMS、STFT、基频等派生特征也只计算一次。
+"""
+
+import hashlib
+import numpy as np
+from typing import Tuple, Union
+
+TARGET_SR = 16000
+
+
+class AudioBuffer:
+    """只读的 float32 单声道音频及其派生数据
+
+    samples 为只读数组；trimmed、派生特征都是它的视图或惰性计算的缓存，不会复制音频。
+    """
+
+    __slots__ = ('_samples', 'sr', 'normalized', '_content_hash', '_trim_offsets', '_feature_cache')
+
+    def __init__(self, samples: np.ndarray, sr: int = TARGET_SR, normalized: bool = False):
+        samples = np.asarray(samples)
+        if samples.ndim != 1:
+            samples = samples.reshape(-1)
+        if samples.dtype != np.float32 or not samples.flags.c_contiguous:
+            # 唯一可能发生拷贝的地方：输入不是连续的 float32
+            samples = np.ascontiguousarray(samples, dtype=np.float32)
+        if samples.flags.writeable:
+            samples = samples.view()
+            samples.flags.writeable = False
+        self._samples = samples
+        self.sr = sr
+        self.normalized = normalized
+        self._content_hash = None
+        self._trim_offsets = None
+        self._feature_cache = None
+
+    @classmethod
+    def from_decoded(cls, samples: np.ndarray, sr: int = TARGET_SR, normalize: bool = False) -> 'AudioBuffer':
+        """接管解码器刚产出的数组（调用方之后不再修改它），需要时就地做峰值归一化"""
+        samples = np.ascontiguousarray(samples, dtype=np.float32)
+        if normalize:
+            if not samples.flags.writeable:
+                # np.frombuffer 等得到的只读数组不能就地修改
+                samples = samples.copy()
+            _normalize_inplace(samples)
+        return cls(samples, sr, normalized=normalize)
+
+    # ---- 基本属性 ----
+
+    @property
+    def samples(self) -> np.ndarray:
+        return self._samples
+
+    @property
+    def duration(self) -> float:
+        return len(self._samples) / self.sr
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def __repr__(self) -> str:
+        return f"AudioBuffer({self.duration:.2f}s, sr={self.sr}, normalized={self.normalized})"
+
+    @property
+    def content_hash(self) -> str:
+        """样本内容的哈希（直接对只读内存求哈希，不复制），用作缓存键"""
+        if self._content_hash is None:
+            digest = hashlib.blake2b(self._samples.data, digest_size=16)
+            digest.update(str(self.sr).encode('ascii'))
+            self._content_hash = digest.hexdigest()
+        return self._content_hash
+
+    # ---- 归一化与静音裁剪 ----
+
+    def as_normalized(self) -> 'AudioBuffer':
+        """峰值归一化后的缓冲区；已归一化时返回自身"""
+        if self.normalized:
+            return self
+        samples = self._samples.copy()
+        _normalize_inplace(samples)
+        return AudioBuffer(samples, self.sr, normalized=True)
+
+    @property
+    def trim_offsets(self) -> Tuple[int, int]:
+        """去除首尾静音(top_db=30)后的采样点区间 [start, end)"""
+        if self._trim_offsets is None:
+            import librosa
+            if len(self._samples) == 0:
+                self._trim_offsets = (0, 0)
+            else:
+                _, (start, end) = librosa.effects.trim(self._samples, top_db=30)
+                self._trim_offsets = (int(start), int(end))
+        return self._trim_offsets
+
+    @property
+    def trimmed(self) -> np.ndarray:
+        """去除首尾静音后的视图"""
+        start, end = self.trim_offsets
+        return self._samples[start:end]
+
+    # ---- 共享的派生特征 ----
+
+    def feature_cache(self, formant_tracker=None):
+        """整段音频的逐帧特征缓存，所有环节共享同一个实例"""
+        if self._feature_cache is None:
+            from .音素特征提取 import FrameFeatureCache
+            self._feature_cache = FrameFeatureCache(self._samples, self.sr, formant_tracker)
+        elif formant_tracker is not None and self._feature_cache.formant_tracker is None:
+            self._feature_cache.formant_tracker = formant_tracker
+        return self._feature_cache
+
+    def rms(self, frame_length: int = 400, hop_length: int = 160) -> np.ndarray:
+        return self.feature_cache().rms(frame_length, hop_length)
+
+    def stft(self, n_fft: int = 400, hop_length: int = 160) -> np.ndarray:
+        return self.feature_cache().stft(n_fft, hop_length)
+
+    def f0(self, fmin: float = 80, fmax: float = 400) -> np.ndarray:
+        return self.feature_cache().f0(fmin, fmax)
+
+
+def _normalize_inplace(samples: np.ndarray):
+    peak = float(np.max(np.abs(samples))) if len(samples) else 0.0
+    if peak > 0:
+        samples *= 1.0 / peak
+
+
+def as_audio_buffer(audio: Union[AudioBuffer, np.ndarray], sr: int = TARGET_SR) -> AudioBuffer:
+    """把数组包装为 AudioBuffer；已经是 AudioBuffer 时原样返回"""
+    if isinstance(audio, AudioBuffer):
+        return audio
+    if audio is None:
+        raise ValueError("音频数据为空")
+    return AudioBuffer(audio, sr)
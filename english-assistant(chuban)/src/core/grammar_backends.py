@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分级语法检查
+本地规则引擎（本地语法规则.py）先检查，能直接给出结论时不再请求 LanguageTool；
+需要更深的检查时才请求远程服务，远程请求失败或处于冷却期时返回本地规则的结果。
+远程结果写入 grammar_cache，重复的句子不再请求网络。检查模式、冷却时间和缓存见 config.yaml 的 grammar 段。
+"""
+
+import time
+import threading
+from dataclasses import replace
+from typing import Dict, List, Optional
+
+from .analysis_profiles import load_config_section
+from .grammar_cache import GrammarCache
+from .grammar_client import GrammarBackend
+
+GRAMMAR_MODES = ('tiered', 'remote', 'local')
+
+
+class TieredGrammarChecker:
+    """按模式组合本地和远程后端
+
+    tiered: 先用本地规则；本地发现的问题都来自高置信度规则且 stop_on_local_errors 时直接返回，否则再请求远程
+    remote: 总是请求远程，远程不可用时用本地规则兜底
+    local:  只用本地规则
+    """
+
+    def __init__(self, local: GrammarBackend, remote: Optional[GrammarBackend], mode: str = 'tiered',
+                 stop_on_local_errors: bool = True, remote_cooldown_seconds: float = 30,
+                 cache: Optional[GrammarCache] = None):
+        if mode not in GRAMMAR_MODES:
+            raise ValueError(f"未知的语法检查模式: {mode}（可选 {', '.join(GRAMMAR_MODES)}）")
+        self.local = local
+        self.remote = remote
+        self.mode = mode if remote is not None else 'local'
+        self.stop_on_local_errors = stop_on_local_errors
+        self.remote_cooldown_seconds = remote_cooldown_seconds
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._remote_down_until = 0.0
+        self._stats = {'checks': 0, 'local_answers': 0, 'remote_answers': 0, 'cache_answers': 0, 'fallbacks': 0,
+                       'remote_skipped': 0, 'local_total_ms': 0.0}
+
+    def _count(self, key: str, local_ms: float = 0.0):
+        with self._lock:
+            self._stats['checks'] += 1
+            self._stats[key] += 1
+            self._stats['local_total_ms'] += local_ms
+
+    def _remote_suspended(self) -> bool:
+        """远程失败后的冷却期内不再请求，除非后台健康检查已确认服务恢复"""
+        with self._lock:
+            down_until = self._remote_down_until
+        return time.time() < down_until and getattr(self.remote, 'healthy', None) is not True
+
+    def _check_local(self, text: str):
+        start = time.perf_counter()
+        matches = self.local.check(text)
+        return matches, (time.perf_counter() - start) * 1000
+
+    def check(self, text: str) -> Dict:
+        """检查文本，返回 {'matches', 'backend', 'fallback', 'cached'}
+
+        fallback 表示远程不可用、用了本地结果；cached 为命中的缓存层级（'memory'/'disk'），未命中为 None。
+        本地规则的结果不缓存（重新计算只需几十微秒）。
+        """
+        return self.check_many([text])[0]
+
+    def check_many(self, texts: List[str]) -> List[Dict]:
+        """批量检查，每句的处理与 check 相同；需要远程检查的句子去重后交给远程后端的 check_many 一次发出"""
+        results: List[Optional[Dict]] = [None] * len(texts)
+        local_results = {}
+        pending: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            if self.mode != 'remote':
+                local_matches, local_ms = local_results[i] = self._check_local(text)
+                if self.mode == 'local' or (self.stop_on_local_errors and self.local.is_conclusive(local_matches)):
+                    self._count('local_answers', local_ms)
+                    results[i] = {'matches': local_matches, 'backend': self.local.name,
+                                  'fallback': False, 'cached': None}
+                    continue
+            if self.cache is not None:
+                hit = self.cache.get(text)
+                if hit is not None:
+                    matches, backend, level = hit
+                    self._count('cache_answers', local_results.get(i, (None, 0.0))[1])
+                    results[i] = {'matches': matches, 'backend': backend, 'fallback': False, 'cached': level}
+                    continue
+            pending.setdefault(text, []).append(i)
+
+        if not pending:
+            return results
+        unique = list(pending)
+        if self._remote_suspended():
+            remote_results, key = [None] * len(unique), 'remote_skipped'
+        else:
+            try:
+                remote_results = self.remote.check_many(unique)
+            except Exception as e:
+                print(f"{self.remote.name} 检查失败: {e}")
+                remote_results = [None] * len(unique)
+            key = 'fallbacks'
+            if any(matches is None for matches in remote_results):
+                print(f"⚠️ {self.remote.name} 不可用，{self.remote_cooldown_seconds:.0f}s 内使用本地语法规则")
+                with self._lock:
+                    self._remote_down_until = time.time() + self.remote_cooldown_seconds
+
+        for text, matches in zip(unique, remote_results):
+            if matches is not None and self.cache is not None:
+                self.cache.put(text, matches, self.remote.name)
+            for n, i in enumerate(pending[text]):
+                if i not in local_results and matches is None:
+                    local_results[i] = self._check_local(text)
+                local_matches, local_ms = local_results.get(i, (None, 0.0))
+                if matches is None:
+                    self._count(key, local_ms)
+                    results[i] = {'matches': local_matches, 'backend': self.local.name,
+                                  'fallback': True, 'cached': None}
+                else:
+                    self._count('remote_answers', local_ms)
+                    # 同一批中重复的句子各自拿一份副本，调用方修改 offset 等字段时互不影响
+                    copies = matches if n == 0 else [replace(m, replacements=list(m.replacements)) for m in matches]
+                    results[i] = {'matches': copies, 'backend': self.remote.name, 'fallback': False, 'cached': None}
+        return results
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            down_until = self._remote_down_until
+        stats['local_avg_ms'] = stats.pop('local_total_ms') / stats['checks'] if stats['checks'] else None
+        result = {'mode': self.mode, 'remote_suspended_until': down_until if down_until > time.time() else None,
+                  **stats}
+        if self.remote is not None and hasattr(self.remote, 'metrics'):
+            result[self.remote.name] = self.remote.metrics()
+        if self.cache is not None:
+            result['cache'] = self.cache.metrics()
+        return result
+
+
+_grammar_checker = None
+_checker_lock = threading.Lock()
+
+def get_grammar_checker() -> TieredGrammarChecker:
+    """获取分级语法检查器（单例），参数见 config.yaml 的 grammar 段"""
+    global _grammar_checker
+    with _checker_lock:
+        if _grammar_checker is None:
+            from .grammar_client import get_language_tool_client
+            from .本地语法规则 import LocalRuleBackend
+            config = load_config_section('grammar')
+            mode = config.get('mode', 'tiered')
+            remote = get_language_tool_client() if mode != 'local' else None
+            cache_config = config.get('cache') or {}
+            cache = None
+            if remote is not None and cache_config.get('enabled', True):
+                # 规则集：服务、语言、母语和 rule_version，任何一项变化后旧结果不再命中
+                ruleset = (f"{remote.name}|{remote.server}|{remote.language}|{remote.mother_tongue}|"
+                           f"v{cache_config.get('rule_version', 1)}")
+                cache = GrammarCache(cache_config.get('db_path', 'data/grammar_cache.sqlite3'), ruleset,
+                                     memory_size=cache_config.get('memory_size', 2048),
+                                     ttl_seconds=cache_config.get('ttl_seconds', 7 * 24 * 3600))
+            _grammar_checker = TieredGrammarChecker(
+                local=LocalRuleBackend(config.get('disabled_rules'), config.get('high_confidence_rules')),
+                remote=remote,
+                mode=mode,
+                stop_on_local_errors=config.get('stop_on_local_errors', True),
+                remote_cooldown_seconds=config.get('remote_cooldown_seconds', 30),
+                cache=cache
+            )
+            print(f"✅ 语法检查模式: {_grammar_checker.mode}")
+        return _grammar_checker
+
+
+if __name__ == "__main__":
+    # 批量检查基准：在本地启动一个模拟 LanguageTool 的服务（固定网络延迟 + 本地规则按段落检查），
+    # 比较逐句请求与 check_many 的吞吐和请求数。模拟服务按构造就逐段独立检查，两者结果的比较只验证
+    # 拼接和按 offset 拆分的簿记；批量结果是否与逐句检查一致要用 --server 在真实服务上比较
+    import argparse
+    import json
+    import urllib.parse
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from .data_processing import load_sentences_and_paths
+    from .grammar_client import BATCH_SEPARATOR, LanguageToolClient
+    from .本地语法规则 import LocalRuleBackend
+    from .音素统计表 import DEFAULT_TSV_FILE
+
+    parser = argparse.ArgumentParser(description="批量语法检查基准")
+    parser.add_argument('--tsv', default=DEFAULT_TSV_FILE, help='句子语料（Common Voice validated.tsv）')
+    parser.add_argument('--limit', type=int, default=200, help='检查的句子数')
+    parser.add_argument('--latency-ms', type=float, default=80, help='模拟服务每个请求的网络延迟')
+    parser.add_argument('--server', default=None, help='使用真实的 LanguageTool 服务而不是模拟服务')
+    args = parser.parse_args()
+
+    rules = LocalRuleBackend()
+
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *a):
+            pass
+
+        def _send(self, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._send([{'name': 'English (US)', 'code': 'en', 'longCode': 'en-US'}])
+
+        def do_POST(self):
+            form = urllib.parse.parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+            text = form['text'][0]
+            time.sleep(args.latency_ms / 1000)
+            # 与 LanguageTool 一样按段落独立检查
+            matches, position = [], 0
+            for paragraph in text.split(BATCH_SEPARATOR):
+                for m in rules.check(paragraph):
+                    matches.append({'message': m.message, 'offset': m.offset + position, 'length': m.length,
+                                    'replacements': [{'value': r} for r in m.replacements],
+                                    'context': {'text': m.context},
+                                    'rule': {'id': m.rule_id, 'category': {'id': m.category}}})
+                position += len(paragraph) + len(BATCH_SEPARATOR)
+            self._send({'matches': matches})
+
+    server_url = args.server
+    if server_url is None:
+        stand_in = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        threading.Thread(target=stand_in.serve_forever, daemon=True).start()
+        server_url = f"http://127.0.0.1:{stand_in.server_port}"
+
+    sentences = [str(r['sentence']) for r in load_sentences_and_paths(args.tsv) if isinstance(r['sentence'], str)]
+    # 一半句子改成小写开头、冠词写错，让结果里有需要拆分回各句的问题
+    corpus = [s[:1].lower() + s[1:].replace(' an ', ' a ') if i % 2 else s
+              for i, s in enumerate(sentences[:args.limit])]
+
+    def signature(matches):
+        return [(m.rule_id, m.offset, m.length, tuple(m.replacements), m.message) for m in matches]
+
+    client = LanguageToolClient(server_url, health_check_interval=0)
+    start = time.perf_counter()
+    single = [client.check(text) for text in corpus]
+    single_seconds = time.perf_counter() - start
+    single_requests = client.metrics()['http_requests']
+
+    start = time.perf_counter()
+    batched = client.check_many(corpus)
+    batch_seconds = time.perf_counter() - start
+    batch_requests = client.metrics()['http_requests'] - single_requests
+
+    mismatches = [text for text, a, b in zip(corpus, single, batched) if b is None or signature(a) != signature(b)]
+    for text in mismatches[:10]:
+        print(f"不一致: {text}")
+    print(f"{len(corpus)} 句, 服务 {server_url}")
+    print(f"逐句请求: {single_requests} 次请求, {single_seconds:.2f}s, {len(corpus) / single_seconds:.1f} 句/秒")
+    print(f"批量请求: {batch_requests} 次请求（每批 ≤{client.batch_max_chars} 字符, 并发 {client.pool_size}）, "
+          f"{batch_seconds:.2f}s, {len(corpus) / batch_seconds:.1f} 句/秒")
+    if args.server is None:
+        print(f"拆分后与逐句结果不一致 {len(mismatches)} 句（模拟服务，只验证 offset 拆分）")
+    else:
+        print(f"与逐句结果不一致 {len(mismatches)} 句")
+    client.stop()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+语法检查结果缓存
+同一个班级翻译同一批口语句子，提交的英文大量重复。LanguageTool 的检查结果按
+（规范化文本, 规则集）缓存：内存 LRU 在前，SQLite 持久层在后，重启后仍然有效；
+条目超过 TTL 即失效，规则集（语言、服务、rule_version）变化后旧条目全部作废。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Dict, List, Optional, Tuple
+
+from .analysis_profiles import CONFIG_FILE
+from .grammar_client import GrammarMatch
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(CONFIG_FILE))
+
+
+def normalize_grammar_text(text: str) -> str:
+    """缓存和检查共用的规范化：Unicode NFC 并去掉首尾空白（不改动句中内容，offset 仍对应规范化后的文本）"""
+    return unicodedata.normalize('NFC', text).strip()
+
+
+class GrammarCache:
+    """两级缓存：内存 LRU + SQLite，键为 sha1(规则集 + 规范化文本)"""
+
+    def __init__(self, db_path: Optional[str], ruleset: str, memory_size: int = 2048,
+                 ttl_seconds: float = 7 * 24 * 3600):
+        self.ruleset = ruleset
+        self.memory_size = memory_size
+        self.ttl_seconds = ttl_seconds
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'expired': 0}
+        self._db = None
+        if db_path:
+            self.db_path = db_path if os.path.isabs(db_path) else os.path.join(PROJECT_ROOT, db_path)
+            self._open()
+
+    def _open(self):
+        try:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            # 多个请求线程共用一个连接，由 self._lock 串行化；多个 worker 进程通过 WAL 并发读写同一文件
+            self._db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS grammar_results ('
+                             'key TEXT PRIMARY KEY, ruleset TEXT NOT NULL, created REAL NOT NULL, '
+                             'backend TEXT NOT NULL, matches TEXT NOT NULL)')
+            # 规则集变化（rule_version 加一、换服务或语言）后旧结果不会再命中，启动时清掉；过期条目一并删除
+            purged = self._db.execute('DELETE FROM grammar_results WHERE ruleset != ? OR created < ?',
+                                      (self.ruleset, time.time() - self.ttl_seconds)).rowcount
+            self._db.commit()
+            if purged:
+                print(f"🧹 语法缓存清理 {purged} 条失效结果")
+        except sqlite3.Error as e:
+            print(f"⚠️ 语法缓存数据库不可用，只使用内存缓存: {e}")
+            self._db = None
+
+    def key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.ruleset}\n{normalize_grammar_text(text)}".encode('utf-8')).hexdigest()
+
+    def get(self, text: str) -> Optional[Tuple[List[GrammarMatch], str, str]]:
+        """返回 (matches, backend, 命中层级 'memory'/'disk')，未命中或已过期时返回 None"""
+        key = self.key(text)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return [GrammarMatch(**m) for m in entry[2]], entry[1], 'memory'
+                del self._memory[key]
+                self._stats['expired'] += 1
+            row = None
+            if self._db is not None:
+                try:
+                    row = self._db.execute('SELECT created, backend, matches FROM grammar_results WHERE key = ?',
+                                           (key,)).fetchone()
+                except sqlite3.Error as e:
+                    print(f"读取语法缓存失败: {e}")
+            if row is not None and now - row[0] > self.ttl_seconds:
+                self._stats['expired'] += 1
+                row = None
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            matches = json.loads(row[2])
+            self._remember(key, (row[0], row[1], matches))
+            self._stats['disk_hits'] += 1
+        return [GrammarMatch(**m) for m in matches], row[1], 'disk'
+
+    def _remember(self, key: str, entry: Tuple):
+        """调用方持有锁"""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def put(self, text: str, matches: List[GrammarMatch], backend: str):
+        key = self.key(text)
+        created = time.time()
+        serialized = [asdict(m) for m in matches]
+        with self._lock:
+            self._remember(key, (created, backend, serialized))
+            self._stats['stores'] += 1
+            if self._db is not None:
+                try:
+                    self._db.execute('INSERT OR REPLACE INTO grammar_results VALUES (?, ?, ?, ?, ?)',
+                                     (key, self.ruleset, created, backend,
+                                      json.dumps(serialized, ensure_ascii=False)))
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"写入语法缓存失败: {e}")
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+            if self._db is not None:
+                try:
+                    stats['disk_entries'] = self._db.execute('SELECT COUNT(*) FROM grammar_results').fetchone()[0]
+                except sqlite3.Error:
+                    stats['disk_entries'] = None
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else None
+        stats['ruleset'] = self.ruleset
+        return stats
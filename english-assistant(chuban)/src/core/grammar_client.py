@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LanguageTool HTTP 客户端
+进程内只创建一个客户端，所有请求线程共享同一个 requests.Session 和 keep-alive 连接池，
+不再每次检查都新建 LanguageTool 对象和 HTTP 连接；每次调用带连接/读取超时，
+后台线程定期做健康检查，连接复用情况通过 metrics() 查看。
+修正文本由 apply_corrections 根据同一次检查的结果在本地生成，不再为 correct 再请求一次。
+批量检查（check_many）把多个句子按段落拼接成少数几个有长度上限的请求并发发送，再按 offset 拆回各句。
+"""
+
+import re
+import time
+import bisect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .analysis_profiles import load_config_section
+
+DEFAULT_SERVER = "https://api.languagetool.org"
+
+# 批量检查时各句之间的分隔：空行让 LanguageTool 把每句当作独立的段落
+BATCH_SEPARATOR = "\n\n"
+# 跨段落计数的文本级规则（连续几段/几句以同一个词开头），单句检查时不会触发，拼接请求中关闭
+CROSS_TEXT_RULES = ('PARAGRAPH_REPEAT_BEGINNING_RULE', 'ENGLISH_WORD_REPEAT_BEGINNING_RULE')
+CONTEXT_CHARS = 40
+_SENTENCE_END_RE = re.compile(r"[.!?]+(?=\s|$)")
+
+
+@dataclass
+class GrammarMatch:
+    """LanguageTool 返回的一处问题"""
+    rule_id: str
+    message: str
+    offset: int
+    length: int
+    replacements: List[str] = field(default_factory=list)
+    context: str = ""
+    category: str = ""
+
+    @classmethod
+    def from_json(cls, match: Dict) -> 'GrammarMatch':
+        return cls(
+            rule_id=match.get('rule', {}).get('id', ''),
+            message=match.get('message', ''),
+            offset=int(match.get('offset', 0)),
+            length=int(match.get('length', 0)),
+            replacements=[r['value'] for r in match.get('replacements', []) if 'value' in r],
+            context=match.get('context', {}).get('text', ''),
+            category=match.get('rule', {}).get('category', {}).get('id', '')
+        )
+
+
+def _utf16_offsets_to_index(text: str, matches: List[GrammarMatch]):
+    """LanguageTool（Java）的 offset/length 以 UTF-16 码元计，文本含 emoji 等 BMP 以外的字符时换算为 Python 下标"""
+    index_of, units = {}, 0
+    for i, char in enumerate(text):
+        index_of[units] = i
+        units += 2 if ord(char) > 0xFFFF else 1
+    index_of[units] = len(text)
+    for match in matches:
+        start = index_of.get(match.offset, match.offset)
+        end = index_of.get(match.offset + match.length, start + match.length)
+        match.offset, match.length = start, end - start
+
+
+def apply_corrections(text: str, matches: Iterable[GrammarMatch]) -> str:
+    """按 offset 顺序对每处互不重叠的问题应用第一个替换
+
+    没有替换建议的问题保持原文；与前一处已应用的替换重叠的问题跳过。问题互不重叠时结果与
+    language_tool_python 的 correct 相同；对方按原文是否仍然一致判断重叠，个别重叠情形会再替换一次
+    （见 tests/test_grammar_client.py）。
+    """
+    parts, cursor = [], 0
+    for match in sorted(matches, key=lambda m: m.offset):
+        if not match.replacements or match.offset < cursor:
+            continue
+        parts.append(text[cursor:match.offset])
+        parts.append(match.replacements[0])
+        cursor = match.offset + match.length
+    parts.append(text[cursor:])
+    return ''.join(parts)
+
+
+def can_pack(text: str) -> bool:
+    """只有单句、不含换行的文本才与其他句子拼接；多句文本可能触发跨句规则，单独请求"""
+    return '\n' not in text and len(_SENTENCE_END_RE.findall(text.strip())) <= 1
+
+
+def pack_texts(texts: List[str], max_chars: int) -> List[List[int]]:
+    """把文本下标按顺序装入若干批，每批拼接后（含分隔符）不超过 max_chars；不能拼接的文本单独一批"""
+    packs, current, size = [], [], 0
+    for i, text in enumerate(texts):
+        if not can_pack(text) or len(text) >= max_chars:
+            packs.append([i])
+            continue
+        added = len(text) + (len(BATCH_SEPARATOR) if current else 0)
+        if current and size + added > max_chars:
+            packs.append(current)
+            current, size = [], 0
+            added = len(text)
+        current.append(i)
+        size += added
+    if current:
+        packs.append(current)
+    return packs
+
+
+def split_packed_matches(texts: List[str], matches: List[GrammarMatch]) -> List[List[GrammarMatch]]:
+    """把拼接文本上的问题按 offset 分回各句，offset 改为相对所在句；跨越分隔符的问题丢弃"""
+    starts, position = [], 0
+    for text in texts:
+        starts.append(position)
+        position += len(text) + len(BATCH_SEPARATOR)
+    results = [[] for _ in texts]
+    for match in matches:
+        i = bisect.bisect_right(starts, match.offset) - 1
+        if i < 0 or match.offset + match.length > starts[i] + len(texts[i]):
+            continue
+        match.offset -= starts[i]
+        # 与单句请求一样，上下文只取本句中问题前后 CONTEXT_CHARS 个字符
+        match.context = texts[i][max(0, match.offset - CONTEXT_CHARS):match.offset + match.length + CONTEXT_CHARS]
+        results[i].append(match)
+    return results
+
+
+class GrammarBackend:
+    """语法检查后端接口：check(text) 返回按 offset 排序的 GrammarMatch 列表，失败时抛出异常"""
+    name = 'base'
+
+    def check(self, text: str) -> List[GrammarMatch]:
+        raise NotImplementedError
+
+    def is_conclusive(self, matches: List[GrammarMatch]) -> bool:
+        """check 的结果是否足以作为结论，分级检查据此决定是否还要请求下一级后端"""
+        return bool(matches)
+
+    def check_many(self, texts: List[str]) -> List[Optional[List[GrammarMatch]]]:
+        """逐句检查；某一句失败时该位置为 None"""
+        results = []
+        for text in texts:
+            try:
+                results.append(self.check(text))
+            except Exception as e:
+                print(f"{self.name} 检查失败: {e}")
+                results.append(None)
+        return results
+
+
+class LanguageToolClient(GrammarBackend):
+    """线程安全的 LanguageTool 客户端（requests.Session 可在多个线程间共享）"""
+    name = 'languagetool'
+
+    def __init__(self, server: str = DEFAULT_SERVER, language: str = 'en-US',
+                 mother_tongue: Optional[str] = None, pool_size: int = 4,
+                 connect_timeout: float = 3, timeout: float = 10, retries: int = 1,
+                 health_check_interval: float = 60, batch_max_chars: int = 4000):
+        self.server = server.rstrip('/')
+        self.language = language
+        self.mother_tongue = mother_tongue
+        self.timeout = (connect_timeout, timeout)
+        self.health_check_interval = health_check_interval
+        self.batch_max_chars = batch_max_chars
+        self.pool_size = pool_size
+
+        self._session = requests.Session()
+        # 连接失败和 5xx 时重试；公共 API 返回 429 时按 Retry-After 等待
+        retry = Retry(total=retries, connect=retries, read=0, backoff_factor=0.3,
+                      status_forcelist=(429, 502, 503, 504), allowed_methods=None,
+                      respect_retry_after_header=True)
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self._session.mount('http://', self._adapter)
+        self._session.mount('https://', self._adapter)
+
+        self._lock = threading.Lock()
+        self._stats = {'checks': 0, 'failures': 0, 'timeouts': 0, 'total_ms': 0.0,
+                       'health_checks': 0, 'last_error': None}
+        self._healthy = None
+        self._last_health_check = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self._batch_executor = None
+
+    # ---- 检查 ----
+
+    def check(self, text: str, disabled_rules: Optional[Iterable[str]] = None) -> List[GrammarMatch]:
+        """检查文本，返回按 offset 排序的问题列表"""
+        data = {'text': text, 'language': self.language}
+        if self.mother_tongue:
+            data['motherTongue'] = self.mother_tongue
+        if disabled_rules:
+            data['disabledRules'] = ','.join(disabled_rules)
+        start = time.perf_counter()
+        try:
+            response = self._session.post(f"{self.server}/v2/check", data=data, timeout=self.timeout)
+            response.raise_for_status()
+            matches = response.json().get('matches', [])
+        except Exception as e:
+            with self._lock:
+                self._stats['failures'] += 1
+                self._stats['timeouts'] += isinstance(e, requests.Timeout)
+                self._stats['last_error'] = str(e)
+                self._healthy = False
+            raise
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._stats['checks'] += 1
+            self._stats['total_ms'] += elapsed
+            self._healthy = True
+        matches = sorted((GrammarMatch.from_json(m) for m in matches), key=lambda m: m.offset)
+        if any(ord(char) > 0xFFFF for char in text):
+            _utf16_offsets_to_index(text, matches)
+        return matches
+
+    def _check_pack(self, texts: List[str]) -> List[List[GrammarMatch]]:
+        if len(texts) == 1:
+            return [self.check(texts[0])]
+        joined = BATCH_SEPARATOR.join(texts)
+        return split_packed_matches(texts, self.check(joined, disabled_rules=CROSS_TEXT_RULES))
+
+    def check_many(self, texts: List[str]) -> List[Optional[List[GrammarMatch]]]:
+        """批量检查：拼接成不超过 batch_max_chars 的请求，最多 pool_size 个请求并发（与连接池大小一致）
+
+        LanguageTool 按段落检查，拼接请求又关闭了跨段落规则，各句结果通常与逐句调用 check 相同，
+        但服务端仍可能因上下文不同给出略有差异的结果；某个请求失败时其中各句的位置为 None。
+        """
+        packs = pack_texts(texts, self.batch_max_chars)
+        with self._lock:
+            if self._batch_executor is None:
+                self._batch_executor = ThreadPoolExecutor(max_workers=self.pool_size,
+                                                          thread_name_prefix='languagetool-batch')
+        futures = [self._batch_executor.submit(self._check_pack, [texts[i] for i in pack]) for pack in packs]
+        results: List[Optional[List[GrammarMatch]]] = [None] * len(texts)
+        for pack, future in zip(packs, futures):
+            try:
+                for i, matches in zip(pack, future.result()):
+                    results[i] = matches
+            except Exception as e:
+                print(f"LanguageTool 批量检查失败（{len(pack)} 句）: {e}")
+        return results
+
+    # ---- 健康检查 ----
+
+    @property
+    def healthy(self) -> Optional[bool]:
+        """最近一次检查或健康检查的结果，尚未请求过时为 None"""
+        with self._lock:
+            return self._healthy
+
+    def health_check(self) -> bool:
+        """请求 /v2/languages 判断服务是否可用"""
+        try:
+            response = self._session.get(f"{self.server}/v2/languages", timeout=self.timeout)
+            healthy = response.ok
+            error = None if healthy else f"HTTP {response.status_code}"
+        except Exception as e:
+            healthy, error = False, str(e)
+        with self._lock:
+            self._stats['health_checks'] += 1
+            self._last_health_check = time.time()
+            if error:
+                self._stats['last_error'] = error
+            if self._healthy is not None and self._healthy != healthy:
+                print(f"{'✅' if healthy else '⚠️'} LanguageTool 服务{'恢复' if healthy else '不可用'}: {self.server}")
+            self._healthy = healthy
+        return healthy
+
+    def _health_loop(self):
+        while not self._stopped.wait(self.health_check_interval):
+            self.health_check()
+
+    def start(self):
+        """启动后台健康检查线程"""
+        if self._thread is None and self.health_check_interval > 0:
+            self._thread = threading.Thread(target=self._health_loop, name='languagetool-health', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._batch_executor is not None:
+            self._batch_executor.shutdown(wait=False)
+        self._session.close()
+
+    # ---- 指标 ----
+
+    def _connection_stats(self) -> Dict:
+        """urllib3 连接池统计：新建连接数和经由连接池发出的请求数"""
+        opened = requests_sent = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            requests_sent += pool.num_requests
+        return {'connections_opened': opened, 'http_requests': requests_sent,
+                'connection_reuse_ratio': 1 - opened / requests_sent if requests_sent else None}
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            healthy, last_health_check = self._healthy, self._last_health_check
+        stats['avg_ms'] = stats['total_ms'] / stats['checks'] if stats['checks'] else None
+        return {
+            'server': self.server,
+            'language': self.language,
+            'healthy': healthy,
+            'last_health_check': last_health_check,
+            **stats,
+            **self._connection_stats()
+        }
+
+
+_language_tool_client = None
+_client_lock = threading.Lock()
+
+def get_language_tool_client() -> LanguageToolClient:
+    """获取 LanguageTool 客户端（单例），参数见 config.yaml 的 language_tool 段"""
+    global _language_tool_client
+    with _client_lock:
+        if _language_tool_client is None:
+            config = load_config_section('language_tool')
+            _language_tool_client = LanguageToolClient(
+                server=config.get('server') or DEFAULT_SERVER,
+                language=config.get('language', 'en-US'),
+                mother_tongue=config.get('mother_tongue'),
+                pool_size=config.get('pool_size', 4),
+                connect_timeout=config.get('connect_timeout_seconds', 3),
+                timeout=config.get('timeout_seconds', 10),
+                retries=config.get('retries', 1),
+                health_check_interval=config.get('health_check_interval_seconds', 60),
+                batch_max_chars=config.get('batch_max_chars', 4000)
+            )
+            _language_tool_client.start()
+            print(f"✅ LanguageTool 客户端: {_language_tool_client.server} ({_language_tool_client.language})")
+        return _language_tool_client
+
+
+if __name__ == "__main__":
+    # 修正文本一致性检查：在句子语料上比较 apply_corrections（一次检查）与 LanguageTool.correct（再检查一次）
+    import argparse
+    import random
+    import re
+    from .data_processing import load_sentences_and_paths
+    from .音素统计表 import DEFAULT_TSV_FILE
+
+    parser = argparse.ArgumentParser(description="apply_corrections 与 LanguageTool.correct 的一致性检查")
+    parser.add_argument('--tsv', default=DEFAULT_TSV_FILE, help='句子语料（Common Voice validated.tsv）')
+    parser.add_argument('--limit', type=int, default=100, help='检查的句子数')
+    args = parser.parse_args()
+
+    def make_mistakes(sentence: str, rng: random.Random) -> str:
+        """给正确的句子加入学习者常见错误，让每句都有可修正的问题"""
+        words = sentence.split()
+        if len(words) > 3:
+            i = rng.randrange(1, len(words) - 1)
+            words.insert(i, words[i])                        # 重复单词
+        text = ' '.join(words)
+        text = re.sub(r'\bis\b', 'are', text, count=1)       # 主谓不一致
+        text = re.sub(r'\ban\b', 'a', text, count=1)         # a/an
+        return text[0].lower() + text[1:] if text else text  # 句首小写
+
+    sentences = [str(r['sentence']) for r in load_sentences_and_paths(args.tsv) if isinstance(r['sentence'], str)]
+    rng = random.Random(0)
+    corpus = [make_mistakes(s, rng) for s in sentences[:args.limit]]
+
+    from language_tool_python import LanguageTool
+    client = get_language_tool_client()
+    reference_tool = LanguageTool(client.language, remote_server=client.server)
+    mismatches, local_ms, remote_ms = 0, 0.0, 0.0
+    try:
+        for text in corpus:
+            start = time.perf_counter()
+            ours = apply_corrections(text, client.check(text))
+            local_ms += (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            theirs = reference_tool.correct(text)
+            remote_ms += (time.perf_counter() - start) * 1000
+            if ours != theirs:
+                mismatches += 1
+                print(f"不一致:\n  原文: {text}\n  本地: {ours}\n  LanguageTool: {theirs}")
+    finally:
+        reference_tool.close()
+    print(f"{len(corpus)} 句, 不一致 {mismatches} 句; 平均耗时: 检查+本地修正 {local_ms / len(corpus):.0f}ms, "
+          f"LanguageTool.correct {remote_ms / len(corpus):.0f}ms")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型后台预加载
+worker 启动时在后台线程依次加载 Whisper 和 Wav2Vec2，每个模型对应一个 Future；
+加载完成前到达的请求等待同一个 Future，不会重复加载；/api/ready 报告各模型状态，
+负载均衡只把流量转发给模型已就绪的 worker。
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Iterable, Optional
+
+from .analysis_profiles import load_config_section
+
+
+class ModelNotReadyError(Exception):
+    """等待模型加载超时"""
+
+    def __init__(self, name: str, timeout: Optional[float]):
+        super().__init__(f"模型 {name} 仍在加载中，请稍后重试")
+        self.name = name
+        self.timeout = timeout
+
+
+class ModelPreloader:
+    """按注册顺序在单个后台线程中加载模型（串行加载，避免启动时内存和CPU峰值叠加）"""
+
+    def __init__(self, wait_timeout: Optional[float] = 60):
+        self.wait_timeout = wait_timeout
+        self._loaders: Dict[str, Callable] = {}
+        self._futures: Dict[str, Future] = {}
+        self._state: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def register(self, name: str, loader: Callable):
+        self._loaders[name] = loader
+        self._state[name] = {'state': 'pending', 'load_seconds': None, 'error': None}
+
+    def _load(self, name: str):
+        with self._lock:
+            self._state[name]['state'] = 'loading'
+        print(f"⏳ 后台加载模型: {name}")
+        start = time.perf_counter()
+        try:
+            result = self._loaders[name]()
+        except Exception as e:
+            with self._lock:
+                self._state[name].update(state='failed', error=str(e),
+                                         load_seconds=time.perf_counter() - start)
+            print(f"⚠️ 模型 {name} 加载失败: {e}")
+            raise
+        with self._lock:
+            self._state[name].update(state='ready', load_seconds=time.perf_counter() - start)
+        print(f"✅ 模型 {name} 加载完成 ({time.perf_counter() - start:.1f}s)")
+        return result
+
+    def start(self, names: Optional[Iterable[str]] = None):
+        """提交后台加载任务，重复调用不会重复加载"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-preload')
+            for name in names or list(self._loaders):
+                if name in self._loaders and name not in self._futures:
+                    self._futures[name] = self._executor.submit(self._load, name)
+
+    def wait(self, name: str, timeout: Optional[float] = None):
+        """等待模型加载完成
+
+        未预加载的模型直接返回 None，由调用方按原来的方式懒加载；
+        预加载失败时同样返回 None，调用方使用时会重新尝试加载并给出具体错误。
+
+        Raises:
+            ModelNotReadyError: 超过 timeout（默认 wait_timeout）仍未加载完成
+        """
+        future = self._futures.get(name)
+        if future is None:
+            return None
+        timeout = self.wait_timeout if timeout is None else timeout
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            raise ModelNotReadyError(name, timeout)
+        except Exception:
+            return None
+
+    @property
+    def ready(self) -> bool:
+        """所有预加载的模型都已加载完成（失败的模型不算就绪）"""
+        with self._lock:
+            return all(self._state[name]['state'] == 'ready' for name in self._futures)
+
+    def status(self) -> Dict:
+        with self._lock:
+            models = {name: dict(state) for name, state in self._state.items() if name in self._futures}
+        return {
+            'ready': all(state['state'] == 'ready' for state in models.values()),
+            'models': models
+        }
+
+
+def _load_whisper():
+    # 预热路由可能选中的每个 Whisper 引擎（默认只有 transcription.backend 这一个）
+    from .asr_router import get_asr_router
+    from .语音转写 import get_transcriber
+    transcribers = [get_transcriber(backend) for backend in get_asr_router().whisper_backends()]
+    return transcribers[0] if transcribers else get_transcriber()
+
+def _load_wav2vec2():
+    from .发音评分模块 import get_wav2vec2_model
+    return get_wav2vec2_model()
+
+MODEL_LOADERS = {
+    'whisper': _load_whisper,
+    'wav2vec2': _load_wav2vec2,
+}
+
+
+_model_preloader = None
+
+def get_model_preloader() -> ModelPreloader:
+    """获取模型预加载器（单例），按 config.yaml 的 model_preload 段注册并启动后台加载"""
+    global _model_preloader
+    if _model_preloader is None:
+        config = load_config_section('model_preload')
+        preloader = ModelPreloader(wait_timeout=config.get('wait_timeout_seconds', 60))
+        for name in config.get('models', list(MODEL_LOADERS)):
+            if name in MODEL_LOADERS:
+                preloader.register(name, MODEL_LOADERS[name])
+            else:
+                print(f"⚠️ 未知的预加载模型: {name}")
+        if config.get('enabled', True):
+            preloader.start()
+        _model_preloader = preloader
+    return _model_preloader
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台转写任务
+语法检测只依据用户输入的文本，录音转写不应拖慢检测结果：接口先返回语法结论和任务 ID，
+转写在后台线程池中执行，客户端通过 GET /api/transcription-jobs/<id> 轮询（可带 wait 长轮询）。
+已完成的任务结果保留 result_ttl_seconds 秒。
+"""
+
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Optional
+
+from .analysis_profiles import load_config_section
+
+
+class TranscriptionJobs:
+    """转写任务队列：有界的线程池 + 按 TTL 清理的结果表"""
+
+    def __init__(self, workers: int = 1, max_pending: int = 32, result_ttl_seconds: float = 600):
+        self.max_pending = max_pending
+        self.result_ttl_seconds = result_ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='transcription-job')
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict] = {}
+        self._futures: Dict[str, Future] = {}
+
+    def _run(self, job_id: str, fn: Callable, args: tuple):
+        with self._lock:
+            self._jobs[job_id]['status'] = 'running'
+            self._jobs[job_id]['started'] = time.time()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            print(f"后台转写失败 {job_id}: {e}")
+            with self._lock:
+                self._jobs[job_id].update(status='failed', error=str(e), finished=time.time())
+            return None
+        # 任务函数返回文本，或带 text/engine 的识别结果
+        text, engine = (result['text'], result.get('engine')) if isinstance(result, dict) else (result, None)
+        with self._lock:
+            self._jobs[job_id].update(status='done', text=text, engine=engine, finished=time.time())
+        return text
+
+    def _cleanup(self, now: float):
+        """调用方持有锁：删除超过 TTL 的已完成任务"""
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['finished'] is not None and now - job['finished'] > self.result_ttl_seconds]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._futures.pop(job_id, None)
+
+    def submit(self, fn: Callable, *args) -> Optional[str]:
+        """提交任务并返回任务 ID；排队任务已满时返回 None（调用方跳过转写）"""
+        now = time.time()
+        with self._lock:
+            self._cleanup(now)
+            pending = sum(job['status'] in ('queued', 'running') for job in self._jobs.values())
+            if pending >= self.max_pending:
+                return None
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {'status': 'queued', 'text': None, 'engine': None, 'error': None,
+                                  'created': now, 'started': None, 'finished': None}
+            self._futures[job_id] = self._executor.submit(self._run, job_id, fn, args)
+        return job_id
+
+    def get(self, job_id: str, wait: float = 0) -> Optional[Dict]:
+        """查询任务状态；wait > 0 时最多等待这么多秒直到任务结束（长轮询）"""
+        with self._lock:
+            self._cleanup(time.time())
+            future = self._futures.get(job_id)
+        if future is None:
+            return None
+        if wait > 0:
+            try:
+                future.result(timeout=wait)
+            except FutureTimeoutError:
+                pass
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            result = {'job_id': job_id, 'status': job['status']}
+            if job['status'] == 'done':
+                result['transcribed_text'] = job['text']
+                if job['engine']:
+                    result['asr_engine'] = job['engine']
+            elif job['status'] == 'failed':
+                result['error'] = job['error']
+            if job['finished'] is not None:
+                result['elapsed_seconds'] = job['finished'] - job['created']
+            return result
+
+
+_transcription_jobs = None
+
+def get_transcription_jobs() -> TranscriptionJobs:
+    """获取后台转写任务队列（单例），参数见 config.yaml 的 transcription.jobs 段"""
+    global _transcription_jobs
+    if _transcription_jobs is None:
+        config = load_config_section('transcription').get('jobs') or {}
+        _transcription_jobs = TranscriptionJobs(
+            workers=config.get('workers', 1),
+            max_pending=config.get('max_pending', 32),
+            result_ttl_seconds=config.get('result_ttl_seconds', 600)
+        )
+    return _transcription_jobs
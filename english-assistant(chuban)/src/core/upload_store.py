@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上传录音存储
+按内容哈希分片保存（uploads/ab/cd/<hash>.flac），相同录音只存一份；
+保留的音频转码为 FLAC（无损）或 Opus（有损，体积约为 FLAC 的 1/10）；
+转码和写盘由后台写入线程完成（put_async），不占用请求时间；后台线程按 TTL 和磁盘配额（最久未访问优先）清理。
+"""
+
+import os
+import time
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from .analysis_profiles import CONFIG_FILE, load_config_section
+from .audio_buffer import AudioBuffer
+
+try:
+    import soundfile as sf
+    SOUNDFILE_AVAILABLE = True
+except ImportError:
+    SOUNDFILE_AVAILABLE = False
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(CONFIG_FILE))
+DEFAULT_STORE_DIR = os.path.join(PROJECT_ROOT, "data", "audio", "uploads")
+
+# 格式名 -> (扩展名, soundfile format, subtype)
+STORE_FORMATS = {
+    'flac': ('.flac', 'FLAC', 'PCM_16'),
+    'opus': ('.ogg', 'OGG', 'OPUS'),
+}
+
+
+class UploadStore:
+    """内容寻址的上传录音存储"""
+
+    def __init__(self, store_dir: str = DEFAULT_STORE_DIR, audio_format: str = 'flac',
+                 quota_bytes: int = 2 * 1024 ** 3, ttl_seconds: float = 30 * 86400,
+                 eviction_interval: float = 600, max_pending_writes: int = 64):
+        if audio_format not in STORE_FORMATS:
+            raise ValueError(f"不支持的存储格式: {audio_format}（可选: {', '.join(STORE_FORMATS)}）")
+        self.store_dir = store_dir
+        self.audio_format = audio_format
+        self.quota_bytes = quota_bytes
+        self.ttl_seconds = ttl_seconds
+        self.eviction_interval = eviction_interval
+        self.max_pending_writes = max_pending_writes
+
+        self._lock = threading.Lock()
+        # key -> [文件大小, 最近访问时间, 文件路径]（切换格式后旧格式的文件仍可命中和清理）
+        self._index: Dict[str, list] = {}
+        self._total_bytes = 0
+        self._stats = {'writes': 0, 'dedup_hits': 0, 'evicted_files': 0, 'evicted_bytes': 0,
+                       'write_errors': 0, 'dropped_writes': 0, 'last_eviction': None}
+        self._pending_writes = 0
+        self._writer = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        os.makedirs(store_dir, exist_ok=True)
+        self._rebuild_index()
+
+    # ---- 路径与索引 ----
+
+    def path_for(self, key: str) -> str:
+        extension = STORE_FORMATS[self.audio_format][0]
+        return os.path.join(self.store_dir, key[:2], key[2:4], f"{key}{extension}")
+
+    def _rebuild_index(self):
+        """启动时扫描分片目录恢复索引；文件修改时间即最近访问时间"""
+        extensions = tuple(ext for ext, _, _ in STORE_FORMATS.values())
+        for shard, _, files in os.walk(self.store_dir):
+            for name in files:
+                if not name.endswith(extensions) or name.startswith('.'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(shard, name))
+                except OSError:
+                    continue
+                key = name.rsplit('.', 1)[0]
+                self._index[key] = [stat.st_size, stat.st_mtime, os.path.join(shard, name)]
+                self._total_bytes += stat.st_size
+        if self._index:
+            print(f"📦 上传存储: {len(self._index)} 个文件, {self._total_bytes / 1024 ** 2:.1f}MB")
+
+    # ---- 写入 ----
+
+    def put(self, audio: AudioBuffer) -> Optional[str]:
+        """保存录音，返回内容哈希；相同内容已存在时只刷新访问时间"""
+        key = audio.content_hash
+        path = self.path_for(key)
+        now = time.time()
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is not None:
+                entry[1] = now
+                self._stats['dedup_hits'] += 1
+        if entry is not None:
+            try:
+                os.utime(entry[2], (now, now))
+            except OSError:
+                pass
+            return key
+
+        _, sf_format, subtype = STORE_FORMATS[self.audio_format]
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再原子改名，清理线程和并发请求不会看到写了一半的文件
+            sf.write(tmp_path, np.clip(audio.samples, -1.0, 1.0), audio.sr, format=sf_format, subtype=subtype)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except Exception as e:
+            print(f"保存上传录音失败: {e}")
+            with self._lock:
+                self._stats['write_errors'] += 1
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return None
+
+        with self._lock:
+            if key not in self._index:
+                self._index[key] = [size, now, path]
+                self._total_bytes += size
+            self._stats['writes'] += 1
+            over_quota = self._total_bytes > self.quota_bytes
+        if over_quota:
+            self._wakeup.set()
+        return key
+
+    def put_async(self, audio: AudioBuffer):
+        """交给后台写入线程保存，请求线程立即返回；积压的写入超过 max_pending_writes 时丢弃本次保存"""
+        with self._lock:
+            if self._pending_writes >= self.max_pending_writes:
+                self._stats['dropped_writes'] += 1
+                return
+            self._pending_writes += 1
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='upload-store-writer')
+            writer = self._writer
+        writer.submit(self._put_pending, audio)
+
+    def _put_pending(self, audio: AudioBuffer):
+        try:
+            self.put(audio)
+        except Exception as e:
+            print(f"保存上传录音失败: {e}")
+        finally:
+            with self._lock:
+                self._pending_writes -= 1
+
+    # ---- 清理 ----
+
+    def evict(self) -> int:
+        """删除超过 TTL 的文件，再按最久未访问优先删到配额以内，返回删除的文件数"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, accessed, _) in self._index.items() if now - accessed > self.ttl_seconds]
+            victims = set(expired)
+            remaining = self._total_bytes - sum(self._index[key][0] for key in expired)
+            if remaining > self.quota_bytes:
+                for key, (size, _, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+                    if remaining <= self.quota_bytes:
+                        break
+                    if key not in victims:
+                        victims.add(key)
+                        remaining -= size
+            victim_paths = []
+            for key in victims:
+                size, _, path = self._index.pop(key)
+                victim_paths.append(path)
+                self._total_bytes -= size
+                self._stats['evicted_files'] += 1
+                self._stats['evicted_bytes'] += size
+            self._stats['last_eviction'] = now
+
+        # 删除文件不持有锁，避免阻塞请求线程
+        for path in victim_paths:
+            try:
+                os.remove(path)
+                # 分片目录空了就一并删除（非空时 rmdir 会失败，直接忽略）
+                os.rmdir(os.path.dirname(path))
+                os.rmdir(os.path.dirname(os.path.dirname(path)))
+            except OSError:
+                pass
+        if victims:
+            print(f"🧹 上传存储清理: 删除 {len(victims)} 个文件（过期 {len(expired)} 个）")
+        return len(victims)
+
+    def _eviction_loop(self):
+        while not self._stopped.is_set():
+            try:
+                self.evict()
+            except Exception as e:
+                print(f"上传存储清理失败: {e}")
+            self._wakeup.wait(self.eviction_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """启动后台清理线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._eviction_loop, name='upload-store-eviction', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        with self._lock:
+            writer = self._writer
+        if writer is not None:
+            writer.shutdown(wait=True)
+
+    # ---- 指标 ----
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            oldest = min((entry[1] for entry in self._index.values()), default=None)
+            return {
+                'store_dir': self.store_dir,
+                'format': self.audio_format,
+                'files': len(self._index),
+                'total_bytes': self._total_bytes,
+                'quota_bytes': self.quota_bytes,
+                'quota_used': self._total_bytes / self.quota_bytes if self.quota_bytes else 0.0,
+                'ttl_seconds': self.ttl_seconds,
+                'oldest_access_age_seconds': time.time() - oldest if oldest else None,
+                'pending_writes': self._pending_writes,
+                **self._stats
+            }
+
+
+_upload_store = None
+_upload_store_loaded = False
+
+def get_upload_store() -> Optional[UploadStore]:
+    """获取上传存储（单例），config.yaml 中 upload_store.enabled 为 false 时返回 None"""
+    global _upload_store, _upload_store_loaded
+    if not _upload_store_loaded:
+        _upload_store_loaded = True
+        config = load_config_section('upload_store')
+        if not config.get('enabled', False):
+            return None
+        if not SOUNDFILE_AVAILABLE:
+            print("⚠️ 未安装 soundfile，上传录音不会被保留")
+            return None
+        store_dir = config.get('store_dir') or DEFAULT_STORE_DIR
+        if not os.path.isabs(store_dir):
+            store_dir = os.path.join(PROJECT_ROOT, store_dir)
+        try:
+            _upload_store = UploadStore(
+                store_dir,
+                audio_format=config.get('format', 'flac'),
+                quota_bytes=int(config.get('quota_mb', 2048) * 1024 ** 2),
+                ttl_seconds=config.get('ttl_days', 30) * 86400,
+                eviction_interval=config.get('eviction_interval_seconds', 600),
+                max_pending_writes=config.get('max_pending_writes', 64)
+            )
+            _upload_store.start()
+            print(f"✅ 上传录音存储已启用: {store_dir} ({_upload_store.audio_format}, "
+                  f"配额 {_upload_store.quota_bytes / 1024 ** 2:.0f}MB)")
+        except Exception as e:
+            print(f"⚠️ 上传录音存储初始化失败: {e}")
+    return _upload_store
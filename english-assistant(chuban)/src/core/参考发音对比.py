@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+参考发音对比
+把学习者录音与母语者参考录音（练习项的 audio_path 或 Common Voice 录音）做带状DTW对齐，
+按单词报告偏差。参考侧特征预先计算进磁盘特征库并在内存中缓存，
+一次对比只需要计算学习者侧特征和一次DTW。
+
+预计算：python -m src.core.参考发音对比 --exercises --common-voice --limit 2000
+"""
+
+import os
+import re
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .analysis_profiles import CONFIG_FILE, load_config_section
+from .audio_buffer import AudioBuffer, as_audio_buffer
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(CONFIG_FILE))
+SAMPLE_RATE = 16000
+HOP_LENGTH = 160          # MFCC帧移 10ms
+FEATURE_VERSION = 1       # 特征提取方式变化时递增，使旧的特征库条目失效
+
+# 局部代价（1 - 余弦相似度）到分数的换算区间：不高于前者满分，不低于后者零分
+SCORE_CALIBRATION = {
+    'mfcc': (0.3, 1.0),
+    'posteriorgram': (0.15, 0.8),
+}
+
+
+def _split_words(text: str) -> List[str]:
+    return re.findall(r"[A-Za-z']+", text or '')
+
+
+def _unit_rows(features: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.maximum(norms, 1e-8)
+
+
+def _proportional_word_spans(words: List[str], n_frames: int) -> np.ndarray:
+    """没有强制对齐结果时，按字母数在有声区间内分配单词边界"""
+    lengths = np.array([len(w) for w in words], dtype=np.float64)
+    edges = np.round(np.concatenate(([0.0], np.cumsum(lengths))) / lengths.sum() * n_frames).astype(np.int64)
+    return np.stack([edges[:-1], edges[1:]], axis=1)
+
+
+# ---------------- DTW ----------------
+
+def _dtw_numpy(a: np.ndarray, b: np.ndarray, radius: float) -> np.ndarray:
+    """带状DTW累积代价矩阵：按反对角线推进，每条反对角线内向量化计算"""
+    n, m = len(a), len(b)
+    cost = np.full((n + 1, m + 1), np.inf, dtype=np.float32)
+    cost[0, 0] = 0.0
+    slope = m / n
+    for k in range(2, n + m + 1):
+        i = np.arange(max(1, k - m), min(n, k - 1) + 1)
+        j = k - i
+        in_band = np.abs(j - i * slope) <= radius
+        i, j = i[in_band], j[in_band]
+        if len(i) == 0:
+            continue
+        local = 1.0 - np.einsum('ij,ij->i', a[i - 1], b[j - 1])
+        cost[i, j] = local + np.minimum(np.minimum(cost[i - 1, j], cost[i - 1, j - 1]), cost[i, j - 1])
+    return cost
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _dtw_numba(a, b, radius):
+        """带状DTW累积代价矩阵（numba编译版本）"""
+        n, m = a.shape[0], b.shape[0]
+        dims = a.shape[1]
+        cost = np.full((n + 1, m + 1), np.inf, dtype=np.float32)
+        cost[0, 0] = 0.0
+        slope = m / n
+        for i in range(1, n + 1):
+            center = i * slope
+            lo = max(1, int(np.ceil(center - radius)))
+            hi = min(m, int(np.floor(center + radius)))
+            for j in range(lo, hi + 1):
+                dot = 0.0
+                for d in range(dims):
+                    dot += a[i - 1, d] * b[j - 1, d]
+                best = min(cost[i - 1, j], cost[i - 1, j - 1], cost[i, j - 1])
+                cost[i, j] = 1.0 - dot + best
+        return cost
+
+
+def banded_dtw(reference: np.ndarray, learner: np.ndarray, band_ratio: float = 0.2) -> Tuple[np.ndarray, np.ndarray]:
+    """在以对角线为中心的带内做DTW
+
+    Args:
+        reference, learner: 行向量已归一化的特征 (帧数, 维数)
+        band_ratio: 带宽占较长序列帧数的比例
+
+    Returns:
+        (path, local_costs)：对齐路径 (K, 2) 为 [参考帧, 学习者帧]，以及路径上每一步的局部代价
+    """
+    n, m = len(reference), len(learner)
+    slope = m / n
+    # 带宽至少覆盖一步斜率，保证路径连通
+    radius = max(band_ratio * max(n, m), np.ceil(max(slope, 1.0 / slope)) + 1.0)
+    if NUMBA_AVAILABLE:
+        cost = _dtw_numba(np.ascontiguousarray(reference), np.ascontiguousarray(learner), float(radius))
+    else:
+        cost = _dtw_numpy(reference, learner, radius)
+
+    # 回溯
+    i, j = n, m
+    path = [(i - 1, j - 1)]
+    while i > 1 or j > 1:
+        options = (cost[i - 1, j - 1], cost[i - 1, j], cost[i, j - 1])
+        step = int(np.argmin(options))
+        if step == 0:
+            i, j = i - 1, j - 1
+        elif step == 1:
+            i -= 1
+        else:
+            j -= 1
+        path.append((i - 1, j - 1))
+    path = np.array(path[::-1], dtype=np.int64)
+    local_costs = 1.0 - np.einsum('ij,ij->i', reference[path[:, 0]], learner[path[:, 1]])
+    return path, local_costs
+
+
+# ---------------- 对比引擎 ----------------
+
+class ReferenceComparator:
+    """母语者参考录音对比引擎"""
+
+    def __init__(self, store_dir: Optional[str] = None, feature_type: Optional[str] = None,
+                 band_ratio: Optional[float] = None, memory_cache_size: Optional[int] = None):
+        config = load_config_section('reference_comparison')
+        store_dir = store_dir or config.get('store_dir', 'data/reference_features')
+        self.store_dir = store_dir if os.path.isabs(store_dir) else os.path.join(PROJECT_ROOT, store_dir)
+        self.feature_type = feature_type or config.get('feature_type', 'mfcc')
+        if self.feature_type not in SCORE_CALIBRATION:
+            print(f"未知的参考对比特征类型 '{self.feature_type}'，使用 mfcc")
+            self.feature_type = 'mfcc'
+        self.band_ratio = band_ratio or config.get('band_ratio', 0.2)
+        self.memory_cache_size = memory_cache_size or config.get('memory_cache_size', 128)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()      # 多个请求线程共用内存缓存
+
+    # ---- 特征 ----
+
+    def extract_features(self, audio, text: Optional[str] = None) -> Dict:
+        """去除首尾静音后提取逐帧特征
+
+        Args:
+            audio: AudioBuffer 或 16kHz 数组；静音裁剪使用缓冲区上的裁剪区间，只取视图
+
+        Returns:
+            dict: features (帧数, 维数)、frame_seconds，以及给出 text 时的 words / word_spans
+        """
+        import librosa
+        if self.feature_type == 'posteriorgram':
+            from .发音评分模块 import _prepare_audio
+            audio = _prepare_audio(audio)
+        else:
+            audio = as_audio_buffer(audio)
+        trimmed = audio.trimmed
+        if len(trimmed) < HOP_LENGTH * 5:
+            trimmed = audio.samples
+
+        word_spans = None
+        words = _split_words(text) if text else []
+        if self.feature_type == 'posteriorgram':
+            from .发音评分模块 import run_ctc_recognition
+            from .GOP评分模块 import GOPScorer, log_softmax
+            _, logits, _, processor = run_ctc_recognition(trimmed)
+            log_probs = log_softmax(logits[0].detach().float().cpu().numpy())
+            # 后验概率开方后每行都是单位向量，余弦相似度即 Bhattacharyya 系数
+            features = np.sqrt(np.exp(log_probs)).astype(np.float32)
+            frame_seconds = len(trimmed) / SAMPLE_RATE / len(features)
+            if words:
+                gop = GOPScorer.from_processor(processor).score(logits, text, len(trimmed) / SAMPLE_RATE)
+                if gop and len(gop['word_scores']) == len(words):
+                    word_spans = np.array([
+                        [round(w['start_time'] / frame_seconds), round(w['end_time'] / frame_seconds)]
+                        for w in gop['word_scores']
+                    ], dtype=np.int64)
+        else:
+            mfcc = librosa.feature.mfcc(y=trimmed, sr=SAMPLE_RATE, n_mfcc=13, n_fft=400, hop_length=HOP_LENGTH).T
+            # 倒谱均值方差归一化，削弱录音设备和说话人差异
+            mfcc = (mfcc - mfcc.mean(axis=0)) / (mfcc.std(axis=0) + 1e-8)
+            features = _unit_rows(mfcc).astype(np.float32)
+            frame_seconds = HOP_LENGTH / SAMPLE_RATE
+
+        if words and word_spans is None:
+            word_spans = _proportional_word_spans(words, len(features))
+
+        return {
+            'features': features,
+            'frame_seconds': frame_seconds,
+            'words': words,
+            'word_spans': word_spans
+        }
+
+    # ---- 参考特征库 ----
+
+    def resolve_audio_path(self, audio_path: str) -> str:
+        return audio_path if os.path.isabs(audio_path) else os.path.join(PROJECT_ROOT, audio_path)
+
+    def reference_key(self, audio_path: str, text: str) -> str:
+        """特征库键：录音文件身份 + 参考文本 + 特征版本"""
+        stat = os.stat(audio_path)
+        identity = f"{os.path.abspath(audio_path)}|{stat.st_size}|{stat.st_mtime_ns}|{text}|{self.feature_type}|{FEATURE_VERSION}"
+        return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+    def _store_path(self, key: str) -> str:
+        return os.path.join(self.store_dir, key[:2], f"{key}.npz")
+
+    def _remember(self, key: str, reference: Dict):
+        with self._lock:
+            self._memory[key] = reference
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_cache_size:
+                self._memory.popitem(last=False)
+
+    def _write_store(self, store_path: str, reference: Dict):
+        """写入特征库：每个写入者使用自己的临时文件，写完后原子替换"""
+        os.makedirs(os.path.dirname(store_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp.npz', dir=os.path.dirname(store_path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, features=reference['features'], frame_seconds=reference['frame_seconds'],
+                         words=np.array(reference['words'], dtype=str), word_spans=reference['word_spans'])
+            os.replace(tmp_path, store_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get_reference(self, audio_path: str, text: str) -> Dict:
+        """获取参考录音特征：内存缓存 > 磁盘特征库 > 现场计算并写入特征库"""
+        audio_path = self.resolve_audio_path(audio_path)
+        if not os.path.exists(audio_path):
+            raise FileNotFoundError(f"参考录音不存在: {audio_path}")
+
+        key = self.reference_key(audio_path, text)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return dict(self._memory[key], cached='memory')
+
+        store_path = self._store_path(key)
+        if os.path.exists(store_path):
+            try:
+                with np.load(store_path, allow_pickle=False) as data:
+                    reference = {
+                        'features': data['features'],
+                        'frame_seconds': float(data['frame_seconds']),
+                        'words': [str(w) for w in data['words']],
+                        'word_spans': data['word_spans']
+                    }
+                self._remember(key, reference)
+                return dict(reference, cached='disk')
+            except Exception as e:
+                print(f"读取参考特征失败，重新计算: {e}")
+
+        from .audio_decoding import load_audio_file
+        audio = load_audio_file(audio_path, SAMPLE_RATE)
+        reference = self.extract_features(audio, text)
+        if reference['word_spans'] is None:
+            reference['word_spans'] = np.zeros((0, 2), dtype=np.int64)
+
+        self._write_store(store_path, reference)
+        self._remember(key, reference)
+        return dict(reference, cached=None)
+
+    # ---- 对比 ----
+
+    def _deviation_score(self, deviation: float) -> float:
+        good, bad = SCORE_CALIBRATION[self.feature_type]
+        return float(100.0 * np.clip((bad - deviation) / (bad - good), 0.0, 1.0))
+
+    def compare(self, learner_audio: AudioBuffer, reference_audio_path: str, reference_text: str) -> Dict:
+        """学习者录音与参考录音对比，返回整体与逐词偏差"""
+        start = time.perf_counter()
+        reference = self.get_reference(reference_audio_path, reference_text)
+        learner = self.extract_features(learner_audio)
+        if len(reference['features']) == 0 or len(learner['features']) == 0:
+            raise ValueError("参考录音或学习者录音过短，无法对比")
+
+        path, local_costs = banded_dtw(reference['features'], learner['features'], self.band_ratio)
+        ref_frames, learner_frames = path[:, 0], path[:, 1]
+        ref_seconds, learner_seconds = reference['frame_seconds'], learner['frame_seconds']
+
+        word_deviations = []
+        for word, (span_start, span_end) in zip(reference['words'], reference['word_spans']):
+            in_word = (ref_frames >= span_start) & (ref_frames < span_end)
+            if not np.any(in_word):
+                continue
+            deviation = float(np.mean(local_costs[in_word]))
+            learner_start = int(learner_frames[in_word].min())
+            learner_end = int(learner_frames[in_word].max()) + 1
+            ref_duration = (span_end - span_start) * ref_seconds
+            learner_duration = (learner_end - learner_start) * learner_seconds
+            word_deviations.append({
+                'word': word,
+                'score': self._deviation_score(deviation),
+                'deviation': deviation,
+                'duration_ratio': float(learner_duration / ref_duration) if ref_duration > 0 else 0.0,
+                'reference_start': float(span_start * ref_seconds),
+                'reference_end': float(span_end * ref_seconds),
+                'learner_start': float(learner_start * learner_seconds),
+                'learner_end': float(learner_end * learner_seconds)
+            })
+
+        overall_deviation = float(np.mean(local_costs))
+        reference_duration = len(reference['features']) * ref_seconds
+        learner_duration = len(learner['features']) * learner_seconds
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"参考发音对比完成: 偏差={overall_deviation:.3f}, 参考特征来源={reference['cached'] or '现场计算'}, "
+              f"耗时 {elapsed_ms:.0f}ms")
+
+        return {
+            'overall_score': self._deviation_score(overall_deviation),
+            'deviation': overall_deviation,
+            'duration_ratio': float(learner_duration / reference_duration) if reference_duration > 0 else 0.0,
+            'word_deviations': word_deviations,
+            'weak_words': [w['word'] for w in word_deviations if w['score'] < 60],
+            'feature_type': self.feature_type,
+            'reference_cached': reference['cached'],
+            'elapsed_ms': elapsed_ms
+        }
+
+
+_reference_comparator = None
+
+def get_reference_comparator() -> ReferenceComparator:
+    """获取全局参考对比引擎实例"""
+    global _reference_comparator
+    if _reference_comparator is None:
+        _reference_comparator = ReferenceComparator()
+    return _reference_comparator
+
+
+# ---------------- 预计算 ----------------
+
+def iter_exercise_references():
+    """练习集中带参考录音的语音练习项"""
+    from .自定义练习模块 import get_exercise_manager
+    manager = get_exercise_manager()
+    for exercise_set in manager.exercises.get('exercise_sets', {}).values():
+        for item in exercise_set.get('items', []):
+            content = item.get('content', {})
+            if item.get('type') == 'speech' and content.get('audio_path') and content.get('text'):
+                yield content['audio_path'], content['text']
+
+def iter_common_voice_references(limit: Optional[int] = None):
+    """validated.tsv 中本地存在的 Common Voice 录音"""
+    from .data_processing import load_sentences_and_paths
+    tsv_file = os.path.join(PROJECT_ROOT, "data", "common_voice", "validated.tsv")
+    clips_dir = os.path.join(PROJECT_ROOT, "data", "common_voice", "clips")
+    count = 0
+    for record in load_sentences_and_paths(tsv_file):
+        clip_path = os.path.join(clips_dir, str(record['path']))
+        if isinstance(record['sentence'], str) and os.path.exists(clip_path):
+            yield clip_path, record['sentence']
+            count += 1
+            if limit and count >= limit:
+                break
+
+def precompute_references(references, comparator: Optional[ReferenceComparator] = None) -> int:
+    """把参考录音特征写入磁盘特征库，已存在的条目跳过"""
+    comparator = comparator or get_reference_comparator()
+    computed = 0
+    start = time.perf_counter()
+    for i, (audio_path, text) in enumerate(references, 1):
+        try:
+            if comparator.get_reference(audio_path, text)['cached'] is None:
+                computed += 1
+        except Exception as e:
+            print(f"参考特征计算失败 {audio_path}: {e}")
+        if i % 200 == 0:
+            print(f"  已处理 {i} 条参考录音 ({time.perf_counter() - start:.0f}s)")
+    print(f"✅ 参考特征预计算完成: 新增 {computed} 条, 特征库 {comparator.store_dir}")
+    return computed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="预计算参考录音特征")
+    parser.add_argument('--exercises', action='store_true', help='练习集中带 audio_path 的语音练习')
+    parser.add_argument('--common-voice', action='store_true', help='Common Voice 录音')
+    parser.add_argument('--limit', type=int, default=None, help='Common Voice 最多处理的条数')
+    args = parser.parse_args()
+
+    if args.exercises:
+        precompute_references(iter_exercise_references())
+    if args.common_voice:
+        precompute_references(iter_common_voice_references(args.limit))
+    if not (args.exercises or args.common_voice):
+        parser.print_help()
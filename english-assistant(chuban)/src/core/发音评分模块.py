@@ -1,4 +1,5 @@
 import os
+import threading
 import numpy as np
 import traceback
 
@@ -12,6 +13,10 @@ except ImportError as e:
     print(f'⚠️ 音素级评分模块导入失败: {e}')
     PHONEME_SCORING_AVAILABLE = False
 
+# GOP评分只依赖numpy（torchaudio可选），总是可用
+from .GOP评分模块 import GOPScorer
+from .audio_buffer import AudioBuffer, as_audio_buffer
+
 # 延迟导入，避免启动时的依赖问题
 def _import_dependencies():
     """延迟导入依赖库，减少Flask重载触发"""
@@ -41,143 +46,206 @@ def record_audio(duration=3, sr=16000):
         print("警告: sounddevice库未安装，无法录音")
         return np.zeros(sr * duration)
 
-def score_pronunciation(audio_data, reference_text, detailed=False):
-    """使用 Wav2Vec2 评估发音准确性
-    
-    Args:
-        audio_data: 音频数据
-        reference_text: 参考文本
-        detailed: 是否返回音素级详细评分
-    
+# 全局模型缓存（与语音转写模块的 Whisper 缓存方式一致）
+_wav2vec2_model = None
+_wav2vec2_processor = None
+_wav2vec2_device = None
+_wav2vec2_lock = threading.Lock()
+
+def get_wav2vec2_model():
+    """获取Wav2Vec2模型和处理器（带缓存）
+
     Returns:
-        float或DetailedPronunciationResult: 简单评分或详细评分结果
+        (model, processor, device)
     """
-    try:
-        # 延迟导入依赖
+    global _wav2vec2_model, _wav2vec2_processor, _wav2vec2_device
+    if _wav2vec2_model is not None:
+        return _wav2vec2_model, _wav2vec2_processor, _wav2vec2_device
+
+    # 后台预加载和并发请求同时调用时只加载一次，后到的调用等待先到的加载完成
+    with _wav2vec2_lock:
+        if _wav2vec2_model is not None:
+            return _wav2vec2_model, _wav2vec2_processor, _wav2vec2_device
+
         torch, Wav2Vec2Processor, Wav2Vec2ForCTC, librosa = _import_dependencies()
-        
         if torch is None:
             raise ImportError("必要的依赖库未安装，请运行: pip install -r requirements.txt")
-        
-        # 检查音频数据
-        if audio_data is None or len(audio_data) == 0:
-            raise ValueError("音频数据为空")
-        
-        print(f"音频数据长度: {len(audio_data)} 采样点")
-        
+
         # 使用相对路径，确保在不同环境下都能找到模型
         model_name = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "models", "wav2vec2-base-960h")
-        
+
         if not os.path.exists(model_name):
             raise FileNotFoundError(f"模型路径不存在: {model_name}")
-        
+
         # 检查模型文件是否完整
         required_files = ['config.json', 'pytorch_model.bin', 'vocab.json']
         for file in required_files:
             file_path = os.path.join(model_name, file)
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"模型文件缺失: {file_path}")
-        
+
         print(f"正在加载模型: {model_name}")
-        
+
         # 设置设备（GPU或CPU）
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         print(f"使用设备: {device}")
-        
+
         # 加载模型和处理器
         processor = Wav2Vec2Processor.from_pretrained(model_name)
         model = Wav2Vec2ForCTC.from_pretrained(model_name)
         model = model.to(device)
         model.eval()  # 设置为评估模式
-        
+
+        _wav2vec2_model, _wav2vec2_processor, _wav2vec2_device = model, processor, device
         print("模型加载成功")
+        return model, processor, device
 
-        # 确保音频数据是float32类型
-        if audio_data.dtype != np.float32:
-            audio_data = audio_data.astype(np.float32)
-        
-        # 音频数据归一化
-        if np.max(np.abs(audio_data)) > 0:
-            audio_data = audio_data / np.max(np.abs(audio_data))
-        
-        print("音频预处理完成")
+def _prepare_audio(audio_data) -> AudioBuffer:
+    """包装为峰值归一化的 AudioBuffer；上传入口已归一化过的缓冲区原样返回，不再扫描和复制"""
+    audio = as_audio_buffer(audio_data)
+    if len(audio) == 0:
+        raise ValueError("音频数据为空")
+    return audio.as_normalized()
 
-        # 将音频数据转为模型输入格式
-        inputs = processor(audio_data, sampling_rate=16000, return_tensors="pt", padding=True)
-        # 注意：processor返回的是一个字典/BatchFeature，需使用**解包或通过键访问
-        inputs = {k: v.to(device) for k, v in dict(inputs).items()}
-        
-        print("开始语音识别...")
-        
-        # 推理
-        with torch.no_grad():
-            # 正确调用方式：使用关键字参数解包，避免属性访问错误
-            logits = model(**inputs).logits
-        predicted_ids = torch.argmax(logits, dim=-1)
-        transcription = processor.batch_decode(predicted_ids)[0]
-        print(f"语音识别结果: {transcription}")
+def run_ctc_recognition(audio_data):
+    """执行一次Wav2Vec2 CTC前向计算
 
-        # 评分逻辑（基于 Levenshtein 距离）
+    Args:
+        audio_data: AudioBuffer 或 16kHz 数组
+
+    Returns:
+        (transcription, logits, model, processor)
+    """
+    torch = _import_dependencies()[0]
+    model, processor, device = get_wav2vec2_model()
+    samples = audio_data.samples if isinstance(audio_data, AudioBuffer) else audio_data
+
+    # 将音频数据转为模型输入格式
+    inputs = processor(samples, sampling_rate=16000, return_tensors="pt", padding=True)
+    # 注意：processor返回的是一个字典/BatchFeature，需使用**解包或通过键访问
+    inputs = {k: v.to(device) for k, v in dict(inputs).items()}
+
+    print("开始语音识别...")
+
+    # 推理
+    with torch.no_grad():
+        # 正确调用方式：使用关键字参数解包，避免属性访问错误
+        logits = model(**inputs).logits
+    predicted_ids = torch.argmax(logits, dim=-1)
+    transcription = processor.batch_decode(predicted_ids)[0]
+    print(f"语音识别结果: {transcription}")
+    return transcription, logits, model, processor
+
+def compute_ctc_logits(samples: np.ndarray) -> np.ndarray:
+    """对一段16kHz音频做一次前向计算，返回 (帧数, 词表大小) 的 numpy logits（实时评分逐块调用）"""
+    torch = _import_dependencies()[0]
+    model, processor, device = get_wav2vec2_model()
+    inputs = processor(samples, sampling_rate=16000, return_tensors="pt")
+    inputs = {k: v.to(device) for k, v in dict(inputs).items()}
+    with torch.no_grad():
+        logits = model(**inputs).logits
+    return logits[0].float().cpu().numpy()
+
+def compute_similarity_score(transcription, reference_text):
+    """基于编辑距离计算转写文本与参考文本的相似度评分(0-100)"""
+    try:
+        from Levenshtein import distance
+        print("使用Levenshtein距离计算相似度")
+    except ImportError:
         try:
-            from Levenshtein import distance
-            print("使用Levenshtein距离计算相似度")
+            from python_Levenshtein import distance
+            print("使用python-Levenshtein距离计算相似度")
         except ImportError:
-            try:
-                from python_Levenshtein import distance
-                print("使用python-Levenshtein距离计算相似度")
-            except ImportError:
-                # 如果没有Levenshtein库，使用改进的字符串相似度算法
-                print("警告: 未找到Levenshtein库，使用改进的相似度计算")
-                def improved_similarity(str1, str2):
-                    str1, str2 = str1.lower().strip(), str2.lower().strip()
-                    if len(str1) == 0 or len(str2) == 0:
-                        return 0
-                    
-                    # 计算字符级别的相似度
-                    char_similarity = sum(1 for c in str1 if c in str2) / max(len(str1), len(str2))
-                    
-                    # 计算单词级别的相似度
-                    words1 = set(str1.split())
-                    words2 = set(str2.split())
-                    if len(words1) == 0 or len(words2) == 0:
-                        word_similarity = 0
-                    else:
-                        word_similarity = len(words1.intersection(words2)) / max(len(words1), len(words2))
-                    
-                    # 综合评分
-                    return (char_similarity * 0.4 + word_similarity * 0.6)
+            # 如果没有Levenshtein库，使用改进的字符串相似度算法
+            print("警告: 未找到Levenshtein库，使用改进的相似度计算")
+            def improved_similarity(str1, str2):
+                str1, str2 = str1.lower().strip(), str2.lower().strip()
+                if len(str1) == 0 or len(str2) == 0:
+                    return 0
                 
-                score = 100 * improved_similarity(transcription, reference_text)
-                final_score = max(0, min(score, 100))
-                print(f"改进相似度评分完成: {final_score}")
-                return final_score
-
-        # 使用Levenshtein距离计算
-        distance_score = distance(transcription.lower(), reference_text.lower())
-        max_distance = max(len(transcription), len(reference_text))
-        
-        if max_distance == 0:
-            similarity = 1.0
-            score = 100
-        else:
-            similarity = 1 - (distance_score / max_distance)
-            score = 100 * similarity
+                # 计算字符级别的相似度
+                char_similarity = sum(1 for c in str1 if c in str2) / max(len(str1), len(str2))
+                
+                # 计算单词级别的相似度
+                words1 = set(str1.split())
+                words2 = set(str2.split())
+                if len(words1) == 0 or len(words2) == 0:
+                    word_similarity = 0
+                else:
+                    word_similarity = len(words1.intersection(words2)) / max(len(words1), len(words2))
+                
+                # 综合评分
+                return (char_similarity * 0.4 + word_similarity * 0.6)
+            
+            score = 100 * improved_similarity(transcription, reference_text)
+            final_score = max(0, min(score, 100))
+            print(f"改进相似度评分完成: {final_score}")
+            return final_score
+
+    # 使用Levenshtein距离计算
+    distance_score = distance(transcription.lower(), reference_text.lower())
+    max_distance = max(len(transcription), len(reference_text))
+    
+    if max_distance == 0:
+        similarity = 1.0
+        score = 100
+    else:
+        similarity = 1 - (distance_score / max_distance)
+        score = 100 * similarity
+    
+    final_score = max(0, min(score, 100))
+    print(f"Levenshtein距离评分完成: {final_score}")
+    print(f"  转录文本: '{transcription}'")
+    print(f"  参考文本: '{reference_text}'")
+    print(f"  编辑距离: {distance_score}")
+    print(f"  最大长度: {max_distance}")
+    print(f"  相似度: {similarity:.3f}")
+    return final_score
+
+def _describe_error(e):
+    """将异常转换为面向用户的错误说明"""
+    if "CUDA" in str(e):
+        return "GPU内存不足，建议使用CPU模式或减少音频长度"
+    elif "model" in str(e).lower():
+        return "模型加载失败，请检查模型文件是否完整"
+    elif "audio" in str(e).lower():
+        return "音频处理失败，请检查音频格式和长度"
+    else:
+        return f"未知错误: {str(e)}"
+
+def score_pronunciation(audio_data, reference_text, detailed=False, profile=None):
+    """使用 Wav2Vec2 评估发音准确性
+    
+    Args:
+        audio_data: 音频数据（AudioBuffer 或 16kHz 数组）
+        reference_text: 参考文本
+        detailed: 是否返回音素级详细评分
+        profile: 音素级分析档位(AnalysisProfile)，为空时按配置文件解析
+    
+    Returns:
+        float或DetailedPronunciationResult: 简单评分或详细评分结果
+    """
+    try:
+        # 检查音频数据
+        if audio_data is None or len(audio_data) == 0:
+            raise ValueError("音频数据为空")
         
-        final_score = max(0, min(score, 100))
-        print(f"Levenshtein距离评分完成: {final_score}")
-        print(f"  转录文本: '{transcription}'")
-        print(f"  参考文本: '{reference_text}'")
-        print(f"  编辑距离: {distance_score}")
-        print(f"  最大长度: {max_distance}")
-        print(f"  相似度: {similarity:.3f}")
+        print(f"音频数据长度: {len(audio_data)} 采样点")
+
+        audio_data = _prepare_audio(audio_data)
+
+        transcription, logits, model, processor = run_ctc_recognition(audio_data)
+
+        # 评分逻辑（基于 Levenshtein 距离）
+        final_score = compute_similarity_score(transcription, reference_text)
         
         # 如果需要详细评分且音素模块可用，进行音素级分析
         if detailed and PHONEME_SCORING_AVAILABLE:
             try:
                 print("开始音素级详细分析...")
-                phoneme_scorer = PhonemeScorer()
+                phoneme_scorer = PhonemeScorer(profile=profile)
                 detailed_result = phoneme_scorer.analyze_pronunciation_detailed(
-                    audio_data, reference_text, model, processor, sr=16000
+                    audio_data, reference_text, model, processor, sr=16000, logits=logits
                 )
                 # 使用音素级评分作为最终评分
                 detailed_result.overall_score = max(detailed_result.overall_score, final_score * 0.8)
@@ -200,19 +268,88 @@ def score_pronunciation(audio_data, reference_text, detailed=False):
         traceback.print_exc()
         
         # 提供具体的错误信息和建议
-        if "CUDA" in str(e):
-            error_msg = "GPU内存不足，建议使用CPU模式或减少音频长度"
-        elif "model" in str(e).lower():
-            error_msg = "模型加载失败，请检查模型文件是否完整"
-        elif "audio" in str(e).lower():
-            error_msg = "音频处理失败，请检查音频格式和长度"
-        else:
-            error_msg = f"未知错误: {str(e)}"
-        
+        error_msg = _describe_error(e)
         print(f"错误详情: {error_msg}")
         raise RuntimeError(f"发音评分失败: {error_msg}")
 
 
+def score_pronunciation_detailed_stream(audio_data, reference_text, profile=None):
+    """渐进式详细发音评分（生成器）
+
+    CTC前向计算完成后立即产出总体评分，随后按计算顺序逐个产出音素评分、
+    单词评分，最后产出完整的详细结果。
+
+    Yields:
+        (event, payload): event 为 'overall' / 'phoneme' / 'word' / 'result'
+    """
+    if audio_data is None or len(audio_data) == 0:
+        raise ValueError("音频数据为空")
+
+    try:
+        audio_data = _prepare_audio(audio_data)
+        transcription, logits, model, processor = run_ctc_recognition(audio_data)
+        final_score = compute_similarity_score(transcription, reference_text)
+    except Exception as e:
+        traceback.print_exc()
+        raise RuntimeError(f"发音评分失败: {_describe_error(e)}")
+
+    # 一次前向计算后即可给出的总体评分
+    yield 'overall', {
+        'overall_score': final_score,
+        'transcription': transcription,
+        'provisional': PHONEME_SCORING_AVAILABLE
+    }
+
+    if not PHONEME_SCORING_AVAILABLE:
+        yield 'result', create_simple_detailed_result(final_score, transcription, reference_text)
+        return
+
+    phoneme_scorer = PhonemeScorer(profile=profile)
+    for event, payload in phoneme_scorer.iter_pronunciation_analysis(
+            audio_data, reference_text, model, processor, sr=16000, logits=logits):
+        if event == 'words':
+            for word_score in payload:
+                yield 'word', word_score
+        elif event == 'result':
+            payload.overall_score = max(payload.overall_score, final_score * 0.8)
+            yield 'result', payload
+        else:
+            yield event, payload
+
+
+def score_pronunciation_gop(audio_data, reference_text):
+    """基于CTC后验概率的GOP评分
+
+    介于 score_pronunciation 和音素级详细分析之间：复用同一次前向计算的 logits，
+    只增加一次强制对齐和向量化归约，就能给出字符级和单词级评分。
+
+    Returns:
+        dict: overall_score, similarity_score, transcription, word_scores, weak_words
+    """
+    try:
+        if audio_data is None or len(audio_data) == 0:
+            raise ValueError("音频数据为空")
+
+        audio_data = _prepare_audio(audio_data)
+        transcription, logits, model, processor = run_ctc_recognition(audio_data)
+        similarity_score = compute_similarity_score(transcription, reference_text)
+
+        gop_result = GOPScorer.from_processor(processor).score(logits, reference_text, audio_data.duration)
+        if gop_result is None:
+            # 无法对齐（音频过短或参考文本无有效字符）时退回到编辑距离评分
+            gop_result = {'overall_score': similarity_score, 'word_scores': [], 'weak_words': []}
+        print(f"GOP评分完成: {gop_result['overall_score']:.1f} (编辑距离评分: {similarity_score:.1f})")
+
+        gop_result['similarity_score'] = similarity_score
+        gop_result['transcription'] = transcription
+        return gop_result
+
+    except Exception as e:
+        print(f"GOP评分过程中出错: {str(e)}")
+        traceback.print_exc()
+        raise RuntimeError(f"发音评分失败: {_describe_error(e)}")
+
+
 def create_simple_detailed_result(score: float, transcription: str, reference_text: str):
     """创建简化的详细评分结果"""
     if not PHONEME_SCORING_AVAILABLE:
@@ -241,6 +378,6 @@ def create_simple_detailed_result(score: float, transcription: str, reference_te
     )
 
 
-def score_pronunciation_detailed(audio_data, reference_text):
+def score_pronunciation_detailed(audio_data, reference_text, profile=None):
     """返回详细发音评分结果"""
-    return score_pronunciation(audio_data, reference_text, detailed=True)
\ No newline at end of file
+    return score_pronunciation(audio_data, reference_text, detailed=True, profile=profile)
\ No newline at end of file
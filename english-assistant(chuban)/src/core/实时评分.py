@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时发音评分
+学习者边说边通过 WebSocket 发送 16kHz PCM 帧，服务端做增量 VAD，语音开始后按块做
+Wav2Vec2 前向计算（每块带一段左侧上下文），随时推送部分转写和逐词正误；
+最后一帧到达时绝大部分 logits 已经算好，只需补算最后一块即可给出最终评分。
+每个连接的音频缓冲区按最长时长预分配，超出即结束会话。
+"""
+
+import re
+import difflib
+import threading
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .analysis_profiles import load_config_section
+from .GOP评分模块 import GOPScorer
+
+SAMPLE_RATE = 16000
+# Wav2Vec2 每个输出帧对应 320 个采样点（20ms）
+MODEL_STRIDE = 320
+VAD_FRAME = 320
+
+
+def _normalize_words(text: str) -> List[str]:
+    return re.findall(r"[a-z']+", text.lower())
+
+
+class IncrementalVAD:
+    """逐帧能量 VAD：噪声底按最小值跟踪，语音后持续静音超过 end_silence 视为说完"""
+
+    def __init__(self, end_silence: float = 0.8, min_threshold: float = 0.01):
+        self.end_silence_frames = int(end_silence * SAMPLE_RATE / VAD_FRAME)
+        self.min_threshold = min_threshold
+        self.noise_floor = None
+        self.speech_start = None      # 第一帧语音的采样点位置
+        self.silent_frames = 0
+        self.frames = 0
+        self._remainder = np.zeros(0, dtype=np.float32)
+
+    @property
+    def in_speech(self) -> bool:
+        return self.speech_start is not None and self.silent_frames < self.end_silence_frames
+
+    @property
+    def endpoint(self) -> bool:
+        return self.speech_start is not None and self.silent_frames >= self.end_silence_frames
+
+    def feed(self, samples: np.ndarray):
+        samples = np.concatenate([self._remainder, samples]) if len(self._remainder) else samples
+        n_frames = len(samples) // VAD_FRAME
+        self._remainder = samples[n_frames * VAD_FRAME:].copy()
+        if n_frames == 0:
+            return
+        rms = np.sqrt(np.mean(samples[:n_frames * VAD_FRAME].reshape(n_frames, VAD_FRAME) ** 2, axis=1))
+        for value in rms:
+            # 噪声底取近期最小帧能量，每帧缓慢上浮（约 10%/秒），一开口就说话时也不会把语音当成噪声
+            if self.noise_floor is None:
+                self.noise_floor = min(value, self.min_threshold)
+            self.noise_floor = min(value, self.noise_floor * 1.002)
+            threshold = max(self.min_threshold, self.noise_floor * 3)
+            if value > threshold:
+                if self.speech_start is None:
+                    self.speech_start = self.frames * VAD_FRAME
+                self.silent_frames = 0
+            elif self.speech_start is not None:
+                self.silent_frames += 1
+            self.frames += 1
+
+
+class StreamingScoringSession:
+    """单个 WebSocket 连接的评分状态（音频缓冲区有上限）
+
+    append_pcm16 在接收线程调用，step 在推理线程调用：追加的音频、length、VAD 和 origin
+    由 _lock 保护，step 在锁内取一致的快照后在锁外推理；processed 和 logits 在 origin 确定后
+    只由推理线程（结束时为 finalize）修改。
+    """
+
+    def __init__(self, reference_text: str, logits_fn: Callable[[np.ndarray], np.ndarray],
+                 decode_fn: Callable[[np.ndarray], str], gop_scorer: Optional[GOPScorer] = None,
+                 max_seconds: float = 30, chunk_seconds: float = 1.0, context_seconds: float = 1.0,
+                 end_silence: float = 0.8, lead_seconds: float = 0.2):
+        self.reference_text = reference_text
+        self.reference_words = _normalize_words(reference_text)
+        self.logits_fn = logits_fn
+        self.decode_fn = decode_fn
+        self.gop_scorer = gop_scorer
+        self.max_samples = int(max_seconds * SAMPLE_RATE)
+        # 块长和上下文按模型步长对齐，拼接后的帧与采样点一一对应
+        self.chunk_samples = max(1, int(chunk_seconds * SAMPLE_RATE) // MODEL_STRIDE) * MODEL_STRIDE
+        self.context_samples = int(context_seconds * SAMPLE_RATE) // MODEL_STRIDE * MODEL_STRIDE
+        self.lead_samples = int(lead_seconds * SAMPLE_RATE)
+
+        self.buffer = np.zeros(self.max_samples, dtype=np.float32)
+        self.length = 0
+        self.vad = IncrementalVAD(end_silence)
+        self.origin = None             # 送入模型的第一个采样点（语音开始前留出 lead_seconds）
+        self.processed = 0             # 已完成推理的采样点位置
+        self.logits: List[np.ndarray] = []
+        self.n_frames = 0
+        self._lock = threading.Lock()
+
+    @property
+    def duration(self) -> float:
+        return self.length / SAMPLE_RATE
+
+    def append_pcm16(self, data: bytes) -> bool:
+        """追加 16 位小端 PCM；超过最长时长时丢弃并返回 False"""
+        samples = np.frombuffer(data[:len(data) - len(data) % 2], dtype='<i2').astype(np.float32) * (1.0 / 32768.0)
+        with self._lock:
+            if self.length + len(samples) > self.max_samples:
+                return False
+            self.buffer[self.length:self.length + len(samples)] = samples
+            self.length += len(samples)
+            self.vad.feed(samples)
+            if self.origin is None and self.vad.speech_start is not None:
+                self.origin = max(0, self.vad.speech_start - self.lead_samples) // MODEL_STRIDE * MODEL_STRIDE
+                self.processed = self.origin
+            return True
+
+    def pending_samples(self) -> int:
+        with self._lock:
+            return 0 if self.origin is None else self.length - self.processed
+
+    def _infer(self, end: int):
+        """对 [processed, end) 做前向计算，带左侧上下文，只保留新区间对应的帧"""
+        if end <= self.processed:
+            return
+        window_start = max(self.origin, self.processed - self.context_samples)
+        logits = np.asarray(self.logits_fn(self.buffer[window_start:end]))
+        # 按累计应得帧数截取，逐块的取整误差不会累积
+        expected = (end - self.origin) // MODEL_STRIDE
+        needed = min(max(expected - self.n_frames, 0), len(logits))
+        with self._lock:
+            if needed > 0:
+                self.logits.append(logits[-needed:])
+                self.n_frames += needed
+            self.processed = end
+
+    def step(self) -> Optional[Dict]:
+        """有满一块的新音频时做一次推理，返回部分结果；否则返回 None"""
+        with self._lock:
+            if self.origin is None:
+                return None
+            processed, pending = self.processed, self.length - self.processed
+        if pending < self.chunk_samples:
+            return None
+        # [processed, end) 已写入缓冲区，接收线程只写 length 之后的位置，推理时不必持锁
+        self._infer(processed + pending // self.chunk_samples * self.chunk_samples)
+        return self.partial_result()
+
+    def _transcript(self) -> Tuple[str, Optional[np.ndarray]]:
+        if not self.logits:
+            return "", None
+        logits = np.concatenate(self.logits)
+        return self.decode_fn(np.argmax(logits, axis=-1)).strip(), logits
+
+    def word_status(self, transcript: str, final: bool = False) -> List[Dict]:
+        """参考文本逐词状态：correct / wrong（已说过但不匹配）/ pending（还没说到）"""
+        hypothesis = _normalize_words(transcript)
+        matcher = difflib.SequenceMatcher(a=self.reference_words, b=hypothesis, autojunk=False)
+        status = ['pending'] * len(self.reference_words)
+        reached = 0
+        for block in matcher.get_matching_blocks():
+            for i in range(block.size):
+                status[block.a + i] = 'correct'
+            if block.size:
+                reached = block.a + block.size
+        # 已匹配到的最远位置之前未匹配的词视为说错或漏读；结束时全部未匹配词都算错
+        for i in range(len(status)):
+            if status[i] == 'pending' and (final or i < reached):
+                status[i] = 'wrong'
+        return [{'word': w, 'status': s} for w, s in zip(self.reference_words, status)]
+
+    def partial_result(self) -> Dict:
+        transcript, _ = self._transcript()
+        words = self.word_status(transcript)
+        with self._lock:
+            speech = self.vad.in_speech
+        return {
+            'type': 'partial',
+            'transcript': transcript,
+            'words': words,
+            'correct_words': sum(w['status'] == 'correct' for w in words),
+            'speech': speech,
+            'duration': self.duration
+        }
+
+    def finalize(self, similarity_fn: Optional[Callable[[str, str], float]] = None) -> Dict:
+        """补算剩余音频并给出最终评分（接收和推理线程都已结束后调用）"""
+        with self._lock:
+            if self.origin is None and self.length > 0:
+                # VAD 没有检测到语音（例如麦克风音量很低）时整段送入模型
+                self.origin = self.processed = 0
+        if self.origin is not None and self.length > self.processed:
+            self._infer(self.length)
+        transcript, logits = self._transcript()
+        words = self.word_status(transcript, final=True)
+        word_accuracy = 100.0 * sum(w['status'] == 'correct' for w in words) / max(len(words), 1)
+        result = {
+            'type': 'final',
+            'transcript': transcript,
+            'words': words,
+            'word_accuracy': word_accuracy,
+            'duration': self.duration,
+            'word_scores': [],
+            'weak_words': []
+        }
+        similarity = similarity_fn(transcript, self.reference_text) if similarity_fn else word_accuracy
+        result['similarity_score'] = float(similarity)
+        score = float(similarity)
+        if logits is not None and self.gop_scorer is not None:
+            gop = self.gop_scorer.score(logits, self.reference_text, len(logits) * MODEL_STRIDE / SAMPLE_RATE)
+            if gop is not None:
+                # 时间相对于送入模型的第一个采样点，换算回录音时间
+                offset = self.origin / SAMPLE_RATE
+                for word in gop['word_scores']:
+                    word['start_time'] += offset
+                    word['end_time'] += offset
+                result['word_scores'] = gop['word_scores']
+                result['weak_words'] = gop['weak_words']
+                result['gop_score'] = gop['overall_score']
+                score = gop['overall_score']
+        result['score'] = score
+        return result
+
+
+def load_realtime_config() -> Dict:
+    config = {'enabled': True, 'max_seconds': 30, 'chunk_seconds': 1.0, 'context_seconds': 1.0,
+              'end_silence_seconds': 0.8, 'auto_endpoint': True, 'idle_timeout_seconds': 10}
+    config.update(load_config_section('realtime_scoring'))
+    return config
+
+
+def create_wav2vec2_session(reference_text: str, config: Optional[Dict] = None) -> StreamingScoringSession:
+    """用共享的 Wav2Vec2 模型创建评分会话"""
+    from .发音评分模块 import compute_ctc_logits, get_wav2vec2_model
+    config = config or load_realtime_config()
+    _, processor, _ = get_wav2vec2_model()
+    return StreamingScoringSession(
+        reference_text,
+        logits_fn=compute_ctc_logits,
+        decode_fn=lambda ids: processor.decode(ids),
+        gop_scorer=GOPScorer.from_processor(processor),
+        max_seconds=config['max_seconds'],
+        chunk_seconds=config['chunk_seconds'],
+        context_seconds=config['context_seconds'],
+        end_silence=config['end_silence_seconds']
+    )
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地语法规则
+进程内的轻量规则引擎，覆盖学习者最常见、用预编译正则和小词表就能可靠判断的几类问题，
+规则 ID 与 LanguageTool 保持一致（translate_error_message 可直接翻译）：
+冠词 a/an、主谓一致、句首大写、小写的 I、多余空格、标点前后空格、重复标点。
+一次检查只需几十微秒，语法检测优先使用它，需要拼写等更深的检查时才请求 LanguageTool；
+LanguageTool 不可用时也用它的结果兜底。只有 HIGH_CONFIDENCE_RULES 中的规则足以让分级检查跳过 LanguageTool。
+"""
+
+import re
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from .grammar_client import GrammarBackend, GrammarMatch
+
+CONTEXT_CHARS = 40
+
+# ---- 冠词 a/an ----
+
+_ARTICLE_RE = re.compile(r"(?<![\w'’\-])(a|an)(\s+)([A-Za-z0-9][A-Za-z0-9'’\-]*)", re.IGNORECASE)
+# 读音不能只看首字母，只判断词表能确定的情况，其余交给 LanguageTool：
+# a/e/i/o 开头的词读元音，除了下面几类；u 开头的词只判断列出的前缀；h 开头的词只有列出的读元音
+_A_E_I_O_CONSONANT_PREFIXES = ('one', 'once', 'eu', 'ewe', 'ouija')
+_U_VOWEL_EXCEPTIONS = ('unin', 'unim', 'unid')
+_U_CONSONANT_PREFIXES = ('uni', 'unan', 'unary', 'use', 'usu', 'usur', 'uti', 'ute', 'uto', 'uri', 'uro', 'ure',
+                         'ura', 'ufo', 'ukr', 'uku', 'ubi', 'uvu')
+_U_VOWEL_PREFIXES = ('un', 'up', 'um', 'ug', 'ult', 'ulc', 'udd', 'ush', 'utter', 'urg', 'urb')
+_H_VOWEL_PREFIXES = ('hour', 'honest', 'honor', 'honour', 'heir')
+# 英美读法不同（an historic / a historic 都常见）的 h 开头词，不判断
+_H_UNDECIDED_PREFIXES = ('herb', 'histor', 'hotel', 'homage', 'humble')
+# 单独的字母或“字母-”开头的词（X-ray、U-turn）按字母名读：这些字母的名称以元音开头
+_VOWEL_LETTER_NAMES = set('aefhilmnorsx')
+# 冠词后面不会出现的虚词：多半是把字母 a 当名词用（"the letter a is"）或重复了冠词，不判断
+_ARTICLE_SKIP_WORDS = {'a', 'an', 'the', 'is', 'and', 'or', 'of', 'in', 'on', 'at', 'as', 'if', 'it', 'to'}
+
+# ---- 主谓一致 ----
+
+_PRONOUN_VERB_RE = re.compile(r"\b(I|you|we|they|he|she|it)(\s+)(am|is|are|don['’]t|[a-z]+)\b", re.IGNORECASE)
+_BASE_VERBS = {
+    'go', 'do', 'have', 'like', 'want', 'need', 'make', 'take', 'play', 'eat', 'live', 'work', 'say',
+    'know', 'think', 'come', 'see', 'get', 'read', 'write', 'speak', 'study', 'watch', 'love', 'use',
+    'look', 'feel', 'try', 'help', 'walk', 'run', 'teach', 'learn', 'buy', 'drink', 'sleep', 'swim',
+    'cook', 'wash', 'miss', 'fix', 'finish', 'enjoy', 'hate', 'prefer', 'give', 'listen', 'visit'
+}
+_IRREGULAR_THIRD_PERSON = {'have': 'has', 'do': 'does', 'go': 'goes', "don't": "doesn't"}
+# 这些词之后的 he/she/it + 动词原形是合法的（助动词提问、情态动词、使役结构等）
+_BASE_FORM_TRIGGERS = {
+    'do', 'does', 'did', 'can', 'could', 'will', 'would', 'shall', 'should', 'may', 'might', 'must',
+    'to', 'let', 'lets', 'make', 'makes', 'made', 'help', 'helps', 'helped', 'have', 'has', 'had',
+    'see', 'saw', 'watch', 'watched', 'hear', 'heard', 'feel', 'felt', 'if', 'that'
+}
+# 代词前是这些词时，它是宾语（each of you is）或并列主语的一部分（my sister and I are），不判断一致
+_NON_SUBJECT_TRIGGERS = {
+    'and', 'or', 'nor', 'of', 'about', 'above', 'across', 'after', 'against', 'along', 'among', 'around',
+    'at', 'before', 'behind', 'below', 'beside', 'between', 'beyond', 'by', 'during', 'except', 'for', 'from',
+    'in', 'inside', 'into', 'near', 'next', 'off', 'on', 'onto', 'outside', 'over', 'past', 'through', 'to',
+    'toward', 'towards', 'under', 'until', 'upon', 'with', 'within', 'without', 'than'
+}
+_PREVIOUS_WORD_RE = re.compile(r"([A-Za-z'’]+)\W*$")
+
+# ---- 大小写 ----
+
+_SENTENCE_START_RE = re.compile(r"(?:^\s*|[.!?]\s+)([a-z][a-z'’]*)\b")
+_ABBREVIATIONS = {'etc', 'mr', 'mrs', 'ms', 'dr', 'vs', 'st', 'no'}
+_LOWERCASE_I_RE = re.compile(r"(?<![\w'’.\-])i(?![\w\-]|\.\w)")
+
+# ---- 空格和标点 ----
+
+_REPEATED_SPACE_RE = re.compile(r"(?<=\S)( {2,})(?=\S)")
+_SPACE_BEFORE_PUNCT_RE = re.compile(r"(?<=\w)(\s+)([,.;:)])(?=\s|$)")
+_MISSING_SPACE_AFTER_COMMA_RE = re.compile(r",(?=[A-Za-z])")
+_SPACE_AFTER_PAREN_RE = re.compile(r"\((\s+)")
+_DOUBLE_PUNCT_RE = re.compile(r"(?<![.,])([.,])\1(?![.,])")
+
+
+def _match(text: str, rule_id: str, category: str, message: str, offset: int, length: int,
+           replacements: List[str]) -> GrammarMatch:
+    context = text[max(0, offset - CONTEXT_CHARS):offset + length + CONTEXT_CHARS]
+    return GrammarMatch(rule_id=rule_id, message=message, offset=offset, length=length,
+                        replacements=replacements, context=context, category=category)
+
+
+def _same_case(word: str, template: str) -> str:
+    """按 template 的首字母大小写调整 word"""
+    return word[0].upper() + word[1:] if template[:1].isupper() else word
+
+
+def _number_article(number: str) -> Optional[str]:
+    """数字按读音：8 开头读 eight，11/18 读 eleven/eighteen；1100 这类可读作 eleven hundred 的不判断"""
+    if number.startswith('8'):
+        return 'an'
+    if number.startswith(('11', '18')):
+        return 'an' if len(number) == 2 else None
+    return 'a'
+
+
+def _expected_article(word: str) -> Optional[str]:
+    """word 前应该用的冠词，读音不能确定时返回 None"""
+    lower = word.lower()
+    if lower[0].isdigit():
+        digits = re.match(r"[0-9]+", lower).group()
+        return _number_article(digits)
+    if len(lower) == 1 or lower[1] == '-':
+        return 'an' if lower[0] in _VOWEL_LETTER_NAMES else 'a'
+    if lower[0] in 'aeio':
+        return 'a' if lower.startswith(_A_E_I_O_CONSONANT_PREFIXES) else 'an'
+    if lower[0] == 'u':
+        if lower.startswith(_U_VOWEL_EXCEPTIONS):
+            return 'an'
+        if lower.startswith(_U_CONSONANT_PREFIXES):
+            return 'a'
+        return 'an' if lower.startswith(_U_VOWEL_PREFIXES) else None
+    if lower[0] == 'h':
+        if lower.startswith(_H_VOWEL_PREFIXES):
+            return 'an'
+        return None if lower.startswith(_H_UNDECIDED_PREFIXES) else 'a'
+    return 'a'
+
+
+def _third_person(verb: str) -> str:
+    lower = verb.lower()
+    if lower in _IRREGULAR_THIRD_PERSON:
+        return _IRREGULAR_THIRD_PERSON[lower]
+    if lower.endswith(('s', 'sh', 'ch', 'x', 'o')):
+        return lower + 'es'
+    if lower.endswith('y') and lower[-2:-1] not in 'aeiou':
+        return lower[:-1] + 'ies'
+    return lower + 's'
+
+
+def _previous_word(text: str, offset: int) -> str:
+    found = _PREVIOUS_WORD_RE.search(text[max(0, offset - 30):offset])
+    return found.group(1).lower().replace('’', "'") if found else ''
+
+
+def check_articles(text: str) -> Iterable[GrammarMatch]:
+    for m in _ARTICLE_RE.finditer(text):
+        article, word = m.group(1), m.group(3)
+        # 缩写词（an FBI agent）按字母读音，不判断
+        if word.lower() in _ARTICLE_SKIP_WORDS or (len(word) > 1 and word[1] != '-' and word.isupper()):
+            continue
+        expected = _expected_article(word)
+        if expected is not None and article.lower() != expected:
+            yield _match(text, 'EN_A_VS_AN', 'MISC',
+                         f"Use “{expected}” instead of “{article.lower()}” before “{word}”.",
+                         m.start(1), len(article), [_same_case(expected, article)])
+
+
+def check_agreement(text: str) -> Iterable[GrammarMatch]:
+    for m in _PRONOUN_VERB_RE.finditer(text):
+        pronoun, verb = m.group(1).lower(), m.group(3)
+        lower = verb.lower().replace('’', "'")
+        offset = m.start(3)
+        previous = _previous_word(text, m.start(1))
+        if previous in _NON_SUBJECT_TRIGGERS:
+            continue
+        if pronoun == 'i' and lower in ('is', 'are'):
+            yield _match(text, 'PERS_PRONOUN_AGREEMENT', 'GRAMMAR',
+                         "The pronoun ‘I’ must be used with ‘am’.", offset, len(verb), [_same_case('am', verb)])
+        elif pronoun in ('you', 'we', 'they') and lower in ('is', 'am'):
+            yield _match(text, 'PERS_PRONOUN_AGREEMENT', 'GRAMMAR',
+                         f"The pronoun ‘{pronoun}’ must be used with ‘are’.", offset, len(verb),
+                         [_same_case('are', verb)])
+        elif pronoun in ('he', 'she', 'it') and lower in ('are', 'am'):
+            yield _match(text, 'AI_HYDRA_LEO_CPT_ARE_IS', 'GRAMMAR',
+                         f"The verb ‘{lower}’ does not agree with the singular subject ‘{pronoun}’. Use ‘is’.",
+                         offset, len(verb), [_same_case('is', verb)])
+        elif pronoun in ('he', 'she', 'it') and (lower in _BASE_VERBS or lower == "don't"):
+            if previous in _BASE_FORM_TRIGGERS or previous.endswith("n't"):
+                continue
+            replacement = _third_person(lower)
+            yield _match(text, 'HE_VERB_AGR', 'GRAMMAR',
+                         f"The pronoun ‘{pronoun}’ must be used with a third-person verb: ‘{replacement}’.",
+                         offset, len(verb), [_same_case(replacement, verb)])
+
+
+def check_sentence_start(text: str) -> Iterable[GrammarMatch]:
+    for m in _SENTENCE_START_RE.finditer(text):
+        if m.start(1) > 0 and text[m.start(0)] == '.':
+            # 缩写后的句点（Mr. / e.g.）不是句子结尾
+            if _previous_word(text, m.start(0)) in _ABBREVIATIONS or '.' in text[max(0, m.start(0) - 3):m.start(0)]:
+                continue
+        word = m.group(1)
+        yield _match(text, 'UPPERCASE_SENTENCE_START', 'CASING',
+                     "This sentence does not start with an uppercase letter.",
+                     m.start(1), len(word), [word[0].upper() + word[1:]])
+
+
+def check_lowercase_i(text: str) -> Iterable[GrammarMatch]:
+    for m in _LOWERCASE_I_RE.finditer(text):
+        yield _match(text, 'I_LOWERCASE', 'CASING',
+                     "The personal pronoun “I” should be uppercase.", m.start(), 1, ['I'])
+
+
+def check_whitespace(text: str) -> Iterable[GrammarMatch]:
+    for m in _REPEATED_SPACE_RE.finditer(text):
+        yield _match(text, 'WHITESPACE_RULE', 'TYPOGRAPHY',
+                     "Possible typo: you repeated a whitespace", m.start(1), len(m.group(1)), [' '])
+    for m in _SPACE_BEFORE_PUNCT_RE.finditer(text):
+        yield _match(text, 'COMMA_PARENTHESIS_WHITESPACE', 'TYPOGRAPHY',
+                     "Don't put a space before the punctuation mark.", m.start(1),
+                     m.end(2) - m.start(1), [m.group(2)])
+    for m in _MISSING_SPACE_AFTER_COMMA_RE.finditer(text):
+        yield _match(text, 'COMMA_PARENTHESIS_WHITESPACE', 'TYPOGRAPHY',
+                     "Put a space after the comma.", m.start(), 1, [', '])
+    for m in _SPACE_AFTER_PAREN_RE.finditer(text):
+        yield _match(text, 'COMMA_PARENTHESIS_WHITESPACE', 'TYPOGRAPHY',
+                     "Don't put a space after the opening parenthesis.", m.start(), m.end() - m.start(), ['('])
+
+
+def check_double_punctuation(text: str) -> Iterable[GrammarMatch]:
+    for m in _DOUBLE_PUNCT_RE.finditer(text):
+        mark = m.group(1)
+        yield _match(text, 'DOUBLE_PUNCTUATION', 'PUNCTUATION',
+                     "Two consecutive dots or commas", m.start(), 2, [mark, '…'] if mark == '.' else [mark])
+
+
+# 可靠到足以让分级检查直接返回、不再请求 LanguageTool 的规则 ID；
+# 主谓一致只看代词和紧跟的词（"the man who loves you is" 这类从句看不出来），句首大写和标点空格规则
+# 依赖启发式，都需要 LanguageTool 确认
+HIGH_CONFIDENCE_RULES = frozenset({'EN_A_VS_AN', 'I_LOWERCASE', 'WHITESPACE_RULE', 'DOUBLE_PUNCTUATION'})
+
+# 按优先级排列：位置重叠时保留排在前面的规则
+LOCAL_RULES: Tuple[Tuple[str, Callable[[str], Iterable[GrammarMatch]]], ...] = (
+    ('EN_A_VS_AN', check_articles),
+    ('AGREEMENT', check_agreement),
+    ('UPPERCASE_SENTENCE_START', check_sentence_start),
+    ('I_LOWERCASE', check_lowercase_i),
+    ('WHITESPACE', check_whitespace),
+    ('DOUBLE_PUNCTUATION', check_double_punctuation),
+)
+
+
+class LocalRuleBackend(GrammarBackend):
+    """本地规则后端，结果格式与 LanguageToolClient.check 相同"""
+    name = 'local'
+
+    def __init__(self, disabled_rules: Optional[Iterable[str]] = None,
+                 high_confidence_rules: Optional[Iterable[str]] = None):
+        self.disabled_rules = set(disabled_rules or [])
+        self.rules = [check for name, check in LOCAL_RULES if name not in self.disabled_rules]
+        self.high_confidence_rules = (HIGH_CONFIDENCE_RULES if high_confidence_rules is None
+                                      else frozenset(high_confidence_rules))
+
+    def is_conclusive(self, matches: List[GrammarMatch]) -> bool:
+        """发现了问题且全部来自高置信度规则时，结论不需要 LanguageTool 复核"""
+        return bool(matches) and all(match.rule_id in self.high_confidence_rules for match in matches)
+
+    def check(self, text: str) -> List[GrammarMatch]:
+        order = {id(check): i for i, check in enumerate(self.rules)}
+        found = [(match.offset, order[id(check)], match) for check in self.rules for match in check(text)]
+        matches, cursor = [], 0
+        for _, _, match in sorted(found, key=lambda item: item[:2]):
+            if match.rule_id in self.disabled_rules or match.offset < cursor:
+                continue
+            matches.append(match)
+            cursor = match.offset + max(match.length, 1)
+        return matches
+
+
+if __name__ == "__main__":
+    # 本地规则速度测试，可选与 LanguageTool 在同类规则上的结果比较
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="本地语法规则测试")
+    parser.add_argument('--compare', action='store_true', help='与 LanguageTool 的结果比较（需要能访问服务）')
+    args = parser.parse_args()
+
+    sentences = [
+        "i have a apple and a orange.",
+        "She go to school every day.",
+        "He don't like an banana.",
+        "They is my friends , and we is happy.",
+        "it are a honest mistake..",
+        "What time does he go home?",
+        "This is an university,not a hotel.",
+        "I bought an X-ray machine for an 8-year-old.",
+        "She is a Ukrainian student with a utensil.",
+        "I  want to make it work.",
+    ]
+    backend = LocalRuleBackend()
+    for sentence in sentences:
+        matches = backend.check(sentence)
+        print(f"{sentence}\n  → {[(m.rule_id, sentence[m.offset:m.offset + m.length], m.replacements[:1]) for m in matches]}")
+
+    rounds = 2000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for sentence in sentences:
+            backend.check(sentence)
+    print(f"平均每句 {(time.perf_counter() - start) / (rounds * len(sentences)) * 1e6:.1f}µs")
+
+    if args.compare:
+        from .grammar_client import get_language_tool_client
+        client = get_language_tool_client()
+        for sentence in sentences:
+            remote = {(m.offset, m.rule_id) for m in client.check(sentence)}
+            local = {(m.offset, m.rule_id) for m in backend.check(sentence)}
+            print(f"{sentence}\n  仅本地: {sorted(local - remote)}  仅远程: {sorted(remote - local)}")
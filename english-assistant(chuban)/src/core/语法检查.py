@@ -1,4 +1,6 @@
-from language_tool_python import LanguageTool
+from .grammar_backends import get_grammar_checker
+from .grammar_cache import normalize_grammar_text
+from .grammar_client import apply_corrections
 
 def translate_error_message(rule_id, message):
     """将常见的英文错误描述翻译为中文"""
@@ -14,7 +16,9 @@ def translate_error_message(rule_id, message):
         'HE_VERB_AGR': '人称代词与动词不一致',
         'BEEN_PART_AGREEMENT': '助动词与过去分词不一致',
         'SENTENCE_FRAGMENT': '句子不完整',
-        'DOUBLE_PUNCTUATION': '重复的标点符号'
+        'DOUBLE_PUNCTUATION': '重复的标点符号',
+        'I_LOWERCASE': '代词“I”应该大写',
+        'PERS_PRONOUN_AGREEMENT': '人称代词与be动词不一致'
     }
     
     # 关键词匹配翻译
@@ -45,69 +49,77 @@ def translate_error_message(rule_id, message):
     # 如果都没有匹配，返回原始消息
     return message
 
-def analyze_grammar(text):
-    """使用LanguageTool进行语法分析"""
-    tool = None
-    try:
-        # 使用 LanguageTool 的公共 API
-        tool = LanguageTool('en-US', remote_server='https://api.languagetool.org')
-        matches = tool.check(text)
-        
-        # 获取修正后的文本
-        try:
-            corrected_text = tool.correct(text)
-        except Exception as e:
-            print(f"获取修正文本失败: {e}")
-            corrected_text = text
-
-        if not matches:
-            return {
-                "status": "success", 
-                "message": "语法正确！",
-                "corrected_text": corrected_text
-            }
+def build_grammar_report(text, result):
+    """把检查结果（matches 及来源）整理成接口返回的报告"""
+    matches = result['matches']
+    
+    # 用同一次检查的结果在本地生成修正文本，不再请求第二次
+    corrected_text = apply_corrections(text, matches)
 
-        report = {
-            "error_count": len(matches),
-            "errors": [],
-            "corrected_text": corrected_text
+    if not matches:
+        return {
+            "status": "success", 
+            "message": "语法正确！",
+            "corrected_text": corrected_text,
+            "grammar_backend": result['backend'],
+            "fallback": result['fallback'],
+            "cached": result['cached']
         }
 
-        for match in matches:
-            # 翻译错误消息
-            translated_message = translate_error_message(match.ruleId, match.message)
-            
-            error_info = {
-                "rule_id": match.ruleId,
-                "message": translated_message,  # 使用翻译后的消息
-                "original_message": match.message,  # 保留原始消息作为参考
-                "context": match.context,
-                "replacements": [str(r) for r in match.replacements]  # 确保是字符串列表
-            }
-            
-            # 添加错误位置信息
-            if hasattr(match, 'offset') and hasattr(match, 'errorLength'):
-                error_info["offset"] = match.offset
-                error_info["length"] = match.errorLength
-                error_info["error_text"] = text[match.offset:match.offset + match.errorLength]
-            
-            report["errors"].append(error_info)
+    report = {
+        "error_count": len(matches),
+        "errors": [],
+        "corrected_text": corrected_text,
+        "grammar_backend": result['backend'],
+        "fallback": result['fallback'],
+        "cached": result['cached']
+    }
 
-        return report
+    for match in matches:
+        # 翻译错误消息
+        translated_message = translate_error_message(match.rule_id, match.message)
         
-    except Exception as e:
-        print(f"语法检查失败: {str(e)}")
-        return {
-            "status": "error",
-            "message": f"语法检查服务不可用: {str(e)}",
-            "error_count": 0,
-            "errors": [],
-            "corrected_text": text
+        error_info = {
+            "rule_id": match.rule_id,
+            "message": translated_message,  # 使用翻译后的消息
+            "original_message": match.message,  # 保留原始消息作为参考
+            "context": match.context,
+            "replacements": list(match.replacements),
+            # 错误位置信息
+            "offset": match.offset,
+            "length": match.length,
+            "error_text": text[match.offset:match.offset + match.length]
         }
-    finally:
-        # 确保资源被正确释放
-        if tool is not None:
-            try:
-                tool.close()
-            except Exception as close_error:
-                print(f"关闭LanguageTool时出错: {close_error}")
\ No newline at end of file
+        
+        report["errors"].append(error_info)
+
+    return report
+
+def grammar_error_report(text, e):
+    """检查失败时返回的报告"""
+    print(f"语法检查失败: {str(e)}")
+    return {
+        "status": "error",
+        "message": f"语法检查服务不可用: {str(e)}",
+        "error_count": 0,
+        "errors": [],
+        "corrected_text": text
+    }
+
+def analyze_grammar(text):
+    """语法分析：本地规则优先，必要时请求 LanguageTool（见 config.yaml 的 grammar 段）"""
+    # 检查和缓存都基于规范化后的文本，offset 与返回的 error_text 一致
+    text = normalize_grammar_text(text)
+    try:
+        return build_grammar_report(text, get_grammar_checker().check(text))
+    except Exception as e:
+        return grammar_error_report(text, e)
+
+def analyze_grammar_batch(texts):
+    """批量语法分析：逐句结果与 analyze_grammar 相同，需要 LanguageTool 的句子拼成少数几个请求并发发送"""
+    texts = [normalize_grammar_text(text) for text in texts]
+    try:
+        results = get_grammar_checker().check_many(texts)
+    except Exception as e:
+        return [grammar_error_report(text, e) for text in texts]
+    return [build_grammar_report(text, result) for text, result in zip(texts, results)]
@@ -1,23 +1,84 @@
-import whisper
 import sounddevice as sd
 from scipy.io.wavfile import write
 import os
+import re
+import time
 import logging
+import threading
+import warnings
+import numpy as np
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+from .analysis_profiles import load_config_section
+from .audio_buffer import AudioBuffer
+
+try:
+    import whisper
+    WHISPER_AVAILABLE = True
+except ImportError:
+    WHISPER_AVAILABLE = False
+
+try:
+    from faster_whisper import WhisperModel
+    FASTER_WHISPER_AVAILABLE = True
+except ImportError:
+    FASTER_WHISPER_AVAILABLE = False
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 全局模型缓存
-_whisper_model = None
+SAMPLE_RATE = 16000
+
+
+@dataclass(frozen=True)
+class TranscriptionProfile:
+    """Whisper 解码档位：输入固定为英语，跳过语言检测"""
+    name: str
+    beam_size: Optional[int]             # None 为贪心解码
+    best_of: Optional[int]               # 温度大于 0 时的采样候选数
+    temperature: Tuple[float, ...]       # 压缩比或平均对数概率不达标时依次换用下一个温度重新解码
+    condition_on_previous_text: bool     # 是否把上一段转写作为提示（长录音更连贯，但可能重复出错）
+    without_timestamps: bool = True      # 不预测时间戳，解码步数更少
+
+
+TRANSCRIPTION_PROFILES = {
+    'fast': TranscriptionProfile(
+        name='fast', beam_size=None, best_of=None, temperature=(0.0,),
+        condition_on_previous_text=False
+    ),
+    'balanced': TranscriptionProfile(
+        name='balanced', beam_size=None, best_of=None, temperature=(0.0, 0.4, 0.8),
+        condition_on_previous_text=False
+    ),
+    'accurate': TranscriptionProfile(
+        name='accurate', beam_size=5, best_of=5, temperature=(0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        condition_on_previous_text=True
+    ),
+}
+
+DEFAULT_TRANSCRIPTION_PROFILE = 'fast'
+
+
+def resolve_transcription_profile(name: Optional[str] = None) -> TranscriptionProfile:
+    """确定使用的转写档位
+
+    未指定时使用 config.yaml 中 transcription.default_profile；
+    transcription.profiles.<档位> 中的参数覆盖内置值。
+    """
+    config = load_config_section('transcription')
+    name = name or config.get('default_profile') or DEFAULT_TRANSCRIPTION_PROFILE
+    if name not in TRANSCRIPTION_PROFILES:
+        logger.warning(f"未知的转写档位 {name}，使用 {DEFAULT_TRANSCRIPTION_PROFILE}")
+        name = DEFAULT_TRANSCRIPTION_PROFILE
+    profile = TRANSCRIPTION_PROFILES[name]
+    overrides = dict((config.get('profiles') or {}).get(name) or {})
+    if 'temperature' in overrides:
+        temperature = overrides['temperature']
+        overrides['temperature'] = tuple(temperature) if isinstance(temperature, (list, tuple)) else (temperature,)
+    overrides = {k: v for k, v in overrides.items() if k in TranscriptionProfile.__dataclass_fields__ and k != 'name'}
+    return replace(profile, **overrides) if overrides else profile
 
-def get_whisper_model(model_name="small"):
-    """获取Whisper模型（带缓存）"""
-    global _whisper_model
-    if _whisper_model is None:
-        logger.info(f"加载Whisper模型: {model_name}")
-        _whisper_model = whisper.load_model(model_name)
-    return _whisper_model
 
 def record_audio1(duration=5, fs=16000):
     """录音并返回音频数据"""
@@ -27,33 +88,322 @@ def record_audio1(duration=5, fs=16000):
     write("temp_recording.wav", fs, audio)  # 保存临时文件
     return audio, fs
 
-def transcribe_audio(audio_path="temp_recording.wav"):
-    """使用Whisper进行语音转写"""
+
+class OpenAIWhisperBackend:
+    """参考实现：PyTorch Whisper（CPU 上为 fp32）"""
+    name = 'openai-whisper'
+
+    def __init__(self, model_name: str, **_):
+        if not WHISPER_AVAILABLE:
+            raise ImportError("未安装 openai-whisper")
+        self.model_name = model_name
+        self.model = whisper.load_model(model_name)
+        self.device = self.model.device.type
+
+    def transcribe(self, audio: np.ndarray, profile: TranscriptionProfile, language: str = 'en',
+                   word_timestamps: bool = False) -> Dict:
+        options = {
+            'language': language,
+            'task': 'transcribe',
+            # CPU 不支持半精度，显式关闭以免每次调用都先尝试再回退并打印警告
+            'fp16': self.device == 'cuda',
+            'temperature': profile.temperature,
+            'condition_on_previous_text': profile.condition_on_previous_text,
+            # 词级时间戳依赖片段时间戳
+            'without_timestamps': profile.without_timestamps and not word_timestamps,
+            'word_timestamps': word_timestamps,
+            'verbose': None,
+        }
+        if profile.beam_size:
+            # beam search 只用于温度 0，回退到更高温度时改为采样 best_of 个候选
+            options['beam_size'] = profile.beam_size
+        if profile.best_of:
+            options['best_of'] = profile.best_of
+        with warnings.catch_warnings():
+            # Whisper 只读取输入数组（填充/截断都会新建张量），torch.from_numpy 对只读数组的提示可以忽略
+            warnings.filterwarnings('ignore', message='The given NumPy array is not writable')
+            result = self.model.transcribe(audio, **options)
+        words = []
+        if word_timestamps:
+            words = [{'word': w['word'].strip(), 'start': float(w['start']), 'end': float(w['end']),
+                      'probability': float(w['probability'])}
+                     for segment in result['segments'] for w in segment.get('words', [])]
+        segments = [{'start': float(seg['start']), 'end': float(seg['end']), 'text': seg['text'].strip()}
+                    for seg in result['segments']]
+        return {'text': result['text'].strip(), 'words': words, 'segments': segments}
+
+    def transcribe_batch(self, chunks: List[np.ndarray], profile: TranscriptionProfile,
+                         language: str = 'en') -> List[Dict]:
+        """把多段不超过 30 秒的音频拼成一个批次，编码器和解码器各只运行一次
+
+        批次按温度 0 解码；压缩比或平均对数概率不达标的片段单独走 transcribe 做温度回退，
+        与逐段调用 transcribe 的判定条件一致。
+        """
+        import torch
+        from whisper.audio import log_mel_spectrogram, pad_or_trim
+        n_mels = getattr(self.model.dims, 'n_mels', 80)
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='The given NumPy array is not writable')
+            mels = torch.stack([log_mel_spectrogram(pad_or_trim(torch.from_numpy(chunk)), n_mels)
+                                for chunk in chunks]).to(self.model.device)
+        options = whisper.DecodingOptions(
+            language=language, task='transcribe', temperature=profile.temperature[0],
+            beam_size=profile.beam_size if profile.temperature[0] == 0 else None,
+            best_of=profile.best_of if profile.temperature[0] > 0 else None,
+            fp16=self.device == 'cuda', without_timestamps=True
+        )
+        results = []
+        for chunk, decoded in zip(chunks, whisper.decode(self.model, mels, options)):
+            duration = len(chunk) / SAMPLE_RATE
+            if decoded.no_speech_prob > 0.6 and decoded.avg_logprob < -1.0:
+                # 与 transcribe 相同：判定为无语音的窗口输出空文本
+                results.append({'text': '', 'words': [], 'segments': []})
+            elif ((decoded.compression_ratio > 2.4 or decoded.avg_logprob < -1.0)
+                  and decoded.no_speech_prob <= 0.6 and len(profile.temperature) > 1):
+                results.append(self.transcribe(chunk, profile, language))
+            else:
+                text = decoded.text.strip()
+                results.append({'text': text, 'words': [],
+                                'segments': [{'start': 0.0, 'end': duration, 'text': text}] if text else []})
+        return results
+
+
+class FasterWhisperBackend:
+    """CTranslate2 推理（faster-whisper），CPU 上使用 int8 量化权重"""
+    name = 'faster-whisper'
+
+    def __init__(self, model_name: str, device: str = 'auto', compute_type: str = 'int8',
+                 cpu_threads: int = 0, num_workers: int = 1, **_):
+        if not FASTER_WHISPER_AVAILABLE:
+            raise ImportError("未安装 faster-whisper")
+        self.model_name = model_name
+        # num_workers > 1 时 CTranslate2 可以在多个线程中同时推理
+        self.num_workers = max(1, num_workers)
+        self.model = WhisperModel(model_name, device=device, compute_type=compute_type,
+                                  cpu_threads=cpu_threads, num_workers=self.num_workers)
+        self.device = self.model.model.device
+
+    def transcribe(self, audio: np.ndarray, profile: TranscriptionProfile, language: str = 'en',
+                   word_timestamps: bool = False) -> Dict:
+        # faster-whisper 的 beam_size/best_of 默认都是 5，贪心档位需要显式设为 1
+        segments, _ = self.model.transcribe(
+            audio,
+            language=language,
+            task='transcribe',
+            beam_size=profile.beam_size or 1,
+            best_of=profile.best_of or 1,
+            temperature=list(profile.temperature),
+            condition_on_previous_text=profile.condition_on_previous_text,
+            without_timestamps=profile.without_timestamps and not word_timestamps,
+            word_timestamps=word_timestamps
+        )
+        # segments 是生成器，遍历时才真正解码
+        texts, words, segment_list = [], [], []
+        for segment in segments:
+            texts.append(segment.text)
+            segment_list.append({'start': float(segment.start), 'end': float(segment.end),
+                                 'text': segment.text.strip()})
+            for w in segment.words or []:
+                words.append({'word': w.word.strip(), 'start': float(w.start), 'end': float(w.end),
+                              'probability': float(w.probability)})
+        return {'text': ''.join(texts).strip(), 'words': words, 'segments': segment_list}
+
+    def transcribe_batch(self, chunks: List[np.ndarray], profile: TranscriptionProfile,
+                         language: str = 'en') -> List[Dict]:
+        """CTranslate2 在 Python 之外推理并释放 GIL，按 num_workers 个线程并发转写各段"""
+        if self.num_workers == 1:
+            return [self.transcribe(chunk, profile, language) for chunk in chunks]
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            return list(executor.map(lambda chunk: self.transcribe(chunk, profile, language), chunks))
+
+
+TRANSCRIPTION_BACKENDS = {
+    OpenAIWhisperBackend.name: OpenAIWhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+DEFAULT_TRANSCRIPTION_BACKEND = 'openai-whisper'
+
+
+def _backend_available(name: str) -> bool:
+    return {'openai-whisper': WHISPER_AVAILABLE, 'faster-whisper': FASTER_WHISPER_AVAILABLE}.get(name, False)
+
+
+# 全局模型缓存（按后端和模型名）
+_transcribers = {}
+_transcriber_lock = threading.Lock()
+
+def resolve_transcription_backend(backend: Optional[str] = None) -> str:
+    """实际使用的转写后端：默认 config.yaml 中的 transcription.backend，未安装时退回到另一个可用的后端"""
+    backend = backend or load_config_section('transcription').get('backend') or DEFAULT_TRANSCRIPTION_BACKEND
+    if backend not in TRANSCRIPTION_BACKENDS:
+        logger.warning(f"未知的转写后端 {backend}，使用 {DEFAULT_TRANSCRIPTION_BACKEND}")
+        backend = DEFAULT_TRANSCRIPTION_BACKEND
+    if not _backend_available(backend):
+        fallback = next((name for name in TRANSCRIPTION_BACKENDS if _backend_available(name)), None)
+        if fallback is None:
+            raise ImportError("未安装 openai-whisper 或 faster-whisper，无法进行语音转写")
+        logger.warning(f"转写后端 {backend} 不可用，改用 {fallback}")
+        backend = fallback
+    return backend
+
+def get_transcriber(backend: Optional[str] = None, model_name: Optional[str] = None):
+    """获取转写后端（带缓存）
+
+    默认使用 config.yaml 中的 transcription.backend 和 model.whisper；
+    配置的后端未安装时退回到另一个可用的后端。
+    """
+    config = load_config_section('transcription')
+    backend = resolve_transcription_backend(backend)
+    model_name = model_name or load_config_section('model').get('whisper') or "small"
+
+    key = (backend, model_name)
+    # 加锁避免并发请求重复加载同一个模型
+    with _transcriber_lock:
+        if key not in _transcribers:
+            logger.info(f"加载Whisper模型: {model_name} ({backend})")
+            _transcribers[key] = TRANSCRIPTION_BACKENDS[backend](
+                model_name,
+                device=config.get('device', 'auto'),
+                compute_type=config.get('compute_type', 'int8'),
+                cpu_threads=config.get('cpu_threads', 0),
+                num_workers=config.get('num_workers', 1)
+            )
+        return _transcribers[key]
+
+def get_whisper_model(model_name=None):
+    """获取 PyTorch Whisper 模型（带缓存），默认使用 config.yaml 中的 model.whisper"""
+    return get_transcriber(OpenAIWhisperBackend.name, model_name).model
+
+def _load_input_audio(audio_path) -> np.ndarray:
+    if isinstance(audio_path, AudioBuffer):
+        # 直接使用缓冲区的只读样本，不复制
+        audio_path = audio_path.samples
+    if isinstance(audio_path, np.ndarray):
+        if len(audio_path) == 0:
+            raise ValueError("音频数据为空")
+        audio = np.ascontiguousarray(audio_path, dtype=np.float32)
+        logger.info(f"开始转写内存音频 (时长: {len(audio) / SAMPLE_RATE:.2f}秒)")
+        return audio
+
+    # 检查文件是否存在
+    if not os.path.exists(audio_path):
+        raise FileNotFoundError(f"音频文件不存在: {audio_path}")
+
+    # 检查文件大小
+    file_size = os.path.getsize(audio_path)
+    if file_size == 0:
+        raise ValueError("音频文件为空")
+
+    logger.info(f"开始转写音频文件: {audio_path} (大小: {file_size} 字节)")
+    # 与上传音频走同一套解码逻辑，WAV/FLAC 等不需要 FFmpeg
+    from .audio_decoding import load_audio_file
+    return load_audio_file(audio_path, SAMPLE_RATE)
+
+def transcribe_audio_detailed(audio_path="temp_recording.wav", profile=None, word_timestamps=None,
+                              transcriber=None) -> Dict:
+    """语音转写，返回 {'text', 'words', 'segments'}
+
+    Args:
+        audio_path: 音频文件路径，或已解码的 AudioBuffer / 16kHz float32单声道数组（不经过磁盘）
+        profile: 转写档位名或 TranscriptionProfile，默认使用 transcription.default_profile
+        word_timestamps: 是否返回词级时间戳，默认使用 transcription.word_timestamps
+        transcriber: 指定转写后端实例，默认使用 get_transcriber()
+    """
     try:
-        # 检查文件是否存在
-        if not os.path.exists(audio_path):
-            raise FileNotFoundError(f"音频文件不存在: {audio_path}")
-        
-        # 检查文件大小
-        file_size = os.path.getsize(audio_path)
-        if file_size == 0:
-            raise ValueError("音频文件为空")
-        
-        logger.info(f"开始转写音频文件: {audio_path} (大小: {file_size} 字节)")
-        
+        audio = _load_input_audio(audio_path)
+        config = load_config_section('transcription')
+        if not isinstance(profile, TranscriptionProfile):
+            profile = resolve_transcription_profile(profile)
+        if word_timestamps is None:
+            word_timestamps = bool(config.get('word_timestamps', False))
+
         # 获取模型并转写
-        model = get_whisper_model()
-        result = model.transcribe(audio_path)
-        
-        transcribed_text = result["text"].strip()
-        logger.info(f"转写结果: {transcribed_text}")
-        
-        if not transcribed_text:
+        transcriber = transcriber or get_transcriber()
+        result = transcriber.transcribe(audio, profile, language=config.get('language') or 'en',
+                                        word_timestamps=word_timestamps)
+
+        logger.info(f"转写结果: {result['text']}")
+        if not result['text']:
             logger.warning("转写结果为空")
-            return ""
-        
-        return transcribed_text
-        
+        return result
+
     except Exception as e:
         logger.error(f"Whisper转写失败: {str(e)}")
-        raise e
\ No newline at end of file
+        raise e
+
+def transcribe_audio(audio_path="temp_recording.wav", profile=None):
+    """使用Whisper进行语音转写，返回文本
+
+    Args:
+        audio_path: 音频文件路径，或已解码的 AudioBuffer / 16kHz float32单声道数组（不经过磁盘）
+        profile: 转写档位名或 TranscriptionProfile，默认使用 transcription.default_profile
+    """
+    return transcribe_audio_detailed(audio_path, profile, word_timestamps=False)['text']
+
+
+def _normalize_words(text: str):
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+def word_error_rate(reference: str, hypothesis: str) -> Tuple[int, int]:
+    """词级编辑距离，返回 (错误词数, 参考词数)"""
+    ref, hyp = _normalize_words(reference), _normalize_words(hypothesis)
+    previous = np.arange(len(hyp) + 1)
+    for i, ref_word in enumerate(ref, 1):
+        current = np.empty_like(previous)
+        current[0] = i
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return int(previous[-1]), len(ref)
+
+
+if __name__ == "__main__":
+    # 转写基准：在同一批 Common Voice 录音上统计每个后端、每个档位的延迟和 WER
+    import argparse
+    from .audio_decoding import load_audio_file
+    from .音素统计表 import DEFAULT_CLIPS_DIR, DEFAULT_TSV_FILE, load_clip_records
+
+    parser = argparse.ArgumentParser(description="Whisper 转写基准（各后端、各档位的延迟与 WER）")
+    parser.add_argument('--tsv', default=DEFAULT_TSV_FILE, help='Common Voice validated.tsv')
+    parser.add_argument('--clips-dir', default=DEFAULT_CLIPS_DIR, help='录音所在目录')
+    parser.add_argument('--limit', type=int, default=50, help='参与测试的录音条数')
+    parser.add_argument('--backends', nargs='+', default=[name for name in TRANSCRIPTION_BACKENDS if _backend_available(name)],
+                        help='要测试的转写后端')
+    parser.add_argument('--profiles', nargs='+', default=list(TRANSCRIPTION_PROFILES), help='要测试的档位')
+    parser.add_argument('--word-timestamps', action='store_true', help='同时计算词级时间戳')
+    args = parser.parse_args()
+
+    records = load_clip_records(args.tsv, args.clips_dir, args.limit)
+    if not records:
+        raise SystemExit(f"在 {args.clips_dir} 中没有找到 {args.tsv} 引用的录音")
+    clips = [(load_audio_file(path, SAMPLE_RATE), sentence) for path, sentence in records]
+    audio_seconds = sum(len(audio) for audio, _ in clips) / SAMPLE_RATE
+    model_name = load_config_section('model').get('whisper') or 'small'
+    print(f"模型: {model_name}, {len(clips)} 条录音, 共 {audio_seconds:.0f} 秒")
+
+    print(f"{'后端':<16}{'档位':<10}{'平均延迟':>10}{'P95':>10}{'实时率':>8}{'WER':>8}")
+    for backend in args.backends:
+        start = time.perf_counter()
+        transcriber = get_transcriber(backend, model_name)
+        print(f"{backend:<16}加载耗时 {time.perf_counter() - start:.1f}s ({transcriber.device})")
+        # 预热一次，排除首次调用的初始化开销
+        transcribe_audio_detailed(clips[0][0], 'fast', transcriber=transcriber)
+
+        logger.setLevel(logging.WARNING)
+        for name in args.profiles:
+            profile = resolve_transcription_profile(name)
+            latencies, errors, words = [], 0, 0
+            for audio, sentence in clips:
+                start = time.perf_counter()
+                result = transcribe_audio_detailed(audio, profile, args.word_timestamps, transcriber)
+                latencies.append(time.perf_counter() - start)
+                e, n = word_error_rate(sentence, result['text'])
+                errors += e
+                words += n
+            latencies = np.array(latencies)
+            print(f"{backend:<16}{name:<10}{latencies.mean() * 1000:>8.0f}ms"
+                  f"{np.percentile(latencies, 95) * 1000:>8.0f}ms"
+                  f"{latencies.sum() / audio_seconds:>8.2f}{errors / max(words, 1):>8.1%}")
+        logger.setLevel(logging.INFO)
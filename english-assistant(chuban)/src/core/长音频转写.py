@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+长音频转写
+Whisper 按 30 秒窗口顺序处理长录音，段落朗读和自由表达要等很久。这里先用能量 VAD
+在静音处把录音切成互相独立的片段（每段不超过一个窗口），再用进程池并发转写，
+或者把所有片段组成一个批次送入同一个模型，最后按顺序拼接文本并换算时间戳。
+切分点都落在静音中间时，各片段的转写与顺序逐段解码完全一致。
+"""
+
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from .analysis_profiles import load_config_section
+from .audio_buffer import AudioBuffer
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.02
+
+
+@dataclass(frozen=True)
+class AudioChunk:
+    start: int              # 起始采样点
+    end: int                # 结束采样点（不含）
+    boundary_safe: bool     # 结束位置是否落在静音中（找不到静音时在最长时长处硬切）
+    silent: bool            # 整段都是静音，无需转写
+
+    @property
+    def start_time(self) -> float:
+        return self.start / SAMPLE_RATE
+
+    @property
+    def end_time(self) -> float:
+        return self.end / SAMPLE_RATE
+
+
+def split_on_silence(samples: np.ndarray, max_chunk_seconds: float = 30.0,
+                     min_silence_seconds: float = 0.3) -> List[AudioChunk]:
+    """在静音处切分录音
+
+    20ms 帧 RMS 低于噪声底（第 10 百分位）的 3 倍、且比响亮帧（第 95 百分位）低 20dB 以上的帧
+    视为静音（停顿很少的录音第 10 百分位也落在语音上），持续 min_silence_seconds 以上的
+    静音段中点作为候选切分点；每段在不超过 max_chunk_seconds 的前提下取最靠后的切分点，
+    段数尽量少（Whisper 每段都要编码完整的 30 秒窗口）。
+    """
+    frame = int(SAMPLE_RATE * FRAME_SECONDS)
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return [AudioChunk(0, len(samples), True, True)]
+    rms = np.sqrt(np.mean(samples[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1))
+    threshold = max(1e-3, min(float(np.percentile(rms, 10)) * 3, float(np.percentile(rms, 95)) * 0.1))
+    silent = rms < threshold
+
+    # 静音段的起止帧：在首尾补 False 后求差分
+    edges = np.diff(np.concatenate([[False], silent, [False]]).astype(np.int8))
+    run_starts, run_ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    min_run = max(1, int(min_silence_seconds / FRAME_SECONDS))
+    cut_points = [int(s + e) // 2 for s, e in zip(run_starts, run_ends) if e - s >= min_run and s > 0 and e < n_frames]
+
+    max_frames = int(max_chunk_seconds / FRAME_SECONDS)
+    chunks, start = [], 0
+    while n_frames - start > max_frames:
+        candidates = [c for c in cut_points if start < c <= start + max_frames]
+        cut = candidates[-1] if candidates else start + max_frames
+        chunks.append(AudioChunk(start * frame, cut * frame, bool(candidates), bool(silent[start:cut].all())))
+        start = cut
+    chunks.append(AudioChunk(start * frame, len(samples), True, bool(silent[start:].all())))
+    return chunks
+
+
+def merge_chunk_results(chunks: List[AudioChunk], results: List[Dict]) -> Dict:
+    """按顺序拼接各段文本，片段和词级时间戳加上所在段的起始时间"""
+    texts, segments, words = [], [], []
+    for chunk, result in zip(chunks, results):
+        offset = chunk.start_time
+        if result['text']:
+            texts.append(result['text'])
+        for seg in result.get('segments', []):
+            segments.append({'start': seg['start'] + offset, 'end': min(seg['end'] + offset, chunk.end_time),
+                             'text': seg['text']})
+        for w in result.get('words', []):
+            words.append(dict(w, start=w['start'] + offset, end=w['end'] + offset))
+    return {
+        'text': ' '.join(texts),
+        'segments': segments,
+        'words': words,
+        'chunks': [{'start': c.start_time, 'end': c.end_time, 'boundary_safe': c.boundary_safe} for c in chunks]
+    }
+
+
+# ---- 进程池模式：每个进程各加载一份模型 ----
+
+def _init_worker(backend: Optional[str], model_name: Optional[str], threads: int):
+    global _worker_transcriber
+    # 各进程平分CPU核，避免每个进程都按全部核数开线程互相争抢
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from .语音转写 import get_transcriber
+    _worker_transcriber = get_transcriber(backend, model_name)
+
+def _transcribe_chunk(args) -> Dict:
+    samples, profile, language = args
+    return _worker_transcriber.transcribe(samples, profile, language)
+
+
+_long_form_pool = None
+
+def get_long_form_pool(workers: int = 2) -> ProcessPoolExecutor:
+    """获取长音频转写进程池（单例），子进程启动时加载模型，之后一直复用"""
+    global _long_form_pool
+    if _long_form_pool is None:
+        import os
+        import multiprocessing
+        from .语音转写 import get_transcriber
+        transcriber = get_transcriber()
+        # 使用 spawn：父进程已加载 PyTorch/CTranslate2 及其线程池，fork 后可能死锁
+        _long_form_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(transcriber.name, transcriber.model_name, max(1, (os.cpu_count() or 1) // workers))
+        )
+    return _long_form_pool
+
+
+def load_long_form_config() -> Dict:
+    config = {'enabled': True, 'min_seconds': 30, 'max_chunk_seconds': 30, 'min_silence_seconds': 0.3,
+              'mode': 'batch', 'batch_size': 8, 'workers': 2}
+    config.update(load_config_section('transcription').get('long_form') or {})
+    return config
+
+
+def transcribe_long_form(audio, profile=None, mode: Optional[str] = None, transcriber=None) -> Dict:
+    """长录音转写，返回 {'text', 'segments', 'words', 'chunks'}
+
+    Args:
+        audio: AudioBuffer 或 16kHz float32 单声道数组
+        profile: 转写档位名或 TranscriptionProfile（建议不依赖上文的档位，各段才真正独立）
+        mode: 'batch'（同一个模型批量解码）、'process'（进程池并发）或 'sequential'（逐段顺序解码）
+        transcriber: batch / sequential 模式使用的转写后端，默认 get_transcriber()
+    """
+    from .语音转写 import TranscriptionProfile, get_transcriber, resolve_transcription_profile
+    samples = audio.samples if isinstance(audio, AudioBuffer) else np.ascontiguousarray(audio, dtype=np.float32)
+    config = load_long_form_config()
+    mode = mode or config['mode']
+    if not isinstance(profile, TranscriptionProfile):
+        profile = resolve_transcription_profile(profile)
+    language = load_config_section('transcription').get('language') or 'en'
+
+    start = time.perf_counter()
+    chunks = split_on_silence(samples, config['max_chunk_seconds'], config['min_silence_seconds'])
+    speech = [c for c in chunks if not c.silent]
+    # 数组切片是视图，进程池模式下才会被序列化复制
+    pieces = [np.ascontiguousarray(samples[c.start:c.end]) for c in speech]
+
+    if not pieces:
+        decoded = []
+    elif mode == 'process':
+        pool = get_long_form_pool(config['workers'])
+        decoded = list(pool.map(_transcribe_chunk, [(piece, profile, language) for piece in pieces]))
+    else:
+        transcriber = transcriber or get_transcriber()
+        if mode == 'batch' and hasattr(transcriber, 'transcribe_batch'):
+            # 分批送入，限制一次解码的显存/内存占用
+            size = config['batch_size']
+            decoded = [result for i in range(0, len(pieces), size)
+                       for result in transcriber.transcribe_batch(pieces[i:i + size], profile, language)]
+        else:
+            decoded = [transcriber.transcribe(piece, profile, language) for piece in pieces]
+
+    result = merge_chunk_results(speech, decoded)
+    result['mode'] = mode
+    print(f"📝 长音频转写: {len(samples) / SAMPLE_RATE:.1f}s → {len(speech)} 段 ({mode}), "
+          f"耗时 {time.perf_counter() - start:.1f}s")
+    return result
+
+
+if __name__ == "__main__":
+    # 长音频转写基准：把 Common Voice 录音首尾相连（中间插入 0.5 秒静音）拼成长录音，
+    # 比较顺序逐段解码、批量解码、进程池并发的耗时，并检查三者转写一致
+    import argparse
+    from .audio_decoding import load_audio_file
+    from .音素统计表 import DEFAULT_CLIPS_DIR, DEFAULT_TSV_FILE, load_clip_records
+    from .语音转写 import _normalize_words, word_error_rate
+
+    parser = argparse.ArgumentParser(description="长音频转写基准")
+    parser.add_argument('--tsv', default=DEFAULT_TSV_FILE, help='Common Voice validated.tsv')
+    parser.add_argument('--clips-dir', default=DEFAULT_CLIPS_DIR, help='录音所在目录')
+    parser.add_argument('--limit', type=int, default=40, help='拼接的录音条数')
+    parser.add_argument('--modes', nargs='+', default=['sequential', 'batch', 'process'], help='要测试的模式')
+    args = parser.parse_args()
+
+    records = load_clip_records(args.tsv, args.clips_dir, args.limit)
+    if not records:
+        raise SystemExit(f"在 {args.clips_dir} 中没有找到 {args.tsv} 引用的录音")
+    gap = np.zeros(SAMPLE_RATE // 2, dtype=np.float32)
+    long_audio = np.concatenate([part for path, _ in records for part in (load_audio_file(path, SAMPLE_RATE), gap)])
+    reference = ' '.join(sentence for _, sentence in records)
+    chunks = split_on_silence(long_audio)
+    print(f"长录音 {len(long_audio) / SAMPLE_RATE:.0f} 秒, 切分为 {len(chunks)} 段, "
+          f"硬切 {sum(not c.boundary_safe for c in chunks)} 处")
+
+    outputs = {}
+    for mode in args.modes:
+        transcribe_long_form(long_audio[:SAMPLE_RATE * 5], 'fast', mode)  # 预热（进程池在此启动）
+        start = time.perf_counter()
+        outputs[mode] = transcribe_long_form(long_audio, 'fast', mode)
+        elapsed = time.perf_counter() - start
+        errors, words = word_error_rate(reference, outputs[mode]['text'])
+        print(f"{mode:<12}{elapsed:>8.1f}s   WER {errors / max(words, 1):.1%}")
+    baseline = outputs.get('sequential')
+    for mode, output in outputs.items():
+        if baseline is not None and mode != 'sequential':
+            same = _normalize_words(baseline['text']) == _normalize_words(output['text'])
+            print(f"{mode} 与顺序解码{'一致' if same else '不一致'}")
@@ -4,15 +4,183 @@ from typing import Dict, List, Tuple, Optional
 import scipy.signal
 from scipy import stats
 import warnings
+from .analysis_profiles import AnalysisProfile, ANALYSIS_PROFILES
 warnings.filterwarnings('ignore')
 
+class FormantTracker:
+    """逐帧LPC共振峰跟踪器
+
+    对信号分帧后，所有帧的自相关、Levinson-Durbin递推和求根都以批量矩阵运算完成，
+    输出随时间变化的F1-F3轨迹，音素级统计直接对轨迹切片即可。
+    """
+    
+    def __init__(self, sr: int = 16000, frame_duration: float = 0.025, hop_duration: float = 0.010,
+                 lpc_order: Optional[int] = None, pre_emphasis: float = 0.97,
+                 min_frequency: float = 90.0, max_bandwidth: float = 400.0,
+                 silence_threshold: float = 1e-4):
+        self.sr = sr
+        self.frame_length = int(round(frame_duration * sr))
+        self.hop_length = int(round(hop_duration * sr))
+        # 经验值：阶数 = 采样率(kHz) + 2
+        self.lpc_order = lpc_order or int(sr / 1000) + 2
+        self.pre_emphasis = pre_emphasis
+        self.min_frequency = min_frequency
+        self.max_bandwidth = max_bandwidth
+        self.silence_threshold = silence_threshold  # 相对最大帧能量，低于此值视为静音帧
+        self.window = np.hamming(self.frame_length)
+    
+    def frame_signal(self, audio: np.ndarray) -> np.ndarray:
+        """预加重并分帧加窗，返回 (帧数, 帧长)"""
+        audio = np.asarray(audio, dtype=np.float64)
+        if len(audio) < self.frame_length:
+            audio = np.pad(audio, (0, self.frame_length - len(audio)))
+        emphasized = np.append(audio[0], audio[1:] - self.pre_emphasis * audio[:-1])
+        frames = np.lib.stride_tricks.sliding_window_view(emphasized, self.frame_length)[::self.hop_length]
+        return frames * self.window
+    
+    def lpc_batch(self, frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """对所有帧同时求解LPC系数
+
+        Returns:
+            (a, err): a 形状为 (帧数, 阶数+1)，a[:, 0] == 1；err 为各帧预测误差
+        """
+        order = self.lpc_order
+        n_frames = frames.shape[0]
+        
+        # 通过FFT一次性计算所有帧的自相关
+        n_fft = 1 << int(np.ceil(np.log2(2 * frames.shape[1] - 1)))
+        spectrum = np.fft.rfft(frames, n=n_fft, axis=1)
+        r = np.fft.irfft(np.abs(spectrum) ** 2, n=n_fft, axis=1)[:, :order + 1]
+        r[:, 0] *= 1.0 + 1e-9  # 白噪声修正，避免病态
+        
+        # Levinson-Durbin 递推：对阶数循环，对帧向量化
+        a = np.zeros((n_frames, order + 1))
+        a[:, 0] = 1.0
+        err = r[:, 0].copy()
+        for i in range(1, order + 1):
+            acc = r[:, i] + np.einsum('nj,nj->n', a[:, 1:i], r[:, i - 1:0:-1])
+            k = -acc / np.maximum(err, 1e-12)
+            a[:, 1:i] = a[:, 1:i] + k[:, None] * a[:, i - 1:0:-1]
+            a[:, i] = k
+            err = err * (1.0 - k ** 2)
+        return a, err
+    
+    def track(self, audio: np.ndarray) -> Dict[str, np.ndarray]:
+        """计算F1-F3轨迹，静音帧或无有效共振峰处为NaN"""
+        frames = self.frame_signal(audio)
+        n_frames = frames.shape[0]
+        times = (np.arange(n_frames) * self.hop_length + self.frame_length / 2) / self.sr
+        tracks = {'times': times}
+        
+        energy = np.sum(frames ** 2, axis=1)
+        voiced = energy > self.silence_threshold * (np.max(energy) if n_frames > 0 else 0)
+        formants = np.full((n_frames, 3), np.nan)
+        
+        if np.any(voiced):
+            a, _ = self.lpc_batch(frames[voiced])
+            order = self.lpc_order
+            
+            # 伴随矩阵特征值即多项式的根，可批量求解
+            companion = np.zeros((a.shape[0], order, order))
+            companion[:, 0, :] = -a[:, 1:]
+            companion[:, np.arange(1, order), np.arange(order - 1)] = 1.0
+            roots = np.linalg.eigvals(companion)
+            
+            frequencies = np.angle(roots) * self.sr / (2 * np.pi)
+            bandwidths = -self.sr / np.pi * np.log(np.maximum(np.abs(roots), 1e-12))
+            valid = ((roots.imag > 0) & (frequencies > self.min_frequency) &
+                     (frequencies < self.sr / 2 - 50) & (bandwidths < self.max_bandwidth))
+            
+            candidates = np.sort(np.where(valid, frequencies, np.inf), axis=1)[:, :3]
+            if candidates.shape[1] < 3:
+                candidates = np.pad(candidates, ((0, 0), (0, 3 - candidates.shape[1])), constant_values=np.inf)
+            candidates[np.isinf(candidates)] = np.nan
+            formants[voiced] = candidates
+        
+        tracks['f1'] = formants[:, 0]
+        tracks['f2'] = formants[:, 1]
+        tracks['f3'] = formants[:, 2]
+        return tracks
+    
+    @staticmethod
+    def summarize(tracks: Dict[str, np.ndarray], start_time: Optional[float] = None,
+                  end_time: Optional[float] = None) -> Dict:
+        """对共振峰轨迹在 [start_time, end_time) 区间切片并统计"""
+        times = tracks['times']
+        lo = 0 if start_time is None else int(np.searchsorted(times, start_time, side='left'))
+        hi = len(times) if end_time is None else int(np.searchsorted(times, end_time, side='left'))
+        if hi <= lo and len(times) > 0:
+            # 区间短于一帧时取最近的一帧
+            lo = min(lo, len(times) - 1)
+            hi = lo + 1
+        
+        def _median(values):
+            values = values[~np.isnan(values)]
+            return float(np.median(values)) if len(values) > 0 else 0
+        
+        f1 = _median(tracks['f1'][lo:hi])
+        f2 = _median(tracks['f2'][lo:hi])
+        f3 = _median(tracks['f3'][lo:hi])
+        formants = [f for f in (f1, f2, f3) if f > 0]
+        return {
+            'f1': f1,
+            'f2': f2,
+            'f3': f3,
+            'f1_f2_ratio': f2 / f1 if f1 > 0 else 0,
+            'formant_bandwidth': float(np.std(formants)) if len(formants) > 1 else 0
+        }
+
+
+class FrameFeatureCache:
+    """单次分析内共享的逐帧特征缓存
+
+    对齐和各音素的评分都从同一份整段特征上切片，每种特征在首次访问时才计算。
+    """
+    
+    def __init__(self, audio: np.ndarray, sr: int = 16000,
+                 formant_tracker: Optional[FormantTracker] = None):
+        self.audio = audio
+        self.sr = sr
+        self.formant_tracker = formant_tracker
+        self._cache = {}
+    
+    def get(self, name: str, compute):
+        """获取缓存的特征，不存在时调用 compute() 计算并缓存"""
+        if name not in self._cache:
+            self._cache[name] = compute()
+        return self._cache[name]
+    
+    def rms(self, frame_length: int = 400, hop_length: int = 160) -> np.ndarray:
+        key = f'rms_{frame_length}_{hop_length}'
+        return self.get(key, lambda: librosa.feature.rms(
+            y=self.audio, frame_length=frame_length, hop_length=hop_length)[0])
+    
+    def stft(self, n_fft: int = 400, hop_length: int = 160) -> np.ndarray:
+        key = f'stft_{n_fft}_{hop_length}'
+        return self.get(key, lambda: np.abs(librosa.stft(self.audio, n_fft=n_fft, hop_length=hop_length)))
+    
+    def f0(self, fmin: float = 80, fmax: float = 400) -> np.ndarray:
+        key = f'f0_{fmin}_{fmax}'
+        return self.get(key, lambda: librosa.yin(self.audio, fmin=fmin, fmax=fmax, sr=self.sr))
+    
+    def formant_tracks(self) -> Dict[str, np.ndarray]:
+        tracker = self.formant_tracker or FormantTracker(sr=self.sr)
+        return self.get('formant_tracks', lambda: tracker.track(self.audio))
+    
+    def formant_stats(self, start_time: float, end_time: float) -> Dict:
+        return FormantTracker.summarize(self.formant_tracks(), start_time, end_time)
+
+
 class AcousticFeatureExtractor:
     """声学特征提取器"""
     
-    def __init__(self, sr: int = 16000):
+    def __init__(self, sr: int = 16000, profile: Optional[AnalysisProfile] = None):
         self.sr = sr
         self.hop_length = 512
         self.n_fft = 2048
+        # 未指定档位时保持原行为：计算全部特征
+        self.profile = profile or ANALYSIS_PROFILES['full']
+        self.formant_tracker = FormantTracker(sr=sr)
         
     def extract_f0_features(self, audio: np.ndarray) -> Dict:
         """提取基频相关特征"""
@@ -56,50 +224,23 @@ class AcousticFeatureExtractor:
             return {'f0_mean': 0, 'f0_std': 0, 'f0_median': 0, 'f0_range': 0, 'f0_slope': 0, 'voicing_rate': 0}
     
     def extract_formant_features(self, audio: np.ndarray) -> Dict:
-        """提取共振峰特征（简化版本）"""
+        """提取共振峰特征（逐帧LPC跟踪后取中位数）"""
         try:
-            # 使用LPC方法估算共振峰
-            # 这是一个简化的实现，实际应用中可能需要更专业的共振峰检测
-            
-            # 预加重
-            pre_emphasis = 0.97
-            emphasized = np.append(audio[0], audio[1:] - pre_emphasis * audio[:-1])
-            
-            # 计算LPC系数
-            lpc_order = 10
-            if len(emphasized) > lpc_order:
-                # 使用librosa的lpc估算
-                lpc_coeffs = librosa.lpc(emphasized, order=lpc_order)
-                
-                # 从LPC系数计算频率响应
-                w, h = scipy.signal.freqz(1, lpc_coeffs, worN=512, fs=self.sr)
-                
-                # 找到峰值作为共振峰的近似
-                peaks, _ = scipy.signal.find_peaks(np.abs(h), height=0.1, distance=10)
-                
-                formants = w[peaks] if len(peaks) > 0 else []
-                
-                # 提取前3个共振峰
-                f1 = formants[0] if len(formants) > 0 else 0
-                f2 = formants[1] if len(formants) > 1 else 0
-                f3 = formants[2] if len(formants) > 2 else 0
-                
-                return {
-                    'f1': f1,
-                    'f2': f2,
-                    'f3': f3,
-                    'f1_f2_ratio': f2/f1 if f1 > 0 else 0,
-                    'formant_bandwidth': np.std(formants) if len(formants) > 1 else 0
-                }
-            else:
+            if len(audio) <= self.formant_tracker.lpc_order:
                 return {'f1': 0, 'f2': 0, 'f3': 0, 'f1_f2_ratio': 0, 'formant_bandwidth': 0}
+            tracks = self.formant_tracker.track(audio)
+            return FormantTracker.summarize(tracks)
                 
         except Exception as e:
             print(f"共振峰特征提取失败: {e}")
             return {'f1': 0, 'f2': 0, 'f3': 0, 'f1_f2_ratio': 0, 'formant_bandwidth': 0}
     
-    def extract_spectral_features(self, audio: np.ndarray) -> Dict:
-        """提取频谱特征"""
+    def extract_spectral_features(self, audio: np.ndarray, extended: bool = True) -> Dict:
+        """提取频谱特征
+
+        Args:
+            extended: 是否计算频谱对比度和色度（开销最大的两项）
+        """
         try:
             # 频谱质心
             spectral_centroids = librosa.feature.spectral_centroid(y=audio, sr=self.sr)[0]
@@ -107,31 +248,37 @@ class AcousticFeatureExtractor:
             # 频谱带宽
             spectral_bandwidth = librosa.feature.spectral_bandwidth(y=audio, sr=self.sr)[0]
             
-            # 频谱对比度
-            spectral_contrast = librosa.feature.spectral_contrast(y=audio, sr=self.sr)
-            
             # 频谱滚降点
             spectral_rolloff = librosa.feature.spectral_rolloff(y=audio, sr=self.sr)[0]
             
             # 梅尔频谱系数 (MFCC)
             mfccs = librosa.feature.mfcc(y=audio, sr=self.sr, n_mfcc=13)
             
-            # 色度特征
-            chroma = librosa.feature.chroma_stft(y=audio, sr=self.sr)
-            
-            return {
+            features = {
                 'spectral_centroid_mean': np.mean(spectral_centroids),
                 'spectral_centroid_std': np.std(spectral_centroids),
                 'spectral_bandwidth_mean': np.mean(spectral_bandwidth),
                 'spectral_bandwidth_std': np.std(spectral_bandwidth),
-                'spectral_contrast_mean': np.mean(spectral_contrast, axis=1),
                 'spectral_rolloff_mean': np.mean(spectral_rolloff),
                 'mfcc_mean': np.mean(mfccs, axis=1),
-                'mfcc_std': np.std(mfccs, axis=1),
-                'chroma_mean': np.mean(chroma, axis=1),
-                'chroma_std': np.std(chroma, axis=1)
+                'mfcc_std': np.std(mfccs, axis=1)
             }
             
+            if extended:
+                # 频谱对比度
+                spectral_contrast = librosa.feature.spectral_contrast(y=audio, sr=self.sr)
+                
+                # 色度特征
+                chroma = librosa.feature.chroma_stft(y=audio, sr=self.sr)
+                
+                features.update({
+                    'spectral_contrast_mean': np.mean(spectral_contrast, axis=1),
+                    'chroma_mean': np.mean(chroma, axis=1),
+                    'chroma_std': np.std(chroma, axis=1)
+                })
+            
+            return features
+            
         except Exception as e:
             print(f"频谱特征提取失败: {e}")
             return {}
@@ -167,27 +314,32 @@ class AcousticFeatureExtractor:
             return {}
     
     def extract_all_features(self, audio: np.ndarray) -> Dict:
-        """提取所有声学特征"""
+        """提取当前分析档位开启的所有声学特征"""
         if len(audio) == 0:
             return {}
         
         features = {}
+        profile = self.profile
         
         # 基频特征
-        f0_features = self.extract_f0_features(audio)
-        features.update(f0_features)
+        if profile.f0:
+            f0_features = self.extract_f0_features(audio)
+            features.update(f0_features)
         
         # 共振峰特征
-        formant_features = self.extract_formant_features(audio)
-        features.update(formant_features)
+        if profile.formants:
+            formant_features = self.extract_formant_features(audio)
+            features.update(formant_features)
         
         # 频谱特征
-        spectral_features = self.extract_spectral_features(audio)
-        features.update(spectral_features)
+        if profile.spectral:
+            spectral_features = self.extract_spectral_features(audio, extended=profile.spectral_extended)
+            features.update(spectral_features)
         
         # 时域特征
-        temporal_features = self.extract_temporal_features(audio)
-        features.update(temporal_features)
+        if profile.temporal:
+            temporal_features = self.extract_temporal_features(audio)
+            features.update(temporal_features)
         
         return features
 
@@ -195,9 +347,31 @@ class AcousticFeatureExtractor:
 class PhonemeAligner:
     """音素对齐器"""
     
-    def __init__(self):
-        self.min_phoneme_duration = 0.03  # 最小音素时长（秒）
-        self.max_phoneme_duration = 0.4   # 最大音素时长（秒）
+    # 音素典型时长权重
+    DURATION_WEIGHTS = {
+        # 元音通常较长
+        'æ': 1.2, 'ɪ': 1.0, 'ʊ': 1.0, 'iː': 1.5, 'uː': 1.5, 'ɜː': 1.8,
+        'ʌ': 1.1, 'aɪ': 1.3, 'aʊ': 1.3, 'ɔɪ': 1.3, 'e': 1.1, 'ɒ': 1.1,
+        
+        # 辅音通常较短
+        'p': 0.6, 'b': 0.7, 't': 0.6, 'd': 0.7, 'k': 0.6, 'g': 0.7,
+        'f': 0.9, 'v': 0.8, 'θ': 0.8, 'ð': 0.7, 's': 0.9, 'z': 0.8,
+        'ʃ': 0.9, 'ʒ': 0.8, 'tʃ': 0.8, 'dʒ': 0.8,
+        'm': 0.8, 'n': 0.8, 'ŋ': 0.8, 'l': 0.8, 'r': 0.8,
+        'w': 0.7, 'j': 0.6, 'h': 0.5
+    }
+    
+    def __init__(self, min_phoneme_duration: float = 0.03, max_phoneme_duration: float = 0.4):
+        self.min_phoneme_duration = min_phoneme_duration  # 最小音素时长（秒）
+        self.max_phoneme_duration = max_phoneme_duration  # 最大音素时长（秒）
+        
+        # 能量分段参数
+        self.frame_length = 400           # 25ms @ 16kHz
+        self.hop_length = 160             # 10ms @ 16kHz
+        self.duration_penalty = 0.5       # 偏离期望时长的惩罚系数
+        self.min_energy_std = 0.1         # 对数能量标准差下限（约0.9dB）
+        self.max_residual_ratio = 0.9     # 分段后残差占总方差的上限，超过说明能量曲线没有可用结构
+        self.max_dp_cells = 2_000_000     # 动态规划的计算量上限，超过时合并帧
     
     def simple_uniform_alignment(self, audio_length: int, phoneme_sequence: List[str], 
                                 sr: int = 16000) -> List[Tuple[str, float, float]]:
@@ -221,20 +395,6 @@ class PhonemeAligner:
     def duration_weighted_alignment(self, audio_length: int, phoneme_sequence: List[str],
                                   sr: int = 16000) -> List[Tuple[str, float, float]]:
         """基于音素典型时长的加权对齐"""
-        # 音素典型时长权重
-        duration_weights = {
-            # 元音通常较长
-            'æ': 1.2, 'ɪ': 1.0, 'ʊ': 1.0, 'iː': 1.5, 'uː': 1.5, 'ɜː': 1.8,
-            'ʌ': 1.1, 'aɪ': 1.3, 'aʊ': 1.3, 'ɔɪ': 1.3, 'e': 1.1, 'ɒ': 1.1,
-            
-            # 辅音通常较短
-            'p': 0.6, 'b': 0.7, 't': 0.6, 'd': 0.7, 'k': 0.6, 'g': 0.7,
-            'f': 0.9, 'v': 0.8, 'θ': 0.8, 'ð': 0.7, 's': 0.9, 'z': 0.8,
-            'ʃ': 0.9, 'ʒ': 0.8, 'tʃ': 0.8, 'dʒ': 0.8,
-            'm': 0.8, 'n': 0.8, 'ŋ': 0.8, 'l': 0.8, 'r': 0.8,
-            'w': 0.7, 'j': 0.6, 'h': 0.5
-        }
-        
         total_duration = audio_length / sr
         phoneme_count = len(phoneme_sequence)
         
@@ -242,22 +402,22 @@ class PhonemeAligner:
             return []
         
         # 计算权重总和
-        weights = [duration_weights.get(ph, 1.0) for ph in phoneme_sequence]
+        weights = [self.DURATION_WEIGHTS.get(ph, 1.0) for ph in phoneme_sequence]
         total_weight = sum(weights)
         
-        # 分配时长
+        # 按权重分配时长并限制在合理范围内，再整体缩放回录音实际时长
+        durations = [max(self.min_phoneme_duration, min(self.max_phoneme_duration,
+                                                        weight / total_weight * total_duration))
+                     for weight in weights]
+        scale = total_duration / sum(durations)
+        
         alignments = []
         current_time = 0.0
         
-        for i, (phoneme, weight) in enumerate(zip(phoneme_sequence, weights)):
-            duration = (weight / total_weight) * total_duration
-            
-            # 限制在合理范围内
-            duration = max(self.min_phoneme_duration, 
-                          min(self.max_phoneme_duration, duration))
-            
+        for i, (phoneme, duration) in enumerate(zip(phoneme_sequence, durations)):
             start_time = current_time
-            end_time = current_time + duration
+            end_time = total_duration if i == phoneme_count - 1 else min(current_time + duration * scale,
+                                                                         total_duration)
             
             alignments.append((phoneme, start_time, end_time))
             current_time = end_time
@@ -265,57 +425,127 @@ class PhonemeAligner:
         return alignments
     
     def energy_based_alignment(self, audio: np.ndarray, phoneme_sequence: List[str],
-                              sr: int = 16000) -> List[Tuple[str, float, float]]:
-        """基于能量变化的对齐"""
+                              sr: int = 16000,
+                              feature_cache: Optional[FrameFeatureCache] = None) -> List[Tuple[str, float, float]]:
+        """基于能量的最优分段对齐
+
+        把对数RMS能量曲线切成 N 段（N 为音素数），用动态规划放置 N-1 个边界，
+        使各段内能量方差之和加上偏离期望时长（按音素典型时长分配）的惩罚最小。
+        段长限制在 [最小音素时长, 最大音素时长] 内，每一层递推对所有终点和段长向量化计算。
+        能量曲线没有可用结构（残差超过 max_residual_ratio）时退回到按时长加权的对齐。
+        """
         try:
-            # 计算短时能量
-            hop_length = 512
-            frame_length = 1024
-            
-            # 使用RMS作为能量指标
-            rms = librosa.feature.rms(y=audio, hop_length=hop_length, frame_length=frame_length)[0]
-            
-            # 平滑能量曲线
-            from scipy.ndimage import gaussian_filter1d
-            smoothed_rms = gaussian_filter1d(rms, sigma=2)
-            
-            # 找到能量变化点
-            diff = np.diff(smoothed_rms)
-            change_points = np.where(np.abs(diff) > np.std(diff) * 0.5)[0]
-            
-            # 转换为时间
-            time_per_frame = hop_length / sr
-            change_times = change_points * time_per_frame
-            
-            # 根据变化点分割音素
-            total_duration = len(audio) / sr
             phoneme_count = len(phoneme_sequence)
+            total_duration = len(audio) / sr
             
             if phoneme_count == 0:
                 return []
-            
-            # 如果变化点不够，使用均匀分割
-            if len(change_times) < phoneme_count - 1:
-                return self.simple_uniform_alignment(len(audio), phoneme_sequence, sr)
-            
-            # 选择合适的分割点
-            segment_times = [0.0]
-            if len(change_times) > 0:
-                selected_points = np.linspace(0, len(change_times)-1, phoneme_count-1, dtype=int)
-                segment_times.extend(change_times[selected_points])
-            segment_times.append(total_duration)
+            if phoneme_count == 1:
+                return [(phoneme_sequence[0], 0.0, total_duration)]
+            
+            # 复用同一次分析中的逐帧RMS
+            cache = feature_cache or FrameFeatureCache(audio, sr)
+            rms = cache.rms(frame_length=self.frame_length, hop_length=self.hop_length)
+            energy = np.log(rms + 1e-8)
+            
+            # 能量几乎恒定（稳态噪声、持续音）时分段没有依据
+            std = np.std(energy)
+            if std < self.min_energy_std:
+                return self.duration_weighted_alignment(len(audio), phoneme_sequence, sr)
+            energy = (energy - np.mean(energy)) / std
+            
+            # 计算量上限：帧数和段长（含语速过慢时的放宽）都随合并倍数线性下降，所以按平方根合并
+            hop_seconds = self.hop_length / sr
+            cells = phoneme_count * len(energy) * self._max_segment_frames(len(energy), phoneme_count, hop_seconds)
+            pool = max(1, int(np.ceil(np.sqrt(cells / self.max_dp_cells))))
+            if pool > 1:
+                usable = len(energy) // pool * pool
+                energy = energy[:usable].reshape(-1, pool).mean(axis=1)
+                hop_seconds *= pool
+            
+            boundaries = self._optimal_segmentation(energy, phoneme_sequence, hop_seconds)
+            if boundaries is None:
+                return self.duration_weighted_alignment(len(audio), phoneme_sequence, sr)
+            
+            segment_times = [min(b * hop_seconds, total_duration) for b in boundaries]
+            segment_times[0] = 0.0
+            segment_times[-1] = total_duration
             
             alignments = []
             for i in range(phoneme_count):
-                start_time = segment_times[i]
-                end_time = segment_times[i + 1]
-                alignments.append((phoneme_sequence[i], start_time, end_time))
+                alignments.append((phoneme_sequence[i], segment_times[i], segment_times[i + 1]))
             
             return alignments
             
         except Exception as e:
             print(f"基于能量的对齐失败: {e}")
             return self.simple_uniform_alignment(len(audio), phoneme_sequence, sr)
+    
+    def _max_segment_frames(self, n_frames: int, phoneme_count: int, hop_seconds: float) -> int:
+        """段长上限（帧）：最大音素时长；语速过慢、N 段放不下全部帧时放宽，保证有可行解"""
+        max_len = int(np.ceil(self.max_phoneme_duration / hop_seconds))
+        if phoneme_count * max_len < n_frames:
+            max_len = max(max_len, 2 * int(np.ceil(n_frames / phoneme_count)))
+        return max_len
+    
+    def _optimal_segmentation(self, energy: np.ndarray, phoneme_sequence: List[str],
+                              hop_seconds: float) -> Optional[List[int]]:
+        """动态规划求最优分段边界（帧下标，含首尾），无可行解或代价超限时返回 None"""
+        n_frames = len(energy)
+        phoneme_count = len(phoneme_sequence)
+        
+        min_len = max(1, int(round(self.min_phoneme_duration / hop_seconds)))
+        if phoneme_count * min_len > n_frames:
+            min_len = max(1, n_frames // phoneme_count)
+        if phoneme_count > n_frames:
+            return None
+        max_len = max(min_len, self._max_segment_frames(n_frames, phoneme_count, hop_seconds))
+        if phoneme_count * n_frames * max_len > 4 * self.max_dp_cells:
+            # 调用方已按同样的段长上限合并帧，这里只是保险
+            return None
+        
+        weights = np.array([self.DURATION_WEIGHTS.get(ph, 1.0) for ph in phoneme_sequence])
+        expected = weights / weights.sum() * n_frames
+        
+        # 前缀和：任意区间 [i, j) 的平方误差为 S2 - S1²/长度
+        s1 = np.concatenate(([0.0], np.cumsum(energy)))
+        s2 = np.concatenate(([0.0], np.cumsum(energy ** 2)))
+        
+        lengths = np.arange(min_len, max_len + 1)
+        ends = np.arange(n_frames + 1)
+        starts = ends[:, None] - lengths[None, :]
+        valid = starts >= 0
+        starts = np.where(valid, starts, 0)
+        sse = (s2[ends, None] - s2[starts]) - (s1[ends, None] - s1[starts]) ** 2 / lengths
+        sse = np.where(valid, np.maximum(sse, 0.0), np.inf)
+        
+        cost = np.full(n_frames + 1, np.inf)
+        cost[0] = 0.0
+        back = np.zeros((phoneme_count, n_frames + 1), dtype=np.int64)
+        for k in range(phoneme_count):
+            duration_cost = self.duration_penalty * (lengths - expected[k]) ** 2 / expected[k]
+            total = cost[starts] + sse + duration_cost[None, :]
+            best = np.argmin(total, axis=1)
+            cost = total[ends, best]
+            back[k] = starts[ends, best]
+        
+        if not np.isfinite(cost[n_frames]):
+            return None
+        
+        boundaries = [n_frames]
+        for k in range(phoneme_count - 1, -1, -1):
+            boundaries.append(int(back[k, boundaries[-1]]))
+        boundaries.reverse()
+        
+        # 代价上限：标准化后总方差为 n_frames，残差比例过高说明分段不可信
+        bounds = np.array(boundaries)
+        residual = np.sum(s2[bounds[1:]] - s2[bounds[:-1]] -
+                          (s1[bounds[1:]] - s1[bounds[:-1]]) ** 2 / np.diff(bounds))
+        if residual / n_frames > self.max_residual_ratio:
+            print(f"能量分段残差过高 ({residual / n_frames:.2f})，改用时长加权对齐")
+            return None
+        
+        return boundaries
 
 
 class PronunciationQualityAssessor:
@@ -452,4 +682,54 @@ class PronunciationQualityAssessor:
         if phoneme_type == 'vowel':
             return self.assess_vowel_quality(features, phoneme)
         else:
-            return self.assess_consonant_quality(features, phoneme, phoneme_type)
\ No newline at end of file
+            return self.assess_consonant_quality(features, phoneme, phoneme_type)
+
+def _single_lpc_formants(audio: np.ndarray, sr: int = 16000) -> Dict:
+    """旧实现：整段信号拟合一个10阶LPC并在频响上找峰（仅用于基准对比）"""
+    emphasized = np.append(audio[0], audio[1:] - 0.97 * audio[:-1])
+    lpc_coeffs = librosa.lpc(emphasized, order=10)
+    w, h = scipy.signal.freqz(1, lpc_coeffs, worN=512, fs=sr)
+    peaks, _ = scipy.signal.find_peaks(np.abs(h), height=0.1, distance=10)
+    formants = w[peaks] if len(peaks) > 0 else []
+    return {
+        'f1': formants[0] if len(formants) > 0 else 0,
+        'f2': formants[1] if len(formants) > 1 else 0,
+        'f3': formants[2] if len(formants) > 2 else 0
+    }
+
+
+def _synthesize_vowel(duration: float, sr: int = 16000, f0: float = 120.0,
+                      formants=((700, 90), (1220, 110), (2600, 160))) -> np.ndarray:
+    """用脉冲串激励级联共振器合成元音，用于基准测试"""
+    n = int(duration * sr)
+    excitation = np.zeros(n)
+    excitation[::int(sr / f0)] = 1.0
+    signal = excitation
+    for freq, bw in formants:
+        r = np.exp(-np.pi * bw / sr)
+        theta = 2 * np.pi * freq / sr
+        signal = scipy.signal.lfilter([1 - r], [1, -2 * r * np.cos(theta), r ** 2], signal)
+    signal = signal / np.max(np.abs(signal))
+    signal += np.random.default_rng(0).normal(scale=1e-4, size=n)
+    return signal.astype(np.float32)
+
+
+if __name__ == "__main__":
+    # 共振峰提取吞吐量基准：python -m src.core.音素特征提取
+    import timeit
+    
+    sr = 16000
+    tracker = FormantTracker(sr=sr)
+    print("真实共振峰: F1=700 F2=1220 F3=2600")
+    for duration in (1.0, 5.0, 20.0):
+        audio = _synthesize_vowel(duration, sr)
+        repeat = 5
+        legacy_time = timeit.timeit(lambda: _single_lpc_formants(audio, sr), number=repeat) / repeat
+        tracked_time = timeit.timeit(lambda: tracker.track(audio), number=repeat) / repeat
+        legacy = _single_lpc_formants(audio, sr)
+        tracked = FormantTracker.summarize(tracker.track(audio))
+        print(f"\n音频时长 {duration:.0f}s")
+        print(f"  单次LPC : {legacy_time * 1000:8.1f}ms  ({duration / legacy_time:7.1f}x 实时)  "
+              f"F1={legacy['f1']:.0f} F2={legacy['f2']:.0f} F3={legacy['f3']:.0f}")
+        print(f"  逐帧批量: {tracked_time * 1000:8.1f}ms  ({duration / tracked_time:7.1f}x 实时)  "
+              f"F1={tracked['f1']:.0f} F2={tracked['f2']:.0f} F3={tracked['f3']:.0f}")
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+母语者音素统计表
+离线遍历 Common Voice 录音，对齐后按音素汇总声学特征的均值/标准差，
+评分时把学习者的特征换算成相对母语者分布的 z 分数。
+
+构建：python -m src.core.音素统计表 --limit 5000 --workers 8
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from .analysis_profiles import CONFIG_FILE, load_phoneme_scoring_config
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(CONFIG_FILE))
+DEFAULT_TSV_FILE = os.path.join(PROJECT_ROOT, "data", "common_voice", "validated.tsv")
+DEFAULT_CLIPS_DIR = os.path.join(PROJECT_ROOT, "data", "common_voice", "clips")
+DEFAULT_STATS_PATH = os.path.join(PROJECT_ROOT, "data", "native_phoneme_stats.npy")
+
+# 统计表收录的标量特征，顺序即表中列的顺序
+STAT_FEATURES = (
+    'duration',
+    'energy_mean',
+    'zcr_mean',
+    'spectral_centroid_mean',
+    'spectral_bandwidth_mean',
+    'f0_mean',
+    'f1',
+    'f2',
+    'f3',
+)
+
+# 这些特征为 0 表示没有提取到（无声段、共振峰缺失），不计入统计
+_ZERO_MEANS_MISSING = {'f0_mean', 'f1', 'f2', 'f3'}
+
+FEATURE_LABELS = {
+    'duration': '时长',
+    'energy_mean': '能量',
+    'zcr_mean': '过零率',
+    'spectral_centroid_mean': '频谱质心',
+    'spectral_bandwidth_mean': '频谱带宽',
+    'f0_mean': '基频',
+    'f1': '第一共振峰',
+    'f2': '第二共振峰',
+    'f3': '第三共振峰',
+}
+
+
+def feature_vector(features: Dict, duration: float) -> np.ndarray:
+    """把特征字典整理成与 STAT_FEATURES 对齐的向量，缺失项为 NaN"""
+    vector = np.full(len(STAT_FEATURES), np.nan)
+    for i, name in enumerate(STAT_FEATURES):
+        value = duration if name == 'duration' else features.get(name)
+        if value is None:
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            continue
+        if name in _ZERO_MEANS_MISSING and value <= 0:
+            continue
+        vector[i] = value
+    return vector
+
+
+def table_dtype(max_phoneme_length: int = 4) -> np.dtype:
+    """统计表的结构化 dtype：count 为音素段数；每个特征一列有效样本数、一列均值、一列标准差"""
+    fields = [('phoneme', f'U{max_phoneme_length}'), ('count', 'i4')]
+    fields += [(f'count_{name}', 'i4') for name in STAT_FEATURES]
+    fields += [(f'mean_{name}', 'f4') for name in STAT_FEATURES]
+    fields += [(f'std_{name}', 'f4') for name in STAT_FEATURES]
+    return np.dtype(fields)
+
+
+class PhonemeStatsAccumulator:
+    """按音素累计 样本数 / 和 / 平方和，可在进程间合并"""
+
+    def __init__(self):
+        # phoneme -> (3, n_features)：第0行样本数，第1行和，第2行平方和
+        self.sums: Dict[str, np.ndarray] = {}
+        self.segments: Dict[str, int] = {}
+
+    def add(self, phoneme: str, vector: np.ndarray):
+        acc = self.sums.get(phoneme)
+        if acc is None:
+            acc = self.sums[phoneme] = np.zeros((3, len(STAT_FEATURES)))
+            self.segments[phoneme] = 0
+        # 缺失（NaN）和异常（inf）的特征都不计入，该特征的有效样本数也不增加
+        valid = np.isfinite(vector)
+        acc[0, valid] += 1
+        acc[1, valid] += vector[valid]
+        acc[2, valid] += vector[valid] ** 2
+        self.segments[phoneme] += 1
+
+    def merge(self, other: 'PhonemeStatsAccumulator'):
+        for phoneme, acc in other.sums.items():
+            if phoneme in self.sums:
+                self.sums[phoneme] += acc
+                self.segments[phoneme] += other.segments[phoneme]
+            else:
+                self.sums[phoneme] = acc.copy()
+                self.segments[phoneme] = other.segments[phoneme]
+
+    def to_table(self) -> np.ndarray:
+        phonemes = sorted(self.sums)
+        max_length = max([len(p) for p in phonemes] + [4])
+        table = np.zeros(len(phonemes), dtype=table_dtype(max_length))
+        for row, phoneme in enumerate(phonemes):
+            counts, sums, squares = self.sums[phoneme]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = sums / counts
+                std = np.sqrt(np.maximum(squares / counts - mean ** 2, 0.0))
+            table['phoneme'][row] = phoneme
+            table['count'][row] = self.segments[phoneme]
+            for i, name in enumerate(STAT_FEATURES):
+                table[f'count_{name}'][row] = counts[i]
+                table[f'mean_{name}'][row] = mean[i]
+                table[f'std_{name}'][row] = std[i]
+        return table
+
+
+class NativePhonemeStats:
+    """母语者音素统计表（只读，启动时加载一次）"""
+
+    def __init__(self, table: np.ndarray, min_count: int = 30):
+        self.table = table
+        self.min_count = min_count
+        self.index = {str(p): i for i, p in enumerate(table['phoneme'])}
+        # 表很小，展开成二维数组后每次查询只是一次行索引
+        self.means = np.stack([table[f'mean_{name}'] for name in STAT_FEATURES], axis=1).astype(np.float64)
+        self.stds = np.stack([table[f'std_{name}'] for name in STAT_FEATURES], axis=1).astype(np.float64)
+        self.counts = np.asarray(table['count'])
+        # 每个特征的有效样本数；早期的表没有这些列，按音素段数计
+        names = table.dtype.names
+        self.feature_counts = np.stack([table[f'count_{name}'] if f'count_{name}' in names else table['count']
+                                        for name in STAT_FEATURES], axis=1)
+
+    @classmethod
+    def load(cls, path: str, min_count: int = 30) -> 'NativePhonemeStats':
+        # .npy 可直接内存映射；npz 的成员无法映射，因此不用 npz
+        return cls(np.load(path, mmap_mode='r'), min_count=min_count)
+
+    def has_phoneme(self, phoneme: str) -> bool:
+        row = self.index.get(phoneme)
+        return row is not None and self.counts[row] >= self.min_count
+
+    def zscores(self, phoneme: str, features: Dict, duration: float) -> Dict[str, float]:
+        """计算各特征相对母语者分布的 z 分数，缺失或有效样本不足 min_count 的特征不返回"""
+        row = self.index.get(phoneme)
+        if row is None or self.counts[row] < self.min_count:
+            return {}
+        vector = feature_vector(features, duration)
+        std = self.stds[row]
+        valid = (np.isfinite(vector) & np.isfinite(self.means[row]) & (std > 0)
+                 & (self.feature_counts[row] >= self.min_count))
+        z = np.zeros(len(STAT_FEATURES))
+        z[valid] = (vector[valid] - self.means[row][valid]) / std[valid]
+        return {STAT_FEATURES[i]: float(z[i]) for i in np.flatnonzero(valid)}
+
+
+_native_stats = None
+_native_stats_loaded = False
+
+def get_native_phoneme_stats() -> Optional[NativePhonemeStats]:
+    """获取母语者统计表（单例），未构建或未启用时返回 None"""
+    global _native_stats, _native_stats_loaded
+    if not _native_stats_loaded:
+        _native_stats_loaded = True
+        config = load_phoneme_scoring_config()
+        path = config.get('native_stats_path') or DEFAULT_STATS_PATH
+        if not os.path.isabs(path):
+            path = os.path.join(PROJECT_ROOT, path)
+        if os.path.exists(path):
+            try:
+                _native_stats = NativePhonemeStats.load(path, config.get('native_stats_min_count', 30))
+                print(f"✅ 母语者音素统计表加载成功: {len(_native_stats.index)} 个音素")
+            except Exception as e:
+                print(f"⚠️ 母语者音素统计表加载失败: {e}")
+        else:
+            print("ℹ️ 未找到母语者音素统计表，音素评分使用规则阈值")
+    return _native_stats
+
+
+# ---------------- 离线构建 ----------------
+
+_worker_scorer = None
+_worker_model = (None, None)
+
+def _init_worker():
+    """进程池初始化：每个工作进程只创建一次评分器，并加载线上评分所用的 Wav2Vec2 模型"""
+    global _worker_scorer, _worker_model
+    from .音素评分模块 import PhonemeScorer
+    from .analysis_profiles import resolve_analysis_profile
+    # 统计表需要所有特征族，与线上使用的档位无关
+    _worker_scorer = PhonemeScorer(profile=resolve_analysis_profile('full'))
+    # 对齐必须与线上评分一致（force_align_ctc），否则 z 分数比较的是两种分段下的特征；
+    # 模型不可用时 force_align_ctc 与线上一样退回能量分段
+    try:
+        from .发音评分模块 import get_wav2vec2_model
+        model, processor, _ = get_wav2vec2_model()
+        _worker_model = (model, processor)
+    except Exception as e:
+        print(f"⚠️ Wav2Vec2 模型不可用，统计表使用能量分段对齐（与未加载模型时的线上评分一致）: {e}")
+
+def _process_clip(record: Tuple[str, str]) -> PhonemeStatsAccumulator:
+    """对单条录音做对齐和特征提取，返回该录音的累计结果"""
+    from .audio_decoding import load_audio_file
+    from .音素特征提取 import FrameFeatureCache
+
+    clip_path, sentence = record
+    accumulator = PhonemeStatsAccumulator()
+    scorer = _worker_scorer
+    sr = 16000
+    try:
+        audio = load_audio_file(clip_path, sr)
+        phonemes = scorer.text_to_phonemes(sentence)
+        if len(audio) == 0 or not phonemes:
+            return accumulator
+
+        feature_cache = FrameFeatureCache(audio, sr, scorer.feature_extractor.formant_tracker)
+        model, processor = _worker_model
+        alignments = scorer.force_align_ctc(audio, phonemes, model, processor, sr, feature_cache=feature_cache)
+        for phoneme, start_time, end_time in alignments:
+            segment = audio[int(start_time * sr):int(end_time * sr)]
+            if len(segment) == 0:
+                continue
+            features = scorer.extract_acoustic_features(segment, sr)
+            features.update(feature_cache.formant_stats(start_time, end_time))
+            accumulator.add(phoneme, feature_vector(features, end_time - start_time))
+    except Exception as e:
+        print(f"处理录音失败 {os.path.basename(clip_path)}: {e}")
+    return accumulator
+
+def load_clip_records(tsv_file: str, clips_dir: str, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+    """读取 validated.tsv 中的 path/sentence，只保留本地存在的录音"""
+    from .data_processing import load_sentences_and_paths
+    records = []
+    for record in load_sentences_and_paths(tsv_file):
+        clip_path = os.path.join(clips_dir, str(record['path']))
+        if isinstance(record['sentence'], str) and os.path.exists(clip_path):
+            records.append((clip_path, record['sentence']))
+            if limit and len(records) >= limit:
+                break
+    return records
+
+def build_native_stats(tsv_file: str = DEFAULT_TSV_FILE, clips_dir: str = DEFAULT_CLIPS_DIR,
+                       output_path: str = DEFAULT_STATS_PATH, workers: Optional[int] = None,
+                       limit: Optional[int] = None) -> np.ndarray:
+    """用进程池并行处理录音并写出统计表"""
+    records = load_clip_records(tsv_file, clips_dir, limit)
+    if not records:
+        raise FileNotFoundError(f"在 {clips_dir} 中没有找到 {tsv_file} 引用的录音")
+
+    print(f"开始构建母语者音素统计表: {len(records)} 条录音")
+    start = time.perf_counter()
+    total = PhonemeStatsAccumulator()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        for i, accumulator in enumerate(executor.map(_process_clip, records, chunksize=16), 1):
+            total.merge(accumulator)
+            if i % 500 == 0:
+                print(f"  已处理 {i}/{len(records)} 条录音 ({time.perf_counter() - start:.0f}s)")
+
+    table = total.to_table()
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    np.save(output_path, table)
+    print(f"✅ 统计表已保存: {output_path} ({len(table)} 个音素, {table.nbytes / 1024:.1f}KB, "
+          f"耗时 {time.perf_counter() - start:.0f}s)")
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="构建母语者音素统计表")
+    parser.add_argument('--tsv', default=DEFAULT_TSV_FILE, help='Common Voice validated.tsv')
+    parser.add_argument('--clips-dir', default=DEFAULT_CLIPS_DIR, help='录音所在目录')
+    parser.add_argument('--output', default=DEFAULT_STATS_PATH, help='输出的 .npy 文件')
+    parser.add_argument('--workers', type=int, default=None, help='进程数，默认CPU核数')
+    parser.add_argument('--limit', type=int, default=None, help='最多处理的录音条数')
+    args = parser.parse_args()
+    build_native_stats(args.tsv, args.clips_dir, args.output, args.workers, args.limit)
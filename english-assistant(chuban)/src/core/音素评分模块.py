@@ -1,10 +1,16 @@
 import numpy as np
 import torch
 import librosa
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterator, Any, Union
 import re
 from dataclasses import dataclass
 import traceback
+import time
+from .analysis_profiles import (AnalysisProfile, resolve_analysis_profile, get_scoring_weights,
+                                DEFAULT_SCORING_WEIGHTS, load_phoneme_scoring_config)
+from .音素特征提取 import AcousticFeatureExtractor, FrameFeatureCache, PhonemeAligner
+from .audio_buffer import AudioBuffer, as_audio_buffer
+from .音素统计表 import get_native_phoneme_stats, FEATURE_LABELS
 
 @dataclass
 class PhonemeScore:
@@ -31,9 +37,30 @@ class DetailedPronunciationResult:
 class PhonemeScorer:
     """音素级发音评分器"""
     
-    def __init__(self):
+    def __init__(self, profile: Optional[AnalysisProfile] = None,
+                 scoring_weights: Optional[Dict[str, float]] = None):
         self.phoneme_map = self._load_phoneme_map()
         self.duration_thresholds = self._load_duration_thresholds()
+        # 分析档位决定计算哪些特征族，未指定时按配置文件解析
+        self.profile = profile or resolve_analysis_profile()
+        weights = scoring_weights or get_scoring_weights()
+        # 各类扣分按 配置权重/默认权重 缩放，默认配置下与原评分完全一致
+        self.penalty_scale = {
+            key: weights.get(key, default) / default
+            for key, default in DEFAULT_SCORING_WEIGHTS.items()
+        }
+        self.feature_extractor = AcousticFeatureExtractor(profile=self.profile)
+        
+        # 对齐方法：ctc 模型不可用或推理失败时退回到能量最优分段
+        config = load_phoneme_scoring_config()
+        self.alignment_method = config.get('alignment_method', 'ctc')
+        thresholds = config.get('thresholds', {}) or {}
+        self.aligner = PhonemeAligner(
+            min_phoneme_duration=thresholds.get('min_phoneme_duration', 0.03),
+            max_phoneme_duration=thresholds.get('max_phoneme_duration', 0.4)
+        )
+        # 母语者音素统计表（离线构建，不存在时为 None）
+        self.native_stats = get_native_phoneme_stats()
         
     def _load_phoneme_map(self) -> Dict[str, str]:
         """加载音素映射表（文本到IPA音素）"""
@@ -115,36 +142,42 @@ class PhonemeScorer:
         return phonemes
     
     def extract_acoustic_features(self, audio_data: np.ndarray, sr: int = 16000) -> Dict:
-        """提取声学特征"""
+        """提取声学特征（仅计算当前分析档位开启的特征族）"""
         try:
             features = {}
+            profile = self.profile
             
             # 基频(F0)提取
-            f0 = librosa.yin(audio_data, fmin=80, fmax=400, sr=sr)
-            features['f0'] = f0
-            features['f0_mean'] = np.nanmean(f0[f0 > 0]) if np.any(f0 > 0) else 0
-            features['f0_std'] = np.nanstd(f0[f0 > 0]) if np.any(f0 > 0) else 0
-            
-            # MFCC特征
-            mfcc = librosa.feature.mfcc(y=audio_data, sr=sr, n_mfcc=13)
-            features['mfcc'] = mfcc
-            features['mfcc_mean'] = np.mean(mfcc, axis=1)
-            features['mfcc_std'] = np.std(mfcc, axis=1)
-            
-            # 频谱质心和带宽
-            spectral_centroids = librosa.feature.spectral_centroid(y=audio_data, sr=sr)[0]
-            spectral_bandwidth = librosa.feature.spectral_bandwidth(y=audio_data, sr=sr)[0]
-            features['spectral_centroid_mean'] = np.mean(spectral_centroids)
-            features['spectral_bandwidth_mean'] = np.mean(spectral_bandwidth)
-            
-            # 能量特征
-            rms = librosa.feature.rms(y=audio_data)[0]
-            features['energy_mean'] = np.mean(rms)
-            features['energy_std'] = np.std(rms)
-            
-            # 零交叉率
-            zcr = librosa.feature.zero_crossing_rate(audio_data)[0]
-            features['zcr_mean'] = np.mean(zcr)
+            if profile.f0:
+                f0 = librosa.yin(audio_data, fmin=80, fmax=400, sr=sr)
+                features['f0'] = f0
+                features['f0_mean'] = np.nanmean(f0[f0 > 0]) if np.any(f0 > 0) else 0
+                features['f0_std'] = np.nanstd(f0[f0 > 0]) if np.any(f0 > 0) else 0
+            
+            if profile.spectral:
+                # MFCC特征
+                mfcc = librosa.feature.mfcc(y=audio_data, sr=sr, n_mfcc=13)
+                features['mfcc'] = mfcc
+                features['mfcc_mean'] = np.mean(mfcc, axis=1)
+                features['mfcc_std'] = np.std(mfcc, axis=1)
+                
+                # 频谱质心和带宽
+                spectral_centroids = librosa.feature.spectral_centroid(y=audio_data, sr=sr)[0]
+                spectral_bandwidth = librosa.feature.spectral_bandwidth(y=audio_data, sr=sr)[0]
+                features['spectral_centroid_mean'] = np.mean(spectral_centroids)
+                features['spectral_bandwidth_mean'] = np.mean(spectral_bandwidth)
+            
+            if profile.temporal:
+                # 能量特征
+                rms = librosa.feature.rms(y=audio_data)[0]
+                features['energy_mean'] = np.mean(rms)
+                features['energy_std'] = np.std(rms)
+                
+                # 零交叉率
+                zcr = librosa.feature.zero_crossing_rate(audio_data)[0]
+                features['zcr_mean'] = np.mean(zcr)
+            
+            # 共振峰特征由整段轨迹切片得到，见 iter_pronunciation_analysis
             
             return features
             
@@ -153,15 +186,27 @@ class PhonemeScorer:
             return {}
     
     def force_align_ctc(self, audio_data: np.ndarray, phoneme_sequence: List[str], 
-                       wav2vec2_model, processor, sr: int = 16000) -> List[Tuple[str, float, float]]:
-        """使用Wav2Vec2 CTC进行强制对齐"""
+                       wav2vec2_model, processor, sr: int = 16000,
+                       logits: Optional[torch.Tensor] = None,
+                       feature_cache: Optional[FrameFeatureCache] = None) -> List[Tuple[str, float, float]]:
+        """使用Wav2Vec2 CTC进行强制对齐
+
+        如果调用方已经完成过一次前向计算，可通过 logits 传入，避免重复推理。
+        没有可用模型或配置为 energy 时使用基于能量的最优分段对齐。
+        """
+        if self.alignment_method == 'uniform':
+            return self.aligner.simple_uniform_alignment(len(audio_data), phoneme_sequence, sr)
+        if self.alignment_method == 'energy' or (wav2vec2_model is None and logits is None):
+            return self.aligner.energy_based_alignment(audio_data, phoneme_sequence, sr, feature_cache)
+        
         try:
-            # 预处理音频
-            inputs = processor(audio_data, sampling_rate=sr, return_tensors="pt", padding=True)
-            
-            # 获取CTC输出
-            with torch.no_grad():
-                logits = wav2vec2_model(**inputs).logits
+            if logits is None:
+                # 预处理音频
+                inputs = processor(audio_data, sampling_rate=sr, return_tensors="pt", padding=True)
+                
+                # 获取CTC输出
+                with torch.no_grad():
+                    logits = wav2vec2_model(**inputs).logits
             
             # 获取预测序列
             predicted_ids = torch.argmax(logits, dim=-1)
@@ -185,62 +230,68 @@ class PhonemeScorer:
             return alignments
             
         except Exception as e:
-            print(f"强制对齐失败: {e}")
-            # 返回均匀分割的对齐结果
-            total_duration = len(audio_data) / sr
-            phoneme_count = len(phoneme_sequence)
-            
-            if phoneme_count == 0:
-                return []
-            
-            avg_duration = total_duration / phoneme_count
-            alignments = []
-            
-            for i, phoneme in enumerate(phoneme_sequence):
-                start_time = i * avg_duration
-                end_time = (i + 1) * avg_duration
-                alignments.append((phoneme, start_time, end_time))
-            
-            return alignments
+            print(f"强制对齐失败: {e}，改用能量分段对齐")
+            return self.aligner.energy_based_alignment(audio_data, phoneme_sequence, sr, feature_cache)
     
     def score_phoneme_quality(self, phoneme: str, features: Dict, duration: float) -> Tuple[float, List[str]]:
-        """评估单个音素的发音质量（更加严格的评分标准）"""
+        """评估单个音素的发音质量（更加严格的评分标准）
+
+        扣分分为时长(duration)、质量(quality)、一致性(consistency)三类，
+        分别按 config.yaml 中 scoring_weights 的相对比例缩放。
+        已构建母语者统计表且该音素样本充足时，时长和音质按相对母语者分布的 z 分数扣分，
+        否则使用规则阈值。
+        """
         score = 80.0  # 降低基础分数，使评分更加严格
         issues = []
+        penalties = {'duration': 0.0, 'quality': 0.0, 'consistency': 0.0}
         
+        zscores = self.native_stats.zscores(phoneme, features, duration) if self.native_stats else {}
+        if zscores:
+            self._apply_native_zscores(phoneme, zscores, penalties, issues)
+        else:
+            self._apply_rule_thresholds(phoneme, features, duration, penalties, issues)
+        
+        # 基于MFCC的质量评估（更严格）
+        if 'mfcc_mean' in features and len(features['mfcc_mean']) > 0:
+            mfcc_stability = np.std(features['mfcc_mean'])
+            if mfcc_stability > 30:  # 降低阈值，更严格
+                penalties['consistency'] += 20
+                issues.append(f"音素'{phoneme}'发音不稳定，可能存在紧张或不确定")
+            elif mfcc_stability > 20:
+                penalties['consistency'] += 10
+                issues.append(f"音素'{phoneme}'发音稍显不稳定")
+        
+        for key, penalty in penalties.items():
+            score -= penalty * self.penalty_scale.get(key, 1.0)
+        
+        return max(0, min(100, score)), issues
+    
+    def _apply_rule_thresholds(self, phoneme: str, features: Dict, duration: float,
+                               penalties: Dict[str, float], issues: List[str]):
+        """没有母语者统计时的规则阈值评估"""
         # 更严格的时长评估
         if phoneme in self.duration_thresholds:
             min_dur, max_dur = self.duration_thresholds[phoneme]
             if duration < min_dur * 0.7:  # 更严格的下限
-                score -= 30
+                penalties['duration'] += 30
                 issues.append(f"音素'{phoneme}'发音过短，需要更充分的发声")
             elif duration < min_dur:
-                score -= 20
+                penalties['duration'] += 20
                 issues.append(f"音素'{phoneme}'发音略短")
             elif duration > max_dur * 1.5:  # 更严格的上限
-                score -= 25
+                penalties['duration'] += 25
                 issues.append(f"音素'{phoneme}'发音过长，注意控制节奏")
             elif duration > max_dur:
-                score -= 15
+                penalties['duration'] += 15
                 issues.append(f"音素'{phoneme}'发音略长")
         
-        # 基于MFCC的质量评估（更严格）
-        if 'mfcc_mean' in features and len(features['mfcc_mean']) > 0:
-            mfcc_stability = np.std(features['mfcc_mean'])
-            if mfcc_stability > 30:  # 降低阈值，更严格
-                score -= 20
-                issues.append(f"音素'{phoneme}'发音不稳定，可能存在紧张或不确定")
-            elif mfcc_stability > 20:
-                score -= 10
-                issues.append(f"音素'{phoneme}'发音稍显不稳定")
-        
         # 更严格的能量评估
         if 'energy_mean' in features:
             if features['energy_mean'] < 0.005:  # 提高阈值
-                score -= 25
+                penalties['quality'] += 25
                 issues.append(f"音素'{phoneme}'发音能量不足，需要更加清晰有力的发声")
             elif features['energy_mean'] < 0.01:
-                score -= 15
+                penalties['quality'] += 15
                 issues.append(f"音素'{phoneme}'发音能量较低")
         
         # 更严格的频谱质心评估（用于判断清晰度）
@@ -248,24 +299,41 @@ class PhonemeScorer:
             # 不同音素有不同的频谱特征期望值
             if phoneme in ['s', 'ʃ', 'f', 'θ']:  # 高频摩擦音
                 if features['spectral_centroid_mean'] < 2500:  # 提高标准
-                    score -= 20
+                    penalties['quality'] += 20
                     issues.append(f"高频摩擦音'{phoneme}'高频成分不足，需要更明显的摩擦声")
             elif phoneme in ['æ', 'ɑː', 'ɒ']:  # 低频元音
                 if features['spectral_centroid_mean'] > 1500:  # 提高标准
-                    score -= 15
+                    penalties['quality'] += 15
                     issues.append(f"低频元音'{phoneme}'音色偏高，需要更低的舌位")
             elif phoneme in ['iː', 'ɪ']:  # 高元音
                 if features['spectral_centroid_mean'] < 1000 or features['spectral_centroid_mean'] > 2200:
-                    score -= 15
+                    penalties['quality'] += 15
                     issues.append(f"高元音'{phoneme}'舌位不准确，需要调整口型")
         
         # 新增：更细致的音素类别检查
         phoneme_type = self.classify_phoneme_detailed(phoneme)
         type_issues = self.check_phoneme_type_quality(phoneme, phoneme_type, features, duration)
         issues.extend(type_issues)
-        score -= len(type_issues) * 8  # 每个类型问题扣8分
-        
-        return max(0, min(100, score)), issues
+        penalties['quality'] += len(type_issues) * 8  # 每个类型问题扣8分
+    
+    def _apply_native_zscores(self, phoneme: str, zscores: Dict[str, float],
+                              penalties: Dict[str, float], issues: List[str]):
+        """按母语者分布的 z 分数扣分：|z|>3 为明显偏离，|z|>2 为轻微偏离"""
+        for name, z in zscores.items():
+            if abs(z) <= 2:
+                continue
+            severe = abs(z) > 3
+            if name == 'duration':
+                if z < 0:
+                    penalties['duration'] += 30 if severe else 20
+                    issues.append(f"音素'{phoneme}'发音过短，需要更充分的发声" if severe else f"音素'{phoneme}'发音略短")
+                else:
+                    penalties['duration'] += 25 if severe else 15
+                    issues.append(f"音素'{phoneme}'发音过长，注意控制节奏" if severe else f"音素'{phoneme}'发音略长")
+            else:
+                penalties['quality'] += 15 if severe else 8
+                direction = '偏低' if z < 0 else '偏高'
+                issues.append(f"音素'{phoneme}'{FEATURE_LABELS.get(name, name)}{direction}，与母语者差异较大")
     
     def classify_phoneme_detailed(self, phoneme: str) -> str:
         """更详细的音素分类"""
@@ -363,11 +431,32 @@ class PhonemeScorer:
         else:
             return "poor"
     
-    def analyze_pronunciation_detailed(self, audio_data: np.ndarray, reference_text: str,
-                                     wav2vec2_model, processor, sr: int = 16000) -> DetailedPronunciationResult:
+    def analyze_pronunciation_detailed(self, audio_data: Union[AudioBuffer, np.ndarray], reference_text: str,
+                                     wav2vec2_model, processor, sr: int = 16000,
+                                     logits: Optional[torch.Tensor] = None) -> DetailedPronunciationResult:
         """执行详细的发音分析"""
+        result = None
+        for event, payload in self.iter_pronunciation_analysis(
+                audio_data, reference_text, wav2vec2_model, processor, sr, logits):
+            if event == 'result':
+                result = payload
+        return result
+    
+    def iter_pronunciation_analysis(self, audio_data: Union[AudioBuffer, np.ndarray], reference_text: str,
+                                    wav2vec2_model, processor, sr: int = 16000,
+                                    logits: Optional[torch.Tensor] = None) -> Iterator[Tuple[str, Any]]:
+        """逐步执行详细的发音分析，每完成一部分就产出一次结果
+
+        音频以 AudioBuffer 传入时直接使用其只读样本和已计算的逐帧特征，不做拷贝。
+
+        Yields:
+            ('phoneme', PhonemeScore): 每个音素评分完成时
+            ('words', List[Dict]): 单词级评分完成时
+            ('result', DetailedPronunciationResult): 分析结束时（总是最后一个）
+        """
+        analysis_start = time.perf_counter()
         try:
-            print(f"开始音素级发音分析: '{reference_text}'")
+            print(f"开始音素级发音分析: '{reference_text}' (分析档位: {self.profile.name})")
             
             # 1. 文本转音素
             phoneme_sequence = self.text_to_phonemes(reference_text)
@@ -378,12 +467,23 @@ class PhonemeScorer:
             word_phoneme_mapping = self.map_words_to_phonemes(words)
             print(f"单词音素映射: {word_phoneme_mapping}")
             
+            # 对齐和各音素特征共享音频缓冲区上的同一份逐帧特征缓存
+            audio_buffer = as_audio_buffer(audio_data, sr)
+            audio_data = audio_buffer.samples
+            feature_cache = audio_buffer.feature_cache(self.feature_extractor.formant_tracker)
+            
             # 3. 强制对齐
-            alignments = self.force_align_ctc(audio_data, phoneme_sequence, wav2vec2_model, processor, sr)
+            alignments = self.force_align_ctc(audio_data, phoneme_sequence, wav2vec2_model, processor, sr,
+                                              logits, feature_cache)
             print(f"对齐结果数量: {len(alignments)}")
             
-            # 4. 提取整体声学特征
-            global_features = self.extract_acoustic_features(audio_data, sr)
+            # 4. 提取整体声学特征（全局只用于语调分析，因此只需要基频）
+            global_features = {}
+            if self.profile.f0:
+                f0 = feature_cache.f0()
+                voiced = f0[f0 > 0]
+                global_features['f0_mean'] = np.nanmean(voiced) if len(voiced) > 0 else 0
+                global_features['f0_std'] = np.nanstd(voiced) if len(voiced) > 0 else 0
             
             # 5. 音素级评分
             phoneme_scores = []
@@ -399,6 +499,9 @@ class PhonemeScorer:
                 if len(phoneme_audio) > 0:
                     # 提取音素级特征
                     phoneme_features = self.extract_acoustic_features(phoneme_audio, sr)
+                    if self.profile.formants:
+                        # 整段音频只做一次逐帧共振峰跟踪，各音素按时间区间切片
+                        phoneme_features.update(feature_cache.formant_stats(start_time, end_time))
                     
                     # 评分
                     duration = end_time - start_time
@@ -419,9 +522,11 @@ class PhonemeScorer:
                     
                     phoneme_scores.append(phoneme_score)
                     all_issues.extend(issues)
+                    yield 'phoneme', phoneme_score
             
             # 6. 单词级评分和分析
             word_scores = self.analyze_word_pronunciation(words, word_phoneme_mapping, phoneme_scores)
+            yield 'words', word_scores
             
             # 7. 计算总分（更加严格的评分标准）
             if phoneme_scores:
@@ -478,10 +583,17 @@ class PhonemeScorer:
                 overall_score = 0
             
             # 8. 分析语调和时长
+            analysis_time_ms = (time.perf_counter() - analysis_start) * 1000
+            if analysis_time_ms > self.profile.latency_budget_ms:
+                print(f"⚠️ 音素级分析耗时 {analysis_time_ms:.0f}ms，超出'{self.profile.name}'档位预算 {self.profile.latency_budget_ms}ms")
+            
             duration_analysis = {
                 'total_duration': len(audio_data) / sr,
                 'speech_rate': len(phoneme_sequence) / (len(audio_data) / sr) if len(audio_data) > 0 else 0,
-                'avg_phoneme_duration': np.mean([ps.end_time - ps.start_time for ps in phoneme_scores]) if phoneme_scores else 0
+                'avg_phoneme_duration': np.mean([ps.end_time - ps.start_time for ps in phoneme_scores]) if phoneme_scores else 0,
+                'analysis_profile': self.profile.name,
+                'analysis_time_ms': round(analysis_time_ms, 1),
+                'latency_budget_ms': self.profile.latency_budget_ms
             }
             
             pitch_analysis = {}
@@ -508,14 +620,14 @@ class PhonemeScorer:
             )
             
             print(f"音素级分析完成，总分: {overall_score:.1f}")
-            return result
+            yield 'result', result
             
         except Exception as e:
             print(f"音素级分析失败: {e}")
             traceback.print_exc()
             
             # 返回默认结果
-            return DetailedPronunciationResult(
+            yield 'result', DetailedPronunciationResult(
                 overall_score=0,
                 phoneme_scores=[],
                 word_scores=[],
@@ -0,0 +1,58 @@
+// AudioWorklet：把麦克风输入下混为单声道并降采样到 16kHz，每 100ms 向主线程发送一块 Float32 PCM
+class PcmCaptureProcessor extends AudioWorkletProcessor {
+    constructor(options) {
+        super();
+        const targetRate = (options.processorOptions && options.processorOptions.targetRate) || 16000;
+        // sampleRate 为 AudioContext 的实际采样率（通常是 44100 或 48000）
+        this.ratio = sampleRate / targetRate;
+        this.position = 0;
+        this.sum = 0;
+        this.count = 0;
+        this.chunkSize = Math.round(targetRate / 10);
+        this.chunk = new Float32Array(this.chunkSize);
+        this.filled = 0;
+
+        this.port.onmessage = (event) => {
+            if (event.data === 'flush') {
+                if (this.filled > 0) {
+                    this.port.postMessage(this.chunk.slice(0, this.filled));
+                    this.filled = 0;
+                }
+                this.port.postMessage('flushed');
+            }
+        };
+    }
+
+    process(inputs, outputs) {
+        const input = inputs[0];
+        if (!input || input.length === 0) {
+            return true;
+        }
+        const channels = input.length;
+        const frames = input[0].length;
+        for (let i = 0; i < frames; i++) {
+            let sample = 0;
+            for (let c = 0; c < channels; c++) {
+                sample += input[c][i];
+            }
+            // 对每个输出采样点覆盖的输入区间取平均，兼作抗混叠低通
+            this.sum += sample / channels;
+            this.count++;
+            this.position += 1;
+            if (this.position >= this.ratio) {
+                this.position -= this.ratio;
+                this.chunk[this.filled++] = this.sum / this.count;
+                this.sum = 0;
+                this.count = 0;
+                if (this.filled === this.chunkSize) {
+                    this.port.postMessage(this.chunk);
+                    this.chunk = new Float32Array(this.chunkSize);
+                    this.filled = 0;
+                }
+            }
+        }
+        return true;
+    }
+}
+
+registerProcessor('pcm-capture', PcmCaptureProcessor);
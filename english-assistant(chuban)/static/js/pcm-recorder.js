@@ -0,0 +1,174 @@
+// 浏览器端 16kHz PCM 录音
+// 通过 AudioWorklet 采集并降采样到 16kHz 单声道，去除首尾静音后编码为 16 位 WAV 上传，
+// 服务端直接解释 PCM 数据，不需要解码和重采样。
+// 接口与 MediaRecorder 一致（start / stop / state / ondataavailable / onstop），
+// 浏览器不支持 AudioWorklet 时 createAudioRecorder 退回到低码率 Opus 的 MediaRecorder。
+(function (global) {
+    const TARGET_RATE = 16000;
+    const WORKLET_URL = '/static/js/pcm-capture-worklet.js';
+
+    // 去除首尾静音：20ms 帧 RMS 高于噪声底的 4 倍视为语音，前后各保留 150ms
+    function trimSilence(samples, sampleRate) {
+        const frame = Math.round(sampleRate * 0.02);
+        const frameCount = Math.floor(samples.length / frame);
+        if (frameCount < 5) {
+            return samples;
+        }
+        const rms = new Float32Array(frameCount);
+        for (let f = 0; f < frameCount; f++) {
+            let energy = 0;
+            for (let i = f * frame; i < (f + 1) * frame; i++) {
+                energy += samples[i] * samples[i];
+            }
+            rms[f] = Math.sqrt(energy / frame);
+        }
+        const sorted = Array.from(rms).sort((a, b) => a - b);
+        const noiseFloor = sorted[Math.floor(frameCount * 0.1)];
+        const threshold = Math.max(0.005, noiseFloor * 4);
+
+        let first = 0;
+        while (first < frameCount && rms[first] < threshold) first++;
+        let last = frameCount - 1;
+        while (last > first && rms[last] < threshold) last--;
+        if (first >= frameCount) {
+            // 全程没有检测到语音，原样上传，由服务端给出提示
+            return samples;
+        }
+        const pad = Math.round(sampleRate * 0.15);
+        const start = Math.max(0, first * frame - pad);
+        const end = Math.min(samples.length, (last + 1) * frame + pad);
+        return samples.subarray(start, end);
+    }
+
+    function encodeWav(samples, sampleRate) {
+        const buffer = new ArrayBuffer(44 + samples.length * 2);
+        const view = new DataView(buffer);
+        const writeString = (offset, text) => {
+            for (let i = 0; i < text.length; i++) view.setUint8(offset + i, text.charCodeAt(i));
+        };
+        writeString(0, 'RIFF');
+        view.setUint32(4, 36 + samples.length * 2, true);
+        writeString(8, 'WAVE');
+        writeString(12, 'fmt ');
+        view.setUint32(16, 16, true);
+        view.setUint16(20, 1, true);               // PCM
+        view.setUint16(22, 1, true);               // 单声道
+        view.setUint32(24, sampleRate, true);
+        view.setUint32(28, sampleRate * 2, true);  // 字节率
+        view.setUint16(32, 2, true);               // 块对齐
+        view.setUint16(34, 16, true);              // 位深
+        writeString(36, 'data');
+        view.setUint32(40, samples.length * 2, true);
+        let offset = 44;
+        for (let i = 0; i < samples.length; i++, offset += 2) {
+            const s = Math.max(-1, Math.min(1, samples[i]));
+            view.setInt16(offset, s < 0 ? s * 0x8000 : s * 0x7FFF, true);
+        }
+        return new Blob([buffer], { type: 'audio/wav' });
+    }
+
+    class PcmRecorder {
+        constructor(stream, options = {}) {
+            this.stream = stream;
+            this.targetRate = options.targetRate || TARGET_RATE;
+            this.trim = options.trimSilence !== false;
+            this.mimeType = 'audio/wav';
+            this.state = 'inactive';
+            this.ondataavailable = null;
+            this.onstop = null;
+            this.onchunk = null;  // 每 100ms 的 Float32 PCM 块（实时评分使用）
+            this._chunks = [];
+            this._starting = null;
+        }
+
+        static isSupported() {
+            return !!(global.AudioContext && global.AudioWorkletNode);
+        }
+
+        start() {
+            // 与 MediaRecorder 一样同步切换状态，采集链路异步建立
+            this.state = 'recording';
+            this._chunks = [];
+            this._starting = this._connect();
+            return this._starting;
+        }
+
+        async _connect() {
+            this._context = new AudioContext();
+            await this._context.audioWorklet.addModule(WORKLET_URL);
+            this._source = this._context.createMediaStreamSource(this.stream);
+            this._node = new AudioWorkletNode(this._context, 'pcm-capture', {
+                processorOptions: { targetRate: this.targetRate }
+            });
+            this._node.port.onmessage = (event) => {
+                if (event.data === 'flushed') {
+                    this._finish();
+                } else {
+                    this._chunks.push(event.data);
+                    if (this.onchunk) this.onchunk(event.data);
+                }
+            };
+            // 经静音增益节点连到输出端，保证所有浏览器都持续驱动处理器
+            this._mute = this._context.createGain();
+            this._mute.gain.value = 0;
+            this._source.connect(this._node);
+            this._node.connect(this._mute);
+            this._mute.connect(this._context.destination);
+        }
+
+        async stop() {
+            if (this.state === 'inactive') return;
+            this.state = 'inactive';
+            try {
+                await this._starting;
+                this._node.port.postMessage('flush');
+            } catch (error) {
+                console.error('PCM采集启动失败:', error);
+                this._finish();
+            }
+        }
+
+        _finish() {
+            if (this._source) this._source.disconnect();
+            if (this._node) this._node.disconnect();
+            if (this._context) this._context.close();
+
+            const length = this._chunks.reduce((sum, chunk) => sum + chunk.length, 0);
+            let samples = new Float32Array(length);
+            let offset = 0;
+            for (const chunk of this._chunks) {
+                samples.set(chunk, offset);
+                offset += chunk.length;
+            }
+            this._chunks = [];
+            if (this.trim) {
+                samples = trimSilence(samples, this.targetRate);
+            }
+            const blob = encodeWav(samples, this.targetRate);
+            if (this.ondataavailable) this.ondataavailable({ data: blob });
+            if (this.onstop) this.onstop();
+        }
+    }
+
+    // 优先使用 16kHz PCM 录音；不支持时使用低码率 Opus
+    function createAudioRecorder(stream) {
+        if (PcmRecorder.isSupported()) {
+            return new PcmRecorder(stream);
+        }
+        const opus = ['audio/webm;codecs=opus', 'audio/ogg;codecs=opus']
+            .find(type => global.MediaRecorder && MediaRecorder.isTypeSupported(type));
+        return opus ? new MediaRecorder(stream, { mimeType: opus, audioBitsPerSecond: 24000 })
+                    : new MediaRecorder(stream);
+    }
+
+    // 根据录音的 MIME 类型给上传文件取扩展名
+    function recordingFileName(baseName, mimeType) {
+        const type = (mimeType || '').split(';')[0];
+        const extension = { 'audio/wav': 'wav', 'audio/ogg': 'ogg', 'audio/mp4': 'm4a' }[type] || 'webm';
+        return `${baseName}.${extension}`;
+    }
+
+    global.PcmRecorder = PcmRecorder;
+    global.createAudioRecorder = createAudioRecorder;
+    global.recordingFileName = recordingFileName;
+})(window);
@@ -0,0 +1,36 @@
+import pytest
+
+from src.core.asr_router import DEFAULT_ENGINES, DEFAULT_PURPOSES, ASRRouter
+
+
+def make_router(available, disabled=None):
+    router = ASRRouter(dict(DEFAULT_ENGINES), {name: dict(policy) for name, policy in DEFAULT_PURPOSES.items()},
+                       disabled=disabled)
+    router._available = [name for name in available if name not in router.disabled]
+    return router
+
+
+def test_cheapest_engine_within_budget():
+    router = make_router(['ctc', 'whisper-int8', 'whisper'])
+    assert router.choose(5)['engine'] == 'whisper-int8'
+    assert router.choose(5, 'draft')['engine'] == 'ctc'
+
+
+def test_over_budget_fallback_respects_min_tier():
+    # 预算内没有满足 min_tier 的引擎时，不能退到更快的 ctc
+    router = make_router(['ctc', 'whisper-int8', 'whisper'])
+    choice = router.choose(30, needs_formatting=False, latency_budget_ms=100)
+    assert choice['reason'] == 'over_budget_fastest'
+    assert choice['engine'] == 'whisper-int8'
+
+
+def test_no_engine_meets_min_tier():
+    router = make_router(['ctc'])
+    with pytest.raises(RuntimeError):
+        router.choose(5, needs_formatting=False)
+
+
+def test_whisper_backends_follow_enabled_engines():
+    router = make_router(['ctc', 'whisper-int8', 'whisper'], disabled=['whisper-int8'])
+    assert router.whisper_backends() == ['openai-whisper']
+    assert router.choose(5)['engine'] == 'whisper'
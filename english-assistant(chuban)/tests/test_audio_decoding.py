@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""内存音频解码测试"""
+
+import struct
+
+import numpy as np
+import pytest
+
+from src.core.audio_buffer import AudioBuffer
+from src.core.audio_decoding import _decode_wav_pcm, decode_audio_bytes, decode_upload, parse_wav_header
+
+
+def make_wav(samples: np.ndarray, sr: int = 16000, channels: int = 1, format_tag: int = 3,
+             bits: int = 32) -> bytes:
+    """按给定的文件头字段拼出 WAV 字节（字段可以故意写错）"""
+    if format_tag == 1:
+        data = (np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes()
+    else:
+        data = samples.astype('<f4').tobytes()
+    block_align = max(channels * bits // 8, 1)
+    fmt = struct.pack('<HHIIHH', format_tag, channels, sr, sr * block_align, block_align, bits)
+    body = b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt + b'data' + struct.pack('<I', len(data)) + data
+    return b'RIFF' + struct.pack('<I', len(body)) + body
+
+
+def tone(seconds: float = 0.5, sr: int = 16000) -> np.ndarray:
+    t = np.arange(int(seconds * sr)) / sr
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def test_float_wav_fast_path():
+    audio = decode_audio_bytes(make_wav(tone()))
+    assert audio.dtype == np.float32
+    np.testing.assert_allclose(audio, tone(), atol=1e-6)
+
+
+def test_pcm16_wav_fast_path():
+    audio = decode_audio_bytes(make_wav(tone(), format_tag=1, bits=16))
+    np.testing.assert_allclose(audio, tone(), atol=1e-4)
+
+
+@pytest.mark.parametrize('channels, bits', [(0, 32), (1, 0), (1, 4), (2, 12)])
+def test_malformed_wav_header_raises_value_error(channels, bits):
+    data = make_wav(tone(), channels=channels, bits=bits)
+    header = parse_wav_header(data)
+    assert (header['channels'], header['bits']) == (channels, bits)
+    with pytest.raises(ValueError):
+        _decode_wav_pcm(data, header)
+
+
+@pytest.mark.parametrize('format_tag, bits', [(3, 32), (1, 16)])
+def test_zero_channel_wav_is_rejected_not_crashing(format_tag, bits):
+    with pytest.raises(ValueError):
+        decode_audio_bytes(make_wav(tone(), channels=0, format_tag=format_tag, bits=bits))
+
+
+class _Upload:
+    """最小的上传文件对象：decode_upload 只用到 stream / filename / mimetype"""
+
+    def __init__(self, data: bytes, filename: str = 'recording.wav', mimetype: str = 'audio/wav'):
+        import io
+        self.stream = io.BytesIO(data)
+        self.filename = filename
+        self.mimetype = mimetype
+        self.mimetype_params = {}
+
+
+@pytest.mark.parametrize('params', [{'rate': '0'}, {'channels': '0'}, {'rate': '-16000'}, {'rate': 'abc'}])
+def test_raw_pcm_invalid_params_rejected(params):
+    upload = _Upload((tone() * 32767).astype('<i2').tobytes(), 'recording.pcm', 'audio/l16')
+    upload.mimetype_params = params
+    with pytest.raises(ValueError):
+        decode_upload(upload)
+
+
+def test_raw_pcm_upload():
+    upload = _Upload((tone() * 32767).astype('<i2').tobytes(), 'recording.pcm', 'audio/l16')
+    upload.mimetype_params = {'rate': '16000', 'channels': '1'}
+    audio, _ = decode_upload(upload)
+    assert len(audio) == len(tone())
+
+
+def test_float_wav_decodes_to_writable_array():
+    audio = decode_audio_bytes(make_wav(tone()))
+    assert audio.flags.writeable
+
+
+def test_float_wav_upload_normalizes():
+    """与 load_uploaded_audio 相同的流程：解码上传 → AudioBuffer.from_decoded(normalize=True)"""
+    audio_data, _ = decode_upload(_Upload(make_wav(tone())))
+    buffer = AudioBuffer.from_decoded(audio_data, normalize=True)
+    assert buffer.normalized
+    assert np.max(np.abs(buffer.samples)) == pytest.approx(1.0)
+
+
+def test_from_decoded_copies_read_only_input():
+    samples = np.frombuffer(tone().tobytes(), dtype=np.float32)
+    assert not samples.flags.writeable
+    buffer = AudioBuffer.from_decoded(samples, normalize=True)
+    assert buffer.normalized and np.max(np.abs(buffer.samples)) > np.max(np.abs(samples))
+
+
+def test_load_uploaded_audio_float_wav():
+    pytest.importorskip('sounddevice')
+    pytest.importorskip('whisper')
+    import app
+    buffer = app.load_uploaded_audio(_Upload(make_wav(tone())), normalize=True)
+    assert buffer.normalized and len(buffer) == len(tone())
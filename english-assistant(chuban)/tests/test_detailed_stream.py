@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""流式音素级评分接口测试：评分函数用固定事件代替（需要完整的应用依赖）"""
+
+import io
+
+import pytest
+
+from test_audio_decoding import make_wav, tone
+
+
+def test_stream_falls_back_to_simple_result(monkeypatch):
+    pytest.importorskip('sounddevice')
+    pytest.importorskip('whisper')
+    import app
+
+    def failing_stream(audio, reference_text, profile):
+        yield 'overall', {'overall_score': 72.5, 'transcription': 'hello world', 'provisional': True}
+        raise RuntimeError('phoneme analysis failed')
+
+    monkeypatch.setattr(app, 'score_pronunciation_detailed_stream', failing_stream)
+    monkeypatch.setattr(app.model_preloader, 'wait', lambda *args, **kwargs: None)
+    response = app.app.test_client().post('/api/score-pronunciation-detailed-stream', data={
+        'reference_text': 'hello world', 'audio_file': (io.BytesIO(make_wav(tone())), 'a.wav', 'audio/wav')})
+    body = response.get_data(as_text=True)
+    assert 'event: result' in body and '"overall_score": "72.5"' in body
+    assert 'event: error' not in body
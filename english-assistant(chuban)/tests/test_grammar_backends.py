@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""分级语法检查测试：远程后端用固定结果代替"""
+
+from src.core.grammar_backends import TieredGrammarChecker
+from src.core.grammar_client import GrammarBackend, GrammarMatch
+from src.core.本地语法规则 import LocalRuleBackend
+
+
+class FakeRemote(GrammarBackend):
+    name = 'languagetool'
+
+    def __init__(self):
+        self.requests = []
+
+    def check(self, text):
+        self.requests.append(text)
+        return [GrammarMatch('MORFOLOGIK_RULE_EN_US', 'Possible spelling mistake.', 0, 1, ['X'])]
+
+
+def test_high_confidence_local_errors_skip_remote():
+    remote = FakeRemote()
+    checker = TieredGrammarChecker(LocalRuleBackend(), remote)
+    result = checker.check("I have a apple.")
+    assert result['backend'] == 'local'
+    assert remote.requests == []
+
+
+def test_low_confidence_local_errors_go_to_remote():
+    remote = FakeRemote()
+    checker = TieredGrammarChecker(LocalRuleBackend(), remote)
+    result = checker.check("He go to school.")
+    assert result['backend'] == 'languagetool'
+    assert remote.requests == ["He go to school."]
+
+
+def test_stop_on_local_errors_disabled():
+    remote = FakeRemote()
+    checker = TieredGrammarChecker(LocalRuleBackend(), remote, stop_on_local_errors=False)
+    assert checker.check("I have a apple.")['backend'] == 'languagetool'
+
+
+def test_cache_hits_counted_separately():
+    from src.core.grammar_cache import GrammarCache
+    remote = FakeRemote()
+    checker = TieredGrammarChecker(LocalRuleBackend(), remote, cache=GrammarCache(None, 'test'))
+    checker.check_many(["Thank you very much.", "Thank you very much."])
+    checker.check("Thank you very much.")
+    metrics = checker.metrics()
+    assert remote.requests == ["Thank you very much."]
+    assert metrics['remote_answers'] == 2
+    assert metrics['cache_answers'] == 1
+    assert metrics['checks'] == 3
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""LanguageTool 客户端测试：用固定的 LanguageTool 返回 JSON 离线运行，不请求网络"""
+
+import copy
+
+import pytest
+
+from src.core.grammar_client import (BATCH_SEPARATOR, GrammarMatch, LanguageToolClient, apply_corrections,
+                                     pack_texts, split_packed_matches)
+
+
+def lt_match(offset: int, length: int, replacements, rule_id: str = 'TEST_RULE') -> dict:
+    """LanguageTool /v2/check 返回的一条 match（offset/length 以 UTF-16 码元计）"""
+    return {'message': 'test', 'shortMessage': '', 'offset': offset, 'length': length,
+            'replacements': [{'value': r} for r in replacements],
+            'context': {'text': '', 'offset': 0, 'length': length}, 'sentence': '',
+            'rule': {'id': rule_id, 'description': '', 'issueType': 'grammar',
+                     'category': {'id': 'GRAMMAR', 'name': 'Grammar'}}}
+
+
+class CannedResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return copy.deepcopy(self.payload)
+
+
+class CannedSession:
+    """代替 requests.Session：每次 POST 都返回同一份 matches，并记录请求的文本"""
+
+    def __init__(self, matches):
+        self.matches = matches
+        self.texts = []
+
+    def post(self, url, data=None, timeout=None):
+        self.texts.append(data['text'])
+        return CannedResponse({'matches': self.matches})
+
+    def close(self):
+        pass
+
+
+def canned_client(matches, **kwargs) -> LanguageToolClient:
+    client = LanguageToolClient('http://languagetool.invalid', health_check_interval=0, **kwargs)
+    client._session = CannedSession(matches)
+    return client
+
+
+def our_correct(text: str, matches) -> str:
+    return apply_corrections(text, canned_client(matches).check(text))
+
+
+@pytest.fixture
+def lt_correct():
+    """language_tool_python 自带的 correct，作为对照"""
+    pytest.importorskip('language_tool_python')
+    from language_tool_python.match import Match
+    from language_tool_python.utils import correct
+
+    def run(text, matches):
+        return correct(text, [Match(copy.deepcopy(m), text) for m in matches])
+    return run
+
+
+PARITY_CASES = [
+    # 多处问题，只应用第一个替换建议
+    ("i has a apple", [lt_match(0, 1, ['I']), lt_match(2, 3, ['have', 'had']), lt_match(6, 1, ['an'])],
+     "I have an apple"),
+    # 空替换（删除重复的词）
+    ("He go to to school", [lt_match(3, 2, ['goes']), lt_match(6, 3, [''])], "He goes to school"),
+    # 没有替换建议的问题保持原文
+    ("hello  world", [lt_match(0, 5, []), lt_match(5, 2, [' '])], "hello world"),
+    # 重叠的问题：第二处的原文已被改写，两边都跳过
+    ("She dont like it", [lt_match(4, 4, ["doesn't"]), lt_match(4, 9, ["does not like"])],
+     "She doesn't like it"),
+    # BMP 以外的字符在问题之前：LanguageTool 的 offset 按 UTF-16 计，每个 emoji 占两个码元
+    ("Nice 😀 day , ok", [lt_match(0, 4, ['Good']), lt_match(11, 2, [','])], "Good 😀 day, ok"),
+    ("😀😀 i go 😀", [lt_match(5, 1, ['I']), lt_match(7, 2, ['went'])], "😀😀 I went 😀"),
+]
+
+
+@pytest.mark.parametrize('text, matches, expected', PARITY_CASES)
+def test_apply_corrections_matches_language_tool(lt_correct, text, matches, expected):
+    assert our_correct(text, matches) == expected
+    assert lt_correct(text, matches) == expected
+
+
+def test_overlapping_match_skipped_even_if_text_still_matches():
+    # language_tool_python 的 correct 按原文比较判断是否重叠：替换后同一位置碰巧还是原来的词时
+    # 会再应用一次（得到 "He goes  school"）；apply_corrections 按 offset 判断重叠，总是跳过
+    text = "He go to to school"
+    matches = [lt_match(3, 2, ['goes']), lt_match(6, 5, ['to']), lt_match(9, 2, [''])]
+    assert our_correct(text, matches) == "He goes to school"
+
+
+def test_non_bmp_character_inside_match():
+    # 问题本身包含 emoji 时 length 也要换算（language_tool_python 只换算 offset）
+    text = "x 😀y z"
+    assert our_correct(text, [lt_match(2, 3, ['q'])]) == "x q z"
+
+
+# ---- 批量检查的拼接与拆分 ----
+
+def grammar_match(offset: int, length: int) -> GrammarMatch:
+    return GrammarMatch('TEST_RULE', 'test', offset, length, ['x'])
+
+
+def test_pack_texts_splits_at_max_chars():
+    texts = ["a" * 10, "b" * 10, "c" * 10, "d" * 30]
+    # 10 + 2 + 10 = 22 ≤ 24；再加一句就超出；长度 ≥ max_chars 的文本单独一批
+    assert sorted(pack_texts(texts, 24)) == [[0, 1], [2], [3]]
+    for pack in pack_texts(texts, 24):
+        assert len(pack) == 1 or len(BATCH_SEPARATOR.join(texts[i] for i in pack)) <= 24
+
+
+def test_pack_texts_keeps_texts_with_separator_alone():
+    texts = ["One.", "First line.\n\nSecond line.", "Two.", "Three. Four."]
+    packs = pack_texts(texts, 4000)
+    assert sorted(packs) == [[0, 2], [1], [3]]
+
+
+def test_split_packed_matches_relative_offsets():
+    texts = ["i go.", "He go home."]
+    joined = BATCH_SEPARATOR.join(texts)
+    start = len(texts[0]) + len(BATCH_SEPARATOR)
+    results = split_packed_matches(texts, [grammar_match(0, 1), grammar_match(start + 3, 2)])
+    assert [(m.offset, m.length) for m in results[0]] == [(0, 1)]
+    assert [(m.offset, m.length) for m in results[1]] == [(3, 2)]
+    assert joined[start + 3:start + 5] == texts[1][3:5] == "go"
+    assert results[1][0].context == texts[1]
+
+
+def test_split_packed_matches_drops_match_spanning_separator():
+    texts = ["Good morning.", "Nice day."]
+    # 从第一句末尾跨过分隔符到第二句开头
+    spanning = grammar_match(len(texts[0]) - 1, 4)
+    inside_separator = grammar_match(len(texts[0]), len(BATCH_SEPARATOR))
+    assert split_packed_matches(texts, [spanning, inside_separator]) == [[], []]
+
+
+def test_check_many_non_bmp_offsets():
+    # LanguageTool 对拼接后的整段文本按 UTF-16 计 offset：第二句的 "go" 前有两个 emoji（各占两个码元）
+    texts = ["I like 😀.", "😀 he go home."]
+    joined = BATCH_SEPARATOR.join(texts)
+    utf16_offset = len(joined.encode('utf-16-le')) // 2 - len(" home.") - 2
+    client = canned_client([lt_match(utf16_offset, 2, ['goes'])])
+    results = client.check_many(texts)
+    assert client._session.texts == [joined]
+    assert results[0] == []
+    assert [(m.offset, m.length) for m in results[1]] == [(texts[1].index("go"), 2)]
+    assert apply_corrections(texts[1], results[1]) == "😀 he goes home."
+    client.stop()
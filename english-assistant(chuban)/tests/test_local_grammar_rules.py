@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""本地语法规则测试"""
+
+import pytest
+
+from src.core.本地语法规则 import LocalRuleBackend
+
+
+def article_fixes(text: str):
+    return [(text[m.offset:m.offset + m.length], m.replacements[0])
+            for m in LocalRuleBackend().check(text) if m.rule_id == 'EN_A_VS_AN']
+
+
+@pytest.mark.parametrize('text', [
+    "I bought an X-ray machine.",
+    "She is a Ukrainian student.",
+    "He has a utensil.",
+    "It was an honest mistake.",
+    "We waited an hour.",
+    "This is a university, not a hotel.",
+    "She has an umbrella.",
+    "It was a one-time offer.",
+    "He is an 8-year-old boy.",
+    "It took an 11-hour flight.",
+    "The letter a is a vowel.",
+    "He works for an FBI office.",
+    "It is an F-16.",
+    # 读音不确定，不判断
+    "It is an historic day.",
+    "It is a historic day.",
+    "He has a utopian view.",
+])
+def test_articles_without_false_positives(text):
+    assert article_fixes(text) == []
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("I have a apple.", [('a', 'an')]),
+    ("This is an university.", [('an', 'a')]),
+    ("It is a honest mistake.", [('a', 'an')]),
+    ("He lives in an house.", [('an', 'a')]),
+    ("A orange and a egg.", [('A', 'An'), ('a', 'an')]),
+    ("It was a unusual day.", [('a', 'an')]),
+    ("He took a X-ray.", [('a', 'an')]),
+    ("Make an U-turn.", [('an', 'a')]),
+    ("He is a 8-year-old boy.", [('a', 'an')]),
+    ("It is a 18 km walk.", [('a', 'an')]),
+])
+def test_articles_flagged(text, expected):
+    assert article_fixes(text) == expected
+
+
+AGREEMENT_RULES = ('PERS_PRONOUN_AGREEMENT', 'AI_HYDRA_LEO_CPT_ARE_IS', 'HE_VERB_AGR')
+
+
+def agreement_fixes(text: str):
+    return [(text[m.offset:m.offset + m.length], m.replacements[0])
+            for m in LocalRuleBackend().check(text) if m.rule_id in AGREEMENT_RULES]
+
+
+@pytest.mark.parametrize('text', [
+    # 并列主语和介词/of 之后的宾语
+    "My sister and I are students.",
+    "You and I are friends.",
+    "He and she are friends.",
+    "Each of you is responsible.",
+    "The person next to you is my friend.",
+    "The trees around it are tall.",
+    "Tom and he go home together.",
+    "What time does he go home?",
+])
+def test_agreement_without_false_positives(text):
+    assert agreement_fixes(text) == []
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("I is happy.", [('is', 'am')]),
+    ("They is my friends.", [('is', 'are')]),
+    ("It are fine.", [('are', 'is')]),
+    ("She go to school every day.", [('go', 'goes')]),
+    ("Yesterday I are late.", [('are', 'am')]),
+])
+def test_agreement_flagged(text, expected):
+    assert agreement_fixes(text) == expected
+
+
+def test_conclusive_only_for_high_confidence_rules():
+    backend = LocalRuleBackend()
+    assert not backend.is_conclusive([])
+    assert backend.is_conclusive(backend.check("I have a apple."))
+    # 主谓一致是启发式规则，需要 LanguageTool 复核
+    assert not backend.is_conclusive(backend.check("He go to school."))
+    assert not backend.is_conclusive(backend.check("I is happy."))
+    assert not backend.is_conclusive(backend.check("It are fine."))
+    assert LocalRuleBackend(high_confidence_rules=['HE_VERB_AGR']).is_conclusive(backend.check("He go to school."))
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""母语者音素统计表测试"""
+
+import numpy as np
+
+from src.core.音素统计表 import STAT_FEATURES, NativePhonemeStats, PhonemeStatsAccumulator, feature_vector
+
+
+def test_feature_counts_exclude_missing_values():
+    accumulator = PhonemeStatsAccumulator()
+    for i in range(40):
+        # 只有一半的段提取到了基频，共振峰都缺失
+        features = {'energy_mean': 0.1 + 0.01 * i, 'f0_mean': 120.0 + i if i % 2 else 0, 'f1': np.nan}
+        accumulator.add('æ', feature_vector(features, 0.1))
+    table = accumulator.to_table()
+    assert table['count'][0] == 40
+    assert table['count_energy_mean'][0] == 40
+    assert table['count_f0_mean'][0] == 20
+    assert table['count_f1'][0] == 0
+    assert table['mean_f0_mean'][0] == np.mean([120.0 + i for i in range(1, 40, 2)])
+
+    stats = NativePhonemeStats(table, min_count=30)
+    zscores = stats.zscores('æ', {'energy_mean': 0.3, 'f0_mean': 150.0}, 0.1)
+    # 基频只有 20 个有效样本，低于 min_count，不返回
+    assert 'energy_mean' in zscores and 'f0_mean' not in zscores
+
+
+def test_old_tables_without_feature_counts():
+    dtype = np.dtype([('phoneme', 'U4'), ('count', 'i4')]
+                     + [(f'mean_{name}', 'f4') for name in STAT_FEATURES]
+                     + [(f'std_{name}', 'f4') for name in STAT_FEATURES])
+    table = np.zeros(1, dtype=dtype)
+    table['phoneme'][0], table['count'][0] = 'æ', 50
+    table['mean_energy_mean'][0], table['std_energy_mean'][0] = 0.2, 0.1
+    stats = NativePhonemeStats(table, min_count=30)
+    assert set(stats.zscores('æ', {'energy_mean': 0.3}, 0.1)) == {'energy_mean'}
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""音素对齐测试"""
+
+import numpy as np
+import pytest
+
+from src.core.音素特征提取 import PhonemeAligner
+
+SR = 16000
+
+
+@pytest.mark.parametrize('seconds', [0.019, 0.5, 30.0])
+def test_duration_weighted_alignment_covers_clip(seconds):
+    audio_length = int(seconds * SR)
+    alignments = PhonemeAligner().duration_weighted_alignment(audio_length, ['k', 'æ', 't'], SR)
+    assert alignments[0][1] == 0.0
+    assert alignments[-1][2] == pytest.approx(audio_length / SR)
+    for (_, start, end), (_, next_start, _) in zip(alignments, alignments[1:]):
+        assert next_start == end
+    assert all(start < end <= audio_length / SR for _, start, end in alignments)
+
+
+def test_slow_speech_stays_within_dp_limit():
+    aligner = PhonemeAligner()
+    cells = []
+    original = aligner._optimal_segmentation
+
+    def record(energy, phoneme_sequence, hop_seconds):
+        cells.append(len(phoneme_sequence) * len(energy) *
+                     aligner._max_segment_frames(len(energy), len(phoneme_sequence), hop_seconds))
+        return original(energy, phoneme_sequence, hop_seconds)
+
+    aligner._optimal_segmentation = record
+    t = np.arange(30 * SR) / SR
+    audio = (np.sin(2 * np.pi * 200 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 0.3 * t))).astype(np.float32)
+    alignments = aligner.energy_based_alignment(audio, ['k', 'æ', 't'], SR)
+    assert cells and cells[0] <= aligner.max_dp_cells
+    assert alignments[-1][2] == pytest.approx(30.0)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""实时评分会话测试：模型用固定形状的 logits 代替"""
+
+import threading
+
+import numpy as np
+
+from src.core.实时评分 import MODEL_STRIDE, SAMPLE_RATE, StreamingScoringSession
+
+
+def make_session(windows):
+    def logits_fn(audio):
+        windows.append(len(audio))
+        return np.zeros((len(audio) // MODEL_STRIDE, 4), dtype=np.float32)
+    return StreamingScoringSession("hello world", logits_fn, decode_fn=lambda ids: "", max_seconds=10,
+                                   chunk_seconds=0.2, context_seconds=0.2)
+
+
+def pcm16(seconds: float, amplitude: float) -> bytes:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t) * 32767).astype('<i2').tobytes()
+
+
+def test_concurrent_append_and_step_keep_frames_consistent():
+    windows = []
+    session = make_session(windows)
+    stopped = threading.Event()
+
+    def infer_loop():
+        while not stopped.is_set():
+            session.step()
+
+    worker = threading.Thread(target=infer_loop)
+    worker.start()
+    session.append_pcm16(pcm16(0.5, 0.0001))
+    for _ in range(60):
+        assert session.append_pcm16(pcm16(0.1, 0.5))
+    stopped.set()
+    worker.join()
+
+    session.finalize()
+    assert session.origin is not None
+    assert session.n_frames == (session.length - session.origin) // MODEL_STRIDE
+    # 每次推理的窗口最多是一块加上下文，没有因为读到过期的 processed 而从 origin 之前开始
+    assert max(windows) <= session.length - session.origin
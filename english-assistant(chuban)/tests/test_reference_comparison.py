@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""参考发音对比测试：参考特征库的并发读写"""
+
+import glob
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from src.core.参考发音对比 import ReferenceComparator
+
+
+@pytest.fixture
+def reference_wav(tmp_path):
+    soundfile = pytest.importorskip('soundfile')
+    t = np.arange(16000) / 16000
+    audio = (0.3 * np.sin(2 * np.pi * 220 * t) * (t > 0.2) * (t < 0.8)).astype(np.float32)
+    path = str(tmp_path / 'reference.wav')
+    soundfile.write(path, audio, 16000)
+    return path
+
+
+def test_concurrent_reference_requests(tmp_path, reference_wav):
+    comparator = ReferenceComparator(store_dir=str(tmp_path / 'store'), feature_type='mfcc', memory_cache_size=2)
+    texts = [f"hello number {i % 6}" for i in range(48)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        references = list(executor.map(lambda text: comparator.get_reference(reference_wav, text), texts))
+    assert all(len(reference['features']) > 0 for reference in references)
+    assert len(comparator._memory) <= 2
+    store_files = glob.glob(os.path.join(str(tmp_path / 'store'), '*', '*'))
+    assert len(store_files) == 6
+    assert not [path for path in store_files if '.tmp' in os.path.basename(path)]
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""上传录音存储测试"""
+
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip('soundfile')
+
+from src.core.audio_buffer import AudioBuffer
+from src.core.upload_store import UploadStore
+
+
+def recording(seed: int) -> AudioBuffer:
+    rng = np.random.default_rng(seed)
+    return AudioBuffer.from_decoded((0.1 * rng.standard_normal(16000)).astype(np.float32))
+
+
+def test_put_async_writes_in_background(tmp_path):
+    store = UploadStore(str(tmp_path))
+    audio = recording(0)
+    store.put_async(audio)
+    store.put_async(audio)
+    store.stop()
+    metrics = store.metrics()
+    assert metrics['files'] == 1
+    assert metrics['writes'] == 1 and metrics['dedup_hits'] == 1
+    assert metrics['pending_writes'] == 0
+
+
+def test_put_async_drops_when_backlog_full(tmp_path):
+    store = UploadStore(str(tmp_path), max_pending_writes=1)
+    release = threading.Event()
+    original = store.put
+    store.put = lambda audio: release.wait(5) and original(audio)
+    store.put_async(recording(0))
+    store.put_async(recording(1))
+    release.set()
+    store.stop()
+    metrics = store.metrics()
+    assert metrics['dropped_writes'] == 1
+    assert metrics['files'] == 1